@@ -11,7 +11,7 @@ from hl.simulation.genome.genome import Genome
 
 from hl.simulation.simulation import run_a_generation
 from hl.simulation.person import PersonSimulation
-from hl.display.draw import draw_object, draw_person, draw_textured, draw_world
+from hl.display.draw import PopulationRenderer, draw_textured
 from hl.simulation.world_object import WorldObject
 from hl.utils import ASSETS_PATH
 
@@ -41,6 +41,8 @@ class GUI_Controller:
             os.path.join(ASSETS_PATH, "imgs/floor.png")
         )
 
+        self.renderer = PopulationRenderer()
+
         self.clock = pygame.time.Clock()
 
         self.last_generation: int = 0
@@ -87,8 +89,7 @@ class GUI_Controller:
             new_x = cur_x + vel * (1 / fps)
             self.center = (new_x, 2)
 
-        for p in population:
-            draw_person(p.person, self.screen, self.center, 2)
+        self.renderer.draw([p.person for p in population], self.screen, self.center, 2)
 
         draw_textured(floor, self.floor_texture, self.screen, self.center, 2)
 
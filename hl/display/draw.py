@@ -3,6 +3,10 @@ import os
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = ""
 
 
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 import pygame
 from pygame import gfxdraw
 from Box2D import b2Transform
@@ -15,6 +19,8 @@ from hl.utils import Vec2, rad2deg, scale
 identity = b2Transform()
 identity.SetIdentity()
 
+LAYER_COLORKEY = (255, 0, 255)
+
 
 def to_screen_pos(
     pos: Vec2,
@@ -51,6 +57,27 @@ def to_screen_scale(
     return x, y
 
 
+def to_screen_array(
+    points: np.ndarray,
+    center: Vec2,
+    radius: float,
+    screen,
+) -> np.ndarray:
+    """
+    Vectorized version of `to_screen_pos` for an (N, 2) array of points.
+    """
+    width = screen.get_width()
+    height = screen.get_height()
+
+    aspect = width / height
+    ppm = height / (2 * radius)
+
+    out = np.empty_like(points, dtype=float)
+    out[:, 0] = (points[:, 0] - (center[0] - radius * aspect)) * ppm
+    out[:, 1] = height - (points[:, 1] - (center[1] - radius)) * ppm
+    return out
+
+
 def draw_object(
     obj: WorldObject,
     screen: pygame.surface.Surface,
@@ -114,3 +141,195 @@ def draw_world(screen, people, floor):
         draw_person(p.person, screen, (2, 2), 2)
 
     draw_object(floor, screen, (2, 2), 2)
+
+
+class PopulationRenderer:
+    """
+    Draws a whole population at once. The poses of all the visible parts are
+    read once per frame and transformed with a single numpy operation. Parts
+    are either blitted from a cache of pre-rotated sprites (default) or drawn
+    as polygons. Walkers whose root part is outside the viewport are culled.
+    """
+
+    def __init__(
+        self,
+        use_sprites: bool = True,
+        angle_step: float = 2.0,
+        max_sprites: int = 8192,
+        cull_margin: float = 2.0,
+    ):
+        self.use_sprites = use_sprites
+        self.angle_step = angle_step
+        self.max_sprites = max_sprites
+        self.cull_margin = cull_margin
+
+        self._n_buckets = int(round(360 / angle_step))
+        self._sprites: "OrderedDict[Tuple, pygame.surface.Surface]" = OrderedDict()
+        self._base_sprites: Dict[Tuple, pygame.surface.Surface] = dict()
+        self._sprites_ppm: Optional[float] = None
+        self._layer: Optional[pygame.surface.Surface] = None
+
+    def _visible_parts(
+        self,
+        people: List[PersonObject],
+        center: Vec2,
+        radius: float,
+        aspect: float,
+    ) -> List[WorldObject]:
+        min_x = center[0] - radius * aspect - self.cull_margin
+        max_x = center[0] + radius * aspect + self.cull_margin
+        min_y = center[1] - radius - self.cull_margin
+        max_y = center[1] + radius + self.cull_margin
+
+        parts: List[WorldObject] = []
+        for person in people:
+            if not person.parts:
+                continue
+            root = next(iter(person.parts.values())).body.position
+            if min_x <= root.x <= max_x and min_y <= root.y <= max_y:
+                parts.extend(person.parts.values())
+        return parts
+
+    def _get_sprite(
+        self, obj: WorldObject, bucket: int, ppm: float
+    ) -> pygame.surface.Surface:
+        # Sprites are 8-bit palettized surfaces: index 0 is the colorkey, 1 the
+        # fill and 2 the outline. This way one sprite per shape and angle is
+        # shared by all the walkers, whatever their color.
+        key = (obj.local_vertices.tobytes(), bucket)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        base_key = key[0]
+        base = self._base_sprites.get(base_key)
+        if base is None:
+            verts = obj.local_vertices * ppm
+            half = int(np.ceil(np.max(np.hypot(verts[:, 0], verts[:, 1])))) + 2
+            base = pygame.Surface((2 * half, 2 * half), depth=8)
+            base.set_palette([(0, 0, 0), (255, 255, 255), (120, 120, 120)])
+            base.fill(0)
+            points = [(half + x, half - y) for x, y in verts]
+            pygame.draw.polygon(base, (255, 255, 255), points)
+            pygame.draw.polygon(base, (120, 120, 120), points, width=1)
+            base.set_colorkey(0)
+            self._base_sprites[base_key] = base
+
+        sprite = pygame.transform.rotate(base, bucket * self.angle_step)
+        sprite.set_colorkey(0)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_sprites:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def draw(
+        self,
+        people: List[PersonObject],
+        screen: pygame.surface.Surface,
+        center: Vec2,
+        radius: float,
+    ) -> int:
+        """
+        Draws all the `people` on the screen and returns the number of parts
+        drawn.
+        """
+        aspect = screen.get_width() / screen.get_height()
+        parts = self._visible_parts(people, center, radius, aspect)
+        if not parts:
+            return 0
+
+        poses = np.array(
+            [(p.body.position.x, p.body.position.y, p.body.angle) for p in parts]
+        )
+
+        if self.use_sprites:
+            self._draw_sprites(parts, poses, screen, center, radius)
+        else:
+            self._draw_polygons(parts, poses, screen, center, radius)
+
+        return len(parts)
+
+    def _get_layer(self, screen: pygame.surface.Surface) -> pygame.surface.Surface:
+        if self._layer is None or self._layer.get_size() != screen.get_size():
+            self._layer = pygame.Surface(screen.get_size()).convert(screen)
+            self._layer.set_colorkey(LAYER_COLORKEY)
+        return self._layer
+
+    def _draw_sprites(
+        self,
+        parts: List[WorldObject],
+        poses: np.ndarray,
+        screen: pygame.surface.Surface,
+        center: Vec2,
+        radius: float,
+    ):
+        ppm = screen.get_height() / (2 * radius)
+        if ppm != self._sprites_ppm:
+            self._sprites.clear()
+            self._base_sprites.clear()
+            self._sprites_ppm = ppm
+
+        screen_pos = to_screen_array(poses[:, :2], center, radius, screen)
+        buckets = (
+            np.round(np.degrees(poses[:, 2]) / self.angle_step).astype(int)
+            % self._n_buckets
+        )
+
+        # Parts are blitted opaque into a layer, which is then blended once
+        # per distinct alpha value. Per-blit alpha is several times slower.
+        layer = self._get_layer(screen)
+        by_alpha: Dict[float, List[int]] = dict()
+        for i, obj in enumerate(parts):
+            by_alpha.setdefault(obj.color[3], []).append(i)
+
+        for alpha, indices in by_alpha.items():
+            layer.fill(LAYER_COLORKEY)
+            for i in indices:
+                obj = parts[i]
+                x, y = screen_pos[i]
+                sprite = self._get_sprite(obj, buckets[i], ppm)
+                sprite.set_palette_at(1, obj.color[:3])
+                layer.blit(
+                    sprite, (x - sprite.get_width() / 2, y - sprite.get_height() / 2)
+                )
+            layer.set_alpha(alpha)
+            screen.blit(layer, (0, 0))
+
+    def _draw_polygons(
+        self,
+        parts: List[WorldObject],
+        poses: np.ndarray,
+        screen: pygame.surface.Surface,
+        center: Vec2,
+        radius: float,
+    ):
+        counts = [len(p.local_vertices) for p in parts]
+        local = np.concatenate([p.local_vertices for p in parts])
+        idx = np.repeat(np.arange(len(parts)), counts)
+
+        cos = np.cos(poses[idx, 2])
+        sin = np.sin(poses[idx, 2])
+        world = np.empty_like(local)
+        world[:, 0] = poses[idx, 0] + local[:, 0] * cos - local[:, 1] * sin
+        world[:, 1] = poses[idx, 1] + local[:, 0] * sin + local[:, 1] * cos
+
+        verts = to_screen_array(world, center, radius, screen)
+        splits = np.cumsum(counts)[:-1]
+        for obj, poly in zip(parts, np.split(verts, splits)):
+            points = poly.tolist()
+            gfxdraw.filled_polygon(screen, points, obj.color)
+            gfxdraw.aapolygon(screen, points, obj.color)
+            pygame.draw.polygon(screen, color=(120, 120, 120), points=points, width=1)
+
+
+def draw_population(
+    people: List[PersonObject],
+    screen: pygame.surface.Surface,
+    center: Vec2,
+    radius: float,
+):
+    """
+    Draws all the `people` as polygons, transforming every vertex at once.
+    """
+    PopulationRenderer(use_sprites=False).draw(people, screen, center, radius)
@@ -0,0 +1,267 @@
+"""
+Headless rendering of checkpoints to video frames.
+
+Frames are drawn with `hl.display.draw` on the SDL dummy video driver, so no
+window is opened and the simulation runs as fast as it can be drawn. Each
+checkpoint is written either as a PNG sequence or as a YUV4MPEG2 (.y4m) file,
+which can be encoded with local tools, e.g.:
+    $ ffmpeg -i first_steps.y4m first_steps.mp4
+    $ ffmpeg -framerate 30 -i first_steps/frame_%05d.png first_steps.mp4
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = ""
+
+import argparse
+import glob
+import multiprocessing as mp
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+import numpy as np
+import pygame
+
+from hl.display.draw import PopulationRenderer, draw_textured
+from hl.io.body_def import BodyDef
+from hl.simulation.genome.genome import Genome
+from hl.simulation.person import PersonSimulation
+from hl.simulation.simulation import run_a_generation
+from hl.simulation.world_object import WorldObject
+from hl.utils import ASSETS_PATH, DEFAULT_BODY_PATH, Color, load_class_from_file
+
+
+FORMATS = ["png", "y4m"]
+
+
+class FrameWriter:
+    def write(self, screen: pygame.surface.Surface):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class PNGSequenceWriter(FrameWriter):
+    def __init__(self, path: str):
+        self.path = path
+        self.frame = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, screen: pygame.surface.Surface):
+        pygame.image.save(
+            screen, os.path.join(self.path, f"frame_{self.frame:05d}.png")
+        )
+        self.frame += 1
+
+
+class Y4MWriter(FrameWriter):
+    """
+    Writes uncompressed 4:4:4 YUV4MPEG2 frames (BT.601, limited range).
+    """
+
+    def __init__(self, path: str, width: int, height: int, fps: int):
+        self.file: BinaryIO = open(path, "wb")
+        self.file.write(
+            f"YUV4MPEG2 W{width} H{height} F{fps}:1 Ip A1:1 C444\n".encode()
+        )
+
+    def write(self, screen: pygame.surface.Surface):
+        rgb = pygame.surfarray.array3d(screen).transpose(1, 0, 2) / 255.0
+        r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+        y = 16 + 65.481 * r + 128.553 * g + 24.966 * b
+        u = 128 - 37.797 * r - 74.203 * g + 112.0 * b
+        v = 128 + 112.0 * r - 93.786 * g - 18.214 * b
+
+        self.file.write(b"FRAME\n")
+        for plane in (y, u, v):
+            self.file.write(np.round(plane).astype(np.uint8).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def _white(index: int, max_index: int) -> Color:
+    return (255, 255, 255, 255)
+
+
+def render_genomes(
+    body_def: BodyDef,
+    genomes: List[Genome],
+    writer: FrameWriter,
+    fps: int = 30,
+    width: int = 900,
+    height: int = 600,
+    radius: float = 1.5,
+    max_frames: Optional[int] = None,
+) -> int:
+    """
+    Simulates the `genomes` in a single world and writes every frame to
+    `writer`. Returns the number of frames written.
+    """
+    pygame.display.init()
+    screen = pygame.display.set_mode((width, height))
+    floor_texture = pygame.image.load(os.path.join(ASSETS_PATH, "imgs/floor.png"))
+    renderer = PopulationRenderer()
+
+    center = (2, radius)
+    frames = 0
+
+    def draw_loop(population: List[PersonSimulation], floor: WorldObject, fps: int):
+        nonlocal center, frames
+
+        people_x = [
+            p.person.parts["torso"].body.position.x
+            for p in population
+            if "torso" in p.person.parts
+        ]
+        if people_x:
+            cur_x = center[0]
+            target_x = max(people_x)
+            vel = (2 * (target_x - cur_x)) ** 3
+            center = (cur_x + vel * (1 / fps), center[1])
+
+        screen.fill((0, 0, 0))
+        renderer.draw([p.person for p in population], screen, center, radius)
+        draw_textured(floor, floor_texture, screen, center, radius)
+
+        writer.write(screen)
+        frames += 1
+
+    try:
+        run_a_generation(
+            body_def,
+            genomes,
+            fps,
+            0,
+            draw_loop=draw_loop,
+            color_function=_white,
+            max_frames=max_frames,
+        )
+    finally:
+        writer.close()
+
+    return frames
+
+
+def render_checkpoint(
+    path: str,
+    output_dir: str,
+    body_path: str = DEFAULT_BODY_PATH,
+    fmt: str = "y4m",
+    fps: int = 30,
+    width: int = 900,
+    height: int = 600,
+    radius: float = 1.5,
+    max_frames: Optional[int] = None,
+) -> str:
+    """
+    Renders the genome saved in `path` into `output_dir`. Returns the path of
+    the written video (or frames directory).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: '{fmt}'. Select from: {FORMATS}")
+
+    genome: Genome = load_class_from_file(path)
+    stem = os.path.join(output_dir, Path(path).stem)
+
+    writer: FrameWriter
+    if fmt == "png":
+        out = stem
+        writer = PNGSequenceWriter(out)
+    else:
+        out = f"{stem}.y4m"
+        writer = Y4MWriter(out, width, height, fps)
+
+    render_genomes(
+        BodyDef(body_path),
+        [genome],
+        writer,
+        fps=fps,
+        width=width,
+        height=height,
+        radius=radius,
+        max_frames=max_frames,
+    )
+    return out
+
+
+def _render_checkpoint_star(kwargs) -> str:
+    return render_checkpoint(**kwargs)
+
+
+def find_checkpoints(paths: List[str]) -> List[str]:
+    """
+    Expands directories in `paths` into the `.nye` files they contain.
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.nye")))
+        else:
+            files.append(path)
+    return files
+
+
+def render_checkpoints(
+    paths: List[str],
+    output_dir: str,
+    n_processes: int = mp.cpu_count(),
+    **kwargs,
+) -> List[str]:
+    """
+    Renders every checkpoint in `paths` (files or directories of `.nye`
+    files) in parallel, one checkpoint per task.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [
+        dict(path=path, output_dir=output_dir, **kwargs)
+        for path in find_checkpoints(paths)
+    ]
+
+    if n_processes <= 1:
+        return [_render_checkpoint_star(task) for task in tasks]
+
+    with mp.Pool(min(n_processes, max(len(tasks), 1))) as pool:
+        return pool.map(_render_checkpoint_star, tasks, chunksize=1)
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(
+        description="Render checkpoints to video frames without a window."
+    )
+    parser.add_argument(
+        "paths", nargs="+", type=str, help="Checkpoint files or directories."
+    )
+    parser.add_argument("-o", "--output", type=str, default="renders")
+    parser.add_argument("--bodypath", type=str, default=DEFAULT_BODY_PATH)
+    parser.add_argument("-f", "--format", type=str, default="y4m", choices=FORMATS)
+    parser.add_argument("-j", "--n_processes", type=int, default=mp.cpu_count())
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--width", type=int, default=900)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--radius", type=float, default=1.5)
+    parser.add_argument(
+        "--max_frames", type=int, default=None, help="Stop after this many frames."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+
+    outputs = render_checkpoints(
+        args.paths,
+        args.output,
+        n_processes=args.n_processes,
+        body_path=args.bodypath,
+        fmt=args.format,
+        fps=args.fps,
+        width=args.width,
+        height=args.height,
+        radius=args.radius,
+        max_frames=args.max_frames,
+    )
+    for out in outputs:
+        print(out)
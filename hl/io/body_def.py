@@ -1,6 +1,6 @@
 import json
 import numpy as np
-from typing import Dict
+from typing import Dict, Optional
 
 from hl.utils import Vec2
 
@@ -9,8 +9,10 @@ class BodyDef:
     def __init__(self, body_path: str):
         body_json = json.load(open(body_path))
 
+        self.path = body_path
+
         self.root: str = body_json["root"]
-        self.pos: Vec2 = body_json["pos"]
+        self.pos: Vec2 = body_json.get("pos", (0, 0))
         self.body: dict = body_json["body"]
 
         self.joints = dict()
@@ -25,7 +27,11 @@ class BodyDef:
                     self.joints[joint_id] = joint_def
 
 
-def get_random_body_angles(body_def: BodyDef, scale: float = 1) -> Dict[str, float]:
+def get_random_body_angles(
+    body_def: BodyDef, scale: float = 1, rng: Optional[np.random.Generator] = None
+) -> Dict[str, float]:
+    if rng is None:
+        rng = np.random.default_rng()
     angles: Dict[str, float] = dict()
 
     for joint_id, joint_def in body_def.joints.items():
@@ -33,7 +39,7 @@ def get_random_body_angles(body_def: BodyDef, scale: float = 1) -> Dict[str, flo
             if "angle" in joint_def:
                 min = joint_def["angle"]["min"] * scale
                 max = joint_def["angle"]["max"] * scale
-                angles[joint_id] = np.random.uniform(min, max)
+                angles[joint_id] = rng.uniform(min, max)
             else:
                 angles[joint_id] = 0
 
@@ -1,4 +1,4 @@
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from Box2D import b2World, b2RevoluteJoint, b2RevoluteJointDef, b2Vec2
 
 from hl.io.body_def import BodyDef
@@ -10,6 +10,39 @@ BODY_SCALE = 21
 TORQUE = 500
 
 
+class BodyTemplate:
+    """
+    The parts of a `BodyDef` that are the same for every instance of the
+    body, already scaled to world units. Only plain tuples are stored, so the
+    template can be pickled along with the `BodyDef`.
+    """
+
+    def __init__(self, body_def: BodyDef):
+        self.vertices: Dict[str, List[Vec2]] = {
+            part_id: [_to_world(v) for v in part["vertices"]]
+            for part_id, part in body_def.body.items()
+        }
+        self.anchors: Dict[str, Tuple[Vec2, Vec2]] = {
+            joint_id: (_to_world(joint_def["anchorA"]), _to_world(joint_def["anchorB"]))
+            for joint_id, joint_def in body_def.joints.items()
+        }
+
+
+def _to_world(v: Vec2) -> Vec2:
+    return (v[0] / BODY_SCALE, v[1] / BODY_SCALE)
+
+
+def compile_body(body_def: BodyDef) -> BodyTemplate:
+    """
+    Returns the template of `body_def`, computing it only the first time.
+    """
+    template = getattr(body_def, "template", None)
+    if template is None:
+        template = BodyTemplate(body_def)
+        body_def.template = template
+    return template
+
+
 def parse_body(
     body_def: BodyDef,
     world: b2World,
@@ -26,11 +59,13 @@ def parse_body(
         color[3],
     )
 
+    template = compile_body(body_def)
+
     objs: Dict[str, WorldObject] = dict()
     joints: Dict[str, b2RevoluteJoint] = dict()
     for key, part in body_def.body.items():
         obj = WorldObject(
-            vertices=[b2Vec2(v) / BODY_SCALE for v in part["vertices"]],
+            vertices=template.vertices[key],
             world=world,
             color=color if part["color"] == 0 else second_color,
             friction=0.9,
@@ -56,8 +91,9 @@ def parse_body(
 
                 jointDef.bodyA = objs[part_id].body
                 jointDef.bodyB = objs[child_id].body
-                jointDef.localAnchorA = b2Vec2(data["anchorA"]) / BODY_SCALE
-                jointDef.localAnchorB = b2Vec2(data["anchorB"]) / BODY_SCALE
+                jointDef.localAnchorA, jointDef.localAnchorB = template.anchors[
+                    joint_id
+                ]
                 jointDef.enableMotor = True
 
                 torque_mult = 1
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from hl.simulation.genome.sine_genome_symetric_v3 import SineGenomeBreeder
 
@@ -9,11 +9,17 @@ import argparse
 import time
 import multiprocessing as mp
 
+from hl.simulation.convergence import PLATEAU_MUTATION_FACTOR
 from hl.simulation.genome import get_genome_breeder, GENOME_CHOICES
+from hl.simulation.genome.feedback_genome import FeedbackGenomeBreeder
+from hl.simulation.genome.genome import GenomeBreeder
 from hl.simulation.simulation import Simulation
+from hl.simulation.terrain import TERRAIN_KINDS
 from hl.utils import ASSETS_PATH, DEFAULT_BODY_PATH, load_class_from_file
 
-from hl.display.display import GUI_Controller
+# The GUI pulls in pygame and matplotlib, so it is only imported when needed
+if TYPE_CHECKING:
+    from hl.display.display import GUI_Controller
 
 
 def check_thread_alive(thr):
@@ -71,12 +77,232 @@ def get_arguments():
     #     choices=GENOME_CHOICES,
     #     help="The genome to use for the simulation.",
     # )
+    parser.add_argument(
+        "--max_generations",
+        type=int,
+        default=None,
+        help="Stop after this many generations.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the run. Without it, the seed used is saved in the checkpoint"
+        " directory.",
+    )
+    parser.add_argument(
+        "--optimizer",
+        type=str,
+        default="genetic",
+        choices=["genetic", "cmaes"],
+        help="Genetic algorithm, or CMA-ES over the parameters of the genomes.",
+    )
+    parser.add_argument(
+        "--selection",
+        type=str,
+        default="roulette",
+        choices=["roulette", "nsga2"],
+        help="Select on the score, or with NSGA-II on the components of the score"
+        " (distance, step length, head bob and feet asymmetry) and the energy used"
+        " by the motors.",
+    )
+    parser.add_argument(
+        "--fitness",
+        type=str,
+        default="default",
+        help="Fitness function scoring the recorded states of the walkers: default,"
+        " distance, cost_of_transport, or a 'package.module:function'.",
+    )
+    parser.add_argument(
+        "--record_episodes",
+        action="store_true",
+        help="Save the recorded states of the walkers every generation, to score"
+        " them again with `python -m hl.simulation.fitness`.",
+    )
+    parser.add_argument(
+        "--terrain",
+        type=str,
+        nargs="*",
+        choices=["flat", "slope", "steps", "rough"],
+        help="Walk on a procedural floor made of these kinds of chunks (all of"
+        " them if none is given) instead of the flat floor.",
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=int,
+        default=1,
+        help="Evaluate every genome in this many scenarios: the unperturbed one"
+        " and random perturbations of the initial pose, the friction and a push.",
+    )
+    parser.add_argument(
+        "--scenario_aggregation",
+        type=str,
+        default="mean",
+        choices=["mean", "min", "quantile"],
+        help="How the scores of a genome in the scenarios are combined.",
+    )
+    parser.add_argument(
+        "--scenario_quantile",
+        type=float,
+        default=0.25,
+        help="Quantile of the scores used by --scenario_aggregation quantile.",
+    )
+    parser.add_argument(
+        "--convergence",
+        type=str,
+        default=None,
+        choices=["stop", "inject", "mutate", "restart"],
+        help="What to do when the scores stop improving: stop the run, inject"
+        " random genomes, raise the mutation rate or restart from the best"
+        " genomes found.",
+    )
+    parser.add_argument(
+        "--plateau_window",
+        type=int,
+        default=10,
+        help="Generations without improvement before the run is on a plateau.",
+    )
+    parser.add_argument(
+        "--plateau_threshold",
+        type=float,
+        default=0.01,
+        help="Relative improvement of the scores under which the run is stalled.",
+    )
+    parser.add_argument(
+        "--min_diversity",
+        type=float,
+        default=None,
+        help="Population diversity under which the run is on a plateau.",
+    )
+    parser.add_argument(
+        "--plateau_mutation_factor",
+        type=float,
+        default=PLATEAU_MUTATION_FACTOR,
+        help="Factor of the mutation rate of the breeder with the mutate and"
+        " restart convergence actions.",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=float,
+        default=None,
+        metavar="RESOLUTION",
+        help="Skip the simulation of genomes equal, up to RESOLUTION, to genomes"
+        " already evaluated and reuse their scores.",
+    )
+    parser.add_argument(
+        "--near_duplicates",
+        type=float,
+        default=0.0,
+        metavar="RADIUS",
+        help="With --dedup, also skip genomes closer than RADIUS to evaluated"
+        " genomes.",
+    )
+    parser.add_argument(
+        "--near_duplicate_policy",
+        type=str,
+        default="interpolate",
+        choices=["interpolate", "replace"],
+        help="Interpolate the scores of near duplicates from their neighbours,"
+        " or replace them by random genomes.",
+    )
+    parser.add_argument(
+        "--surrogate",
+        type=str,
+        default=None,
+        choices=["ridge", "knn"],
+        help="Breed more children and only evaluate the ones a surrogate model"
+        " of the score predicts best.",
+    )
+    parser.add_argument(
+        "--surrogate_oversample",
+        type=int,
+        default=4,
+        help="Children bred for every bred child evaluated with --surrogate.",
+    )
+    parser.add_argument(
+        "--islands",
+        type=int,
+        default=1,
+        help="Number of islands of the island model, each one evolving its own"
+        " population of --population genomes in its own process.",
+    )
+    parser.add_argument(
+        "--topology",
+        type=str,
+        default="ring",
+        choices=["ring", "full"],
+        help="Which islands exchange migrants.",
+    )
+    parser.add_argument(
+        "--migration_interval",
+        type=int,
+        default=5,
+        help="Generations between migrations in the island model.",
+    )
+    parser.add_argument(
+        "--migrants",
+        type=int,
+        default=2,
+        help="Best genomes sent by every island on each migration.",
+    )
+    parser.add_argument(
+        "--task_timeout",
+        type=float,
+        default=None,
+        help="Seconds after which an evaluation task is considered stuck and"
+        " retried.",
+    )
+    parser.add_argument(
+        "--serve",
+        type=str,
+        default=None,
+        metavar="HOST:PORT",
+        help="Evaluate on worker nodes, started with"
+        " `python -m hl.simulation.distributed HOST:PORT`. Every node needs the"
+        " key of HL_AUTHKEY; without it, a random key is generated and printed.",
+    )
+    parser.add_argument(
+        "--local_workers",
+        type=int,
+        default=0,
+        help="Start this many distributed workers on this machine.",
+    )
     parser.add_argument("--no_feet", "-nf", action="store_true")
+    parser.add_argument(
+        "--feedback",
+        action="store_true",
+        help="Correct the genomes with linear feedback from the sensors of the"
+        " walkers (joint angles and speeds, torso motion and foot contacts).",
+    )
     parser.add_argument(
         "--sample", "-sg", type=str, help="Choose a genome save to begin the training"
     )
 
+    parser.add_argument(
+        "--phase_stats",
+        action="store_true",
+        help="Time the phases of every generation and print a report.",
+    )
+
+    parser.add_argument(
+        "--prometheus",
+        action="store_true",
+        help="Also write the telemetry of each generation in Prometheus format.",
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Profile the main process and the workers during the first N"
+        " generations, and save the report in the checkpoint directory.",
+    )
+
     args = parser.parse_args()
+    # The display replays the genomes on the flat floor
+    if args.terrain is not None and args.display:
+        parser.error("--display is not supported with --terrain")
     return args
 
 
@@ -91,43 +317,127 @@ if __name__ == "__main__":
 
     fps = 30
     # genome_breeder = get_genome_breeder(args.genome, args.bodypath)
-    genome_breeder = SineGenomeBreeder(body_path)
+    genome_breeder: GenomeBreeder = SineGenomeBreeder(body_path)
+    if args.feedback:
+        genome_breeder = FeedbackGenomeBreeder(genome_breeder)
 
     sample_genome = load_class_from_file(args.sample) if args.sample else None
 
-    GUI_controller: Optional[GUI_Controller] = (
-        GUI_Controller(genome_breeder.body_def, fps) if args.display else None
-    )
+    # --terrain alone walks on every kind of chunk
+    terrain = args.terrain
+    if terrain is not None and len(terrain) == 0:
+        terrain = TERRAIN_KINDS
+
+    GUI_controller: Optional["GUI_Controller"] = None
+    if args.display and args.islands <= 1:
+        from hl.display.display import GUI_Controller
+
+        GUI_controller = GUI_Controller(genome_breeder.body_def, fps)
 
     quit_flag = mp.Event()
-    simulation = Simulation(
-        genome_breeder,
-        sample_genome=sample_genome,
-        fps=fps,
-        parallel=args.n_processes > 1 and not args.syncronous,
-        population_size=args.population,
-        n_processes=args.n_processes if not args.syncronous else 1,
-        quit_flag=quit_flag,
-    )
-    if not args.syncronous:
-        print("Starting simulation with async display")
-        data_queue: mp.Queue = mp.Queue()
-        simulation_process = mp.Process(target=simulation.run, args=(data_queue,))
-        simulation_process.start()
+    if args.islands > 1:
+        from hl.simulation.island import IslandModel
 
         if args.display:
-            assert isinstance(GUI_controller, GUI_Controller)
-            GUI_controller.set_async_params(data_queue, quit_flag)
-            while check_thread_alive(simulation_process) and not quit_flag.is_set():
-                GUI_controller.display_async()
-                time.sleep(0.1)
-        if quit_flag.is_set():
-            print("Exitting due key press")
-        else:
-            quit_flag.set()
+            print("The island model runs without display")
+        IslandModel(
+            genome_breeder,
+            n_islands=args.islands,
+            topology=args.topology,
+            migration_interval=args.migration_interval,
+            n_migrants=args.migrants,
+            seed=args.seed,
+            quit_flag=quit_flag,
+            sample_genome=sample_genome,
+            fps=fps,
+            population_size=args.population,
+            max_generations=args.max_generations,
+            optimizer=args.optimizer,
+            selection=args.selection,
+            fitness=args.fitness,
+            record_episodes=args.record_episodes,
+            terrain=terrain,
+            n_scenarios=args.scenarios,
+            scenario_aggregation=args.scenario_aggregation,
+            scenario_quantile=args.scenario_quantile,
+            convergence=args.convergence,
+            plateau_window=args.plateau_window,
+            plateau_threshold=args.plateau_threshold,
+            min_diversity=args.min_diversity,
+            plateau_mutation_factor=args.plateau_mutation_factor,
+            dedup_resolution=args.dedup,
+            near_duplicate_radius=args.near_duplicates,
+            near_duplicate_policy=args.near_duplicate_policy,
+            surrogate=args.surrogate,
+            surrogate_oversample=args.surrogate_oversample,
+            profile_phases=args.phase_stats,
+            prometheus=args.prometheus,
+        ).run()
+    else:
+        distributed = args.serve is not None or args.local_workers > 0
+        simulation = Simulation(
+            genome_breeder,
+            sample_genome=sample_genome,
+            fps=fps,
+            parallel=args.n_processes > 1 and not args.syncronous and not distributed,
+            population_size=args.population,
+            max_generations=args.max_generations,
+            seed=args.seed,
+            optimizer=args.optimizer,
+            selection=args.selection,
+            fitness=args.fitness,
+            record_episodes=args.record_episodes,
+            terrain=terrain,
+            n_scenarios=args.scenarios,
+            scenario_aggregation=args.scenario_aggregation,
+            scenario_quantile=args.scenario_quantile,
+            convergence=args.convergence,
+            plateau_window=args.plateau_window,
+            plateau_threshold=args.plateau_threshold,
+            min_diversity=args.min_diversity,
+            plateau_mutation_factor=args.plateau_mutation_factor,
+            dedup_resolution=args.dedup,
+            near_duplicate_radius=args.near_duplicates,
+            near_duplicate_policy=args.near_duplicate_policy,
+            surrogate=args.surrogate,
+            surrogate_oversample=args.surrogate_oversample,
+            n_processes=args.n_processes if not args.syncronous else 1,
+            quit_flag=quit_flag,
+            task_timeout=args.task_timeout,
+            serve=args.serve,
+            n_local_workers=args.local_workers,
+            profile_phases=args.phase_stats,
+            prometheus=args.prometheus,
+            profile_generations=args.profile,
+        )
+        if not args.syncronous:
+            print("Starting simulation with async display")
+            data_queue: mp.Queue = mp.Queue()
+            simulation_process = mp.Process(target=simulation.run, args=(data_queue,))
+            simulation_process.start()
 
-        simulation_process.join()  # Wait for the simulation to finish before continuing
+            try:
+                if args.display:
+                    assert isinstance(GUI_controller, GUI_Controller)
+                    GUI_controller.set_async_params(data_queue, quit_flag)
+                    while (
+                        check_thread_alive(simulation_process)
+                        and not quit_flag.is_set()
+                    ):
+                        GUI_controller.display_async()
+                        time.sleep(0.1)
+                    if quit_flag.is_set():
+                        print("Exitting due key press")
+                    else:
+                        quit_flag.set()
 
-    else:
-        simulation.run()
+                # Wait for the simulation to finish before continuing
+                simulation_process.join()
+            except KeyboardInterrupt:
+                # The simulation process also got the Ctrl-C and stops itself
+                quit_flag.set()
+                simulation_process.join()
+
+        else:
+            simulation.run()
     print("Finished")
@@ -0,0 +1,81 @@
+from typing import List, Optional, Sequence
+
+from hl.simulation.genome.genome import Genome, GenomeBreeder
+from hl.simulation.rng import RNGStreams
+
+
+class SelectionTable:
+    """
+    Outcome of the selection step of a generation: what every child of the
+    next population is made from. Children are indexed in population order:
+        elites, then mutations of the best genome, then random genomes, then
+        genomes bred from `parents` with the probabilities `distr`.
+
+    `mutation_rate` is the one of the mutations of the best genome, and
+    `breed_mutation_rate` overrides the one of the breeder for bred genomes.
+
+    The table is picklable, so children can be created in any process.
+    """
+
+    def __init__(
+        self,
+        elites: List[Genome],
+        best: Genome,
+        parents: List[Genome],
+        distr: Sequence[float],
+        n_mutation: int,
+        n_random: int,
+        n_breed: int,
+        mutation_rate: float = 0.3,
+        breed_mutation_rate: Optional[float] = None,
+    ):
+        self.elites = elites
+        self.best = best
+        self.parents = parents
+        self.distr = distr
+        self.n_mutation = n_mutation
+        self.n_random = n_random
+        self.n_breed = n_breed
+        self.mutation_rate = mutation_rate
+        self.breed_mutation_rate = breed_mutation_rate
+
+    def __len__(self) -> int:
+        return len(self.elites) + self.n_mutation + self.n_random + self.n_breed
+
+    def create_child(self, breeder: GenomeBreeder, index: int) -> Genome:
+        i = index
+        if i < len(self.elites):
+            return self.elites[i]
+        i -= len(self.elites)
+
+        if i < self.n_mutation:
+            return breeder.get_genome_from_breed([self.best], [1], self.mutation_rate)
+        i -= self.n_mutation
+
+        if i < self.n_random:
+            return breeder.get_random_genome()
+        i -= self.n_random
+
+        if i < self.n_breed:
+            return breeder.get_genome_from_breed(
+                self.parents, self.distr, self.breed_mutation_rate
+            )
+        raise IndexError(f"Child {index} out of a population of {len(self)}")
+
+
+def breed_children(
+    breeder: GenomeBreeder,
+    table: SelectionTable,
+    rng_streams: RNGStreams,
+    generation: int,
+    indices: Sequence[int],
+) -> List[Genome]:
+    """
+    Creates the children `indices` of `generation`, each one from its own
+    random stream. The result does not depend on how the indices are split.
+    """
+    children: List[Genome] = []
+    for i in indices:
+        breeder.rng = rng_streams.child(generation, int(i))
+        children.append(table.create_child(breeder, int(i)))
+    return children
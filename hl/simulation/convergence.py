@@ -0,0 +1,115 @@
+from collections import deque
+from typing import Deque, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from hl.simulation.genome.genome import Genome
+
+
+# What to do when the run reaches a plateau:
+#   stop:    end the run
+#   inject:  replace part of the bred children by fresh random genomes
+#   mutate:  breed with the mutation rate of the breeder raised by
+#            `PLATEAU_MUTATION_FACTOR` until a new best score is found
+#   restart: start a new population from the hall of fame
+CONVERGENCE_ACTIONS = ["stop", "inject", "mutate", "restart"]
+
+# Fraction of the population replaced by random genomes by `inject`
+INJECT_FRACTION = 0.25
+# Raises the 0.2 mutation rate of the symetric v3 breeder to 0.5
+PLATEAU_MUTATION_FACTOR = 2.5
+
+
+def population_diversity(genomes: Sequence[Genome]) -> Optional[float]:
+    """
+    Mean standard deviation of the parameters of `genomes`, or None if their
+    family can not be flattened to vectors.
+    """
+    try:
+        vectors = np.array([genome.to_vector() for genome in genomes])
+    except NotImplementedError:
+        return None
+    return float(vectors.std(axis=0).mean())
+
+
+class PlateauDetector:
+    """
+    Tracks the best and mean scores and the diversity of the last `window`
+    generations. The run is on a plateau when, over the whole window, neither
+    the best nor the mean score improved by more than `threshold` (relative to
+    the score at the start of the window), or when the diversity of the
+    population fell under `min_diversity`.
+    """
+
+    def __init__(
+        self,
+        window: int = 10,
+        threshold: float = 0.01,
+        min_diversity: Optional[float] = None,
+    ):
+        self.window = window
+        self.threshold = threshold
+        self.min_diversity = min_diversity
+
+        self.best: Deque[float] = deque(maxlen=window)
+        self.mean: Deque[float] = deque(maxlen=window)
+        self.diversity: Deque[float] = deque(maxlen=window)
+
+    def update(self, scores: Sequence[float], diversity: Optional[float]) -> None:
+        self.best.append(float(np.nanmax(scores)))
+        self.mean.append(float(np.nanmean(scores)))
+        if diversity is not None:
+            self.diversity.append(diversity)
+
+    def _stalled(self, values: Deque[float]) -> bool:
+        first = values[0]
+        return max(values) - first <= self.threshold * abs(first)
+
+    def is_plateau(self) -> bool:
+        if len(self.best) < self.window:
+            return False
+        if (
+            self.min_diversity is not None
+            and len(self.diversity) > 0
+            and self.diversity[-1] < self.min_diversity
+        ):
+            return True
+        return self._stalled(self.best) and self._stalled(self.mean)
+
+    def reset(self) -> None:
+        """
+        Forgets the history, so that an action taken on a plateau has a whole
+        window to show its effect.
+        """
+        self.best.clear()
+        self.mean.clear()
+        self.diversity.clear()
+
+
+class HallOfFame:
+    """
+    The `size` best genomes evaluated during the run, best first.
+    """
+
+    def __init__(self, size: int = 8):
+        self.size = size
+        self.entries: List[Tuple[float, Genome]] = []
+
+    def update(self, genomes: Sequence[Genome], scores: Sequence[float]) -> None:
+        # Elites are evaluated again every generation, keep them only once
+        known = {id(genome) for _, genome in self.entries}
+        candidates = self.entries + [
+            (float(score), genome)
+            for genome, score in zip(genomes, scores)
+            if not np.isnan(score) and id(genome) not in known
+        ]
+        candidates.sort(key=lambda e: e[0], reverse=True)
+        self.entries = candidates[: self.size]
+
+    @property
+    def genomes(self) -> List[Genome]:
+        return [genome for _, genome in self.entries]
+
+    @property
+    def scores(self) -> List[float]:
+        return [score for score, _ in self.entries]
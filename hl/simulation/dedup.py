@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from hl.simulation.person import WalkerResult
+
+
+# What to do with the children close to an evaluated genome:
+#   interpolate: use the scores of its neighbours, weighted by distance
+#   replace:     evaluate a fresh random genome instead
+NEAR_DUPLICATE_POLICIES = ["interpolate", "replace"]
+
+
+class NeighbourIndex:
+    """
+    Brute-force nearest neighbour index over the last `max_size` vectors
+    added, each with a value. Vectors are kept in a buffer that doubles until
+    it holds `max_size` of them, then the oldest ones are overwritten.
+    Queries are computed `query_chunk` vectors at a time, so the distance
+    matrices stay under `query_chunk * max_size` elements.
+    """
+
+    def __init__(self, max_size: int = 8192, query_chunk: int = 256):
+        self.max_size = max_size
+        self.query_chunk = query_chunk
+
+        self._vectors: Optional[np.ndarray] = None
+        self._values = np.empty(0)
+        self.size = 0
+        # Position of the next vector in the buffer
+        self._next = 0
+
+    def add(self, vectors: np.ndarray, values: Sequence[float]) -> None:
+        vectors = np.atleast_2d(vectors)[-self.max_size :]
+        values = np.asarray(values, dtype=float)[-self.max_size :]
+        if self._vectors is None:
+            capacity = min(max(64, len(vectors)), self.max_size)
+            self._vectors = np.empty((capacity, vectors.shape[1]))
+            self._values = np.empty(capacity)
+
+        size = min(self.size + len(vectors), self.max_size)
+        if size > len(self._vectors):
+            capacity = min(max(size, 2 * len(self._vectors)), self.max_size)
+            self._vectors = np.resize(self._vectors, (capacity, vectors.shape[1]))
+            self._values = np.resize(self._values, capacity)
+
+        positions = (self._next + np.arange(len(vectors))) % self.max_size
+        self._vectors[positions] = vectors
+        self._values[positions] = values
+        self._next = int(positions[-1] + 1) % self.max_size
+        self.size = size
+
+    def query(self, vectors: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the distances to the `k` nearest neighbours of every vector,
+        closest first, and their values.
+        """
+        assert self._vectors is not None and self.size > 0, "Empty index"
+        chunks = [
+            self._query_chunk(vectors[start : start + self.query_chunk], k)
+            for start in range(0, len(vectors), self.query_chunk)
+        ]
+        return (
+            np.concatenate([distances for distances, _ in chunks]),
+            np.concatenate([values for _, values in chunks]),
+        )
+
+    def _query_chunk(
+        self, vectors: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        assert self._vectors is not None
+        data = self._vectors[: self.size]
+        k = min(k, self.size)
+
+        # |a - b|^2 = |a|^2 - 2 a.b + |b|^2
+        sq_distances = (
+            (vectors**2).sum(axis=1)[:, None]
+            - 2 * vectors @ data.T
+            + (data**2).sum(axis=1)[None, :]
+        )
+        nearest = np.argpartition(sq_distances, k - 1, axis=1)[:, :k]
+        sq_distances = np.take_along_axis(sq_distances, nearest, axis=1)
+        order = np.argsort(sq_distances, axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        distances = np.sqrt(
+            np.maximum(np.take_along_axis(sq_distances, order, axis=1), 0)
+        )
+        return distances, self._values[nearest]
+
+
+class EvaluationPlan:
+    """
+    Which genomes of a generation have to be simulated:
+        known:      index -> result reused from a genome evaluated before
+        copies:     index -> index of an identical genome of the generation
+        near:       index -> score interpolated from its neighbours
+        evaluate:   the indices of the genomes to simulate
+    """
+
+    def __init__(self):
+        self.known: Dict[int, WalkerResult] = dict()
+        self.copies: Dict[int, int] = dict()
+        self.near: Dict[int, float] = dict()
+        self.evaluate: List[int] = []
+
+
+class ScoreCache:
+    """
+    Results of the genomes evaluated during the run. Genomes are identified
+    by their parameter vector quantized to `resolution`, so the simulation of
+    a genome that was already evaluated can be skipped. The simulation is
+    deterministic, so the reused result is the one it would get.
+
+    If `radius` is positive, the scores of the genomes closer than `radius`
+    to evaluated ones are interpolated from their `k` nearest neighbours,
+    among the last `max_neighbours` genomes evaluated.
+
+    Only the results of the last `max_results` genomes evaluated are kept.
+    """
+
+    def __init__(
+        self,
+        resolution: float = 1e-6,
+        radius: float = 0.0,
+        k: int = 3,
+        max_neighbours: int = 8192,
+        max_results: int = 262144,
+    ):
+        self.resolution = resolution
+        self.radius = radius
+        self.k = k
+        self.max_results = max_results
+
+        # In the order they were added, the oldest are dropped first
+        self._results: "OrderedDict[bytes, WalkerResult]" = OrderedDict()
+        self._index = NeighbourIndex(max_neighbours)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def key(self, vector: np.ndarray) -> bytes:
+        return np.round(vector / self.resolution).astype(np.int64).tobytes()
+
+    def plan(self, vectors: Sequence[np.ndarray]) -> EvaluationPlan:
+        plan = EvaluationPlan()
+        first: Dict[bytes, int] = dict()
+        for i, vector in enumerate(vectors):
+            key = self.key(vector)
+            if key in self._results:
+                plan.known[i] = self._results[key]
+            elif key in first:
+                plan.copies[i] = first[key]
+            else:
+                first[key] = i
+                plan.evaluate.append(i)
+
+        if self.radius <= 0 or self._index.size == 0 or len(plan.evaluate) == 0:
+            return plan
+
+        distances, scores = self._index.query(
+            np.array([vectors[i] for i in plan.evaluate]), self.k
+        )
+        evaluate: List[int] = []
+        for i, d, s in zip(plan.evaluate, distances, scores):
+            close = d <= self.radius
+            if not close.any():
+                evaluate.append(i)
+                continue
+            weights = 1 / (d[close] + self.resolution)
+            plan.near[i] = float((weights * s[close]).sum() / weights.sum())
+        plan.evaluate = evaluate
+        return plan
+
+    def add(
+        self, vectors: Sequence[np.ndarray], results: Sequence[WalkerResult]
+    ) -> None:
+        """
+        Adds evaluated genomes. Unfinished evaluations (NaN) are skipped.
+        """
+        new_vectors: List[np.ndarray] = []
+        new_scores: List[float] = []
+        for vector, result in zip(vectors, results):
+            key = self.key(vector)
+            if np.isnan(result.score) or key in self._results:
+                continue
+            self._results[key] = result
+            new_vectors.append(vector)
+            new_scores.append(float(result.score))
+
+        if len(new_vectors) > 0:
+            self._index.add(np.array(new_vectors), new_scores)
+
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
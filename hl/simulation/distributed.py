@@ -0,0 +1,521 @@
+"""
+Distributed evaluation over TCP, with `multiprocessing.connection`.
+
+A `Coordinator` runs in the simulation process and serves batches of genomes
+to any number of worker nodes, which evaluate them with `run_a_generation`
+and send back the walker results. Messages are pickled tuples:
+
+    coordinator -> worker: ("init", genome_breeder, fps, heartbeat_interval, record,
+                            terrain)
+                           ("task", task_id, genomes, generation, scenarios)
+                           ("cancel", task_id)
+                           ("stop",)
+    worker -> coordinator: ("heartbeat",)
+                           ("result", task_id, results, stats)
+                           ("error", task_id, error)
+
+Workers send heartbeats while evaluating. A worker that disconnects or is
+silent for longer than the heartbeat timeout is dropped, and its task is
+given to another worker. Once the results of a task are no longer needed
+(the generation was cancelled, or another worker completed it), the worker
+evaluating it is sent a "cancel": it stops the frame loop and sends the
+results so far. A task whose evaluation raises is sent back as an "error"
+and retried, on any worker; after `max_task_retries` failures its genomes get
+`CRASH_SCORE`.
+
+    $ python -m hl.simulation.distributed HOST:PORT     # start a worker node
+
+Messages are unpickled on both ends, so whoever holds the key can run code
+on the coordinator and on the workers. Connections are authenticated with the
+key in the `HL_AUTHKEY` environment variable, which must be the same on every
+node. Without it, the coordinator generates a random key and prints it, and
+worker nodes refuse to start.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import secrets
+import signal
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.synchronize import Event
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from hl.io.body_parser import compile_body
+from hl.simulation.genome.genome import Genome, GenomeBreeder
+from hl.simulation.person import WalkerResult
+from hl.simulation.profiling import GenerationStats
+from hl.simulation.scenarios import Scenario
+from hl.simulation.terrain import TerrainProfile
+from hl.simulation.simulation import CRASH_SCORE, run_a_generation, split_walkers
+
+AUTHKEY_VARIABLE = "HL_AUTHKEY"
+
+Address = Tuple[str, int]
+
+
+def parse_address(address: str) -> Address:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def environment_authkey() -> Optional[bytes]:
+    """
+    Key of the `HL_AUTHKEY` environment variable, None if it is not set.
+    """
+    key = os.environ.get(AUTHKEY_VARIABLE)
+    return key.encode() if key else None
+
+
+class Task:
+    def __init__(
+        self,
+        task_id: int,
+        start: int,
+        genomes: List[Genome],
+        generation: int,
+        scenarios: Optional[List[Scenario]] = None,
+    ):
+        self.task_id = task_id
+        self.start = start
+        self.genomes = genomes
+        self.generation = generation
+        self.scenarios = scenarios
+        self.retries = 0
+
+
+class Coordinator:
+    """
+    Serves evaluation tasks to the worker nodes connected to `address`. If
+    `n_local_workers` is set, that many workers are started on this machine,
+    which is also the way to test the protocol on a single box. If `record`
+    is set, the workers send back the states of the walkers. `terrain` is the
+    floor of their worlds, the flat floor if None. A task that fails
+    `max_task_retries` times gives its genomes `CRASH_SCORE`, and every
+    failure is added to `failures`.
+
+    `authkey` defaults to the key of `HL_AUTHKEY`. If that is not set either, a
+    random key is generated: local workers get it directly, and it is printed
+    for the worker nodes.
+    """
+
+    def __init__(
+        self,
+        genome_breeder: GenomeBreeder,
+        fps: int,
+        address: Address = ("localhost", 0),
+        authkey: Optional[bytes] = None,
+        n_local_workers: int = 0,
+        chunk_size: int = 8,
+        heartbeat_timeout: float = 30.0,
+        record: bool = False,
+        terrain: Optional[TerrainProfile] = None,
+        max_task_retries: int = 2,
+    ):
+        self.genome_breeder = genome_breeder
+        self.fps = fps
+        self.record = record
+        self.terrain = terrain
+        generated_key = False
+        if authkey is None:
+            authkey = environment_authkey()
+        if authkey is None:
+            authkey = secrets.token_hex(16).encode()
+            generated_key = True
+        self.authkey = authkey
+        self.chunk_size = chunk_size
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_task_retries = max_task_retries
+
+        self.listener = Listener(address, authkey=authkey)
+        self.address: Address = self.listener.address  # type: ignore
+
+        self._closed = threading.Event()
+        self._tasks: "queue.Queue[Task]" = queue.Queue()
+        self._results: Dict[int, Tuple[List[WalkerResult], GenerationStats]] = dict()
+        self._pending: Dict[int, Task] = dict()
+        self._done = threading.Condition()
+        self._next_task_id = 0
+        self.n_workers = 0
+        self.lost_workers = 0
+        self.failures: List[Dict[str, Any]] = []
+
+        threading.Thread(target=self._accept, daemon=True).start()
+        print(f"Serving evaluations on {self.address[0]}:{self.address[1]}")
+        if generated_key and address != ("localhost", 0):
+            print(
+                f"{AUTHKEY_VARIABLE} is not set, start the worker nodes with"
+                f" {AUTHKEY_VARIABLE}={authkey.decode()}"
+            )
+
+        self._local_workers = start_local_workers(
+            self.address, n_local_workers, authkey, _run_coordinated_worker
+        )
+
+    def _accept(self) -> None:
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                # The listener was closed
+                return
+            except Exception as e:
+                # Failed handshake, e.g. wrong key
+                print(f"Rejected worker: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        """
+        Feeds tasks to one worker until the coordinator is closed or the worker
+        is lost.
+        """
+        with self._done:
+            self.n_workers += 1
+        task: Optional[Task] = None
+        try:
+            conn.send(
+                (
+                    "init",
+                    self.genome_breeder,
+                    self.fps,
+                    self.heartbeat_timeout / 3,
+                    self.record,
+                    self.terrain,
+                )
+            )
+            while not self._closed.is_set():
+                try:
+                    task = self._tasks.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if task.task_id not in self._pending:
+                    # Already completed by another worker
+                    task = None
+                    continue
+
+                conn.send(
+                    (
+                        "task",
+                        task.task_id,
+                        task.genomes,
+                        task.generation,
+                        task.scenarios,
+                    )
+                )
+                last_message = time.time()
+                cancelled = False
+                while True:
+                    if conn.poll(0.5):
+                        message = conn.recv()
+                        last_message = time.time()
+                        if message[0] in ("result", "error"):
+                            break
+                    elif time.time() - last_message > self.heartbeat_timeout:
+                        raise TimeoutError("no heartbeat")
+
+                    if not cancelled:
+                        with self._done:
+                            cancelled = (
+                                task.task_id not in self._pending
+                                or self._closed.is_set()
+                            )
+                        if cancelled:
+                            conn.send(("cancel", task.task_id))
+
+                if message[0] == "error":
+                    self._fail(task, message[2])
+                    task = None
+                    continue
+
+                _, task_id, results, stats = message
+                with self._done:
+                    if self._pending.pop(task_id, None) is not None:
+                        self._results[task_id] = (results, stats)
+                    self._done.notify_all()
+                task = None
+
+            conn.send(("stop",))
+        except (EOFError, OSError, TimeoutError) as e:
+            print(f"Lost worker ({type(e).__name__}: {e})")
+            with self._done:
+                self.lost_workers += 1
+            if task is not None:
+                self._tasks.put(task)
+        finally:
+            with self._done:
+                self.n_workers -= 1
+            conn.close()
+
+    def _fail(self, task: Task, error: str) -> None:
+        """
+        Retries `task`, whose evaluation raised `error`, or gives its genomes
+        `CRASH_SCORE` once it has failed `max_task_retries` times.
+        """
+        task.retries += 1
+        record: Dict[str, Any] = {
+            "generation": task.generation,
+            "timestamp": time.time(),
+            "genomes": list(range(task.start, task.start + len(task.genomes))),
+            "error": error,
+            "retries": task.retries,
+        }
+        print(f"Evaluation of genomes {record['genomes']} failed: {error}")
+        with self._done:
+            if task.task_id not in self._pending:
+                # Cancelled, or completed by another worker
+                return
+            if task.retries >= self.max_task_retries:
+                crashed = [WalkerResult(CRASH_SCORE, 0) for _ in task.genomes]
+                self._results[task.task_id] = (crashed, GenerationStats())
+                del self._pending[task.task_id]
+                record["crash_score"] = CRASH_SCORE
+                self._done.notify_all()
+            else:
+                self._tasks.put(task)
+            self.failures.append(record)
+
+    def pop_failures(self) -> List[Dict[str, Any]]:
+        """
+        Failures since the last call.
+        """
+        with self._done:
+            failures, self.failures = self.failures, []
+        return failures
+
+    def evaluate(
+        self,
+        genomes: List[Genome],
+        generation: int,
+        quit_flag: Optional[Event] = None,
+        scenarios: Optional[List[Scenario]] = None,
+        walkers_per_genome: int = 1,
+    ) -> Tuple[List[WalkerResult], GenerationStats]:
+        """
+        Evaluates `genomes`, in their `scenarios` if given, on the workers and
+        returns their results in order, and the merged stats of the workers.
+        The `walkers_per_genome` consecutive walkers of a genome (one per
+        scenario) are sent in the same task. If `quit_flag` is set, stops
+        waiting and the genomes of the unfinished tasks get a NaN score.
+        """
+        n_genomes = len(genomes) // walkers_per_genome
+        genomes_per_task = max(self.chunk_size // walkers_per_genome, 1)
+        n_tasks = int(np.ceil(n_genomes / genomes_per_task))
+        tasks: List[Task] = []
+        with self._done:
+            for chunk in split_walkers(
+                np.arange(len(genomes)), n_tasks, walkers_per_genome
+            ):
+                task = Task(
+                    self._next_task_id,
+                    int(chunk[0]),
+                    [genomes[i] for i in chunk],
+                    generation,
+                    [scenarios[i] for i in chunk] if scenarios is not None else None,
+                )
+                self._next_task_id += 1
+                self._pending[task.task_id] = task
+                tasks.append(task)
+        for task in tasks:
+            self._tasks.put(task)
+
+        waiting_since = time.time()
+        with self._done:
+            while any(t.task_id in self._pending for t in tasks):
+                if quit_flag is not None and quit_flag.is_set():
+                    for t in tasks:
+                        if self._pending.pop(t.task_id, None) is not None:
+                            unfinished = [WalkerResult(np.nan, None) for _ in t.genomes]
+                            self._results[t.task_id] = (unfinished, GenerationStats())
+                    break
+                if self.n_workers == 0 and time.time() - waiting_since > 10:
+                    print(f"Waiting for workers on {self.address[0]}:{self.address[1]}")
+                    waiting_since = time.time()
+                self._done.wait(timeout=0.5)
+
+            outputs = [self._results.pop(t.task_id) for t in tasks]
+
+        results: List[WalkerResult] = []
+        for task_results, _ in outputs:
+            results += task_results
+        return results, GenerationStats.merged(s for _, s in outputs)
+
+    def close(self) -> None:
+        self._closed.set()
+        self.listener.close()
+        for p in self._local_workers:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+
+def run_worker(address: Address, authkey: bytes, retry: float = 30) -> None:
+    """
+    Connects to the coordinator at `address` and evaluates its tasks until it
+    stops. Retries connecting for `retry` seconds. Ctrl-C stops the worker.
+    """
+    try:
+        _run_worker(address, authkey, retry)
+    except KeyboardInterrupt:
+        pass
+
+
+def _run_worker(address: Address, authkey: bytes, retry: float) -> None:
+    deadline = time.time() + retry
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+    message = conn.recv()
+    assert message[0] == "init", f"Unexpected message {message[0]}"
+    _, genome_breeder, fps, heartbeat_interval, record, terrain = message
+    body_def = genome_breeder.body_def
+    compile_body(body_def)
+
+    send_lock = threading.Lock()
+    evaluating = threading.Event()
+
+    def heartbeat():
+        while not conn.closed:
+            if evaluating.wait(timeout=heartbeat_interval):
+                with send_lock:
+                    try:
+                        conn.send(("heartbeat",))
+                    except OSError:
+                        return
+                time.sleep(heartbeat_interval)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    # Messages are received in a thread of their own, so a "cancel" reaches
+    # the frame loop of the task being evaluated
+    messages: "queue.Queue[tuple]" = queue.Queue()
+    cancel = threading.Event()
+    cancel_lock = threading.Lock()
+    cancelled_tasks: Set[int] = set()
+    current_task: List[Optional[int]] = [None]
+
+    def receive():
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == "cancel":
+                    with cancel_lock:
+                        cancelled_tasks.add(message[1])
+                        if current_task[0] == message[1]:
+                            cancel.set()
+                    continue
+                messages.put(message)
+                if message[0] == "stop":
+                    return
+        except (EOFError, OSError):
+            # The coordinator is gone, or dropped this worker
+            cancel.set()
+            messages.put(("stop",))
+
+    threading.Thread(target=receive, daemon=True).start()
+
+    try:
+        while True:
+            message = messages.get()
+            if message[0] == "stop":
+                break
+
+            _, task_id, genomes, generation, scenarios = message
+            with cancel_lock:
+                current_task[0] = task_id
+                if task_id in cancelled_tasks:
+                    cancel.set()
+                else:
+                    cancel.clear()
+            evaluating.set()
+            stats = GenerationStats()
+            results: List[WalkerResult] = []
+            reply: tuple
+            try:
+                run_a_generation(
+                    body_def,
+                    genomes,
+                    fps,
+                    generation,
+                    stats=stats,
+                    results=results,
+                    record=record,
+                    cancel=cancel,
+                    scenarios=scenarios,
+                    terrain=terrain,
+                )
+                reply = ("result", task_id, results, stats)
+            except Exception as e:
+                # A genome that raises fails its task, not the worker
+                reply = ("error", task_id, repr(e))
+            finally:
+                evaluating.clear()
+                with cancel_lock:
+                    current_task[0] = None
+                    cancelled_tasks.discard(task_id)
+
+            with send_lock:
+                conn.send(reply)
+    except OSError:
+        # The coordinator is gone, or dropped this worker
+        pass
+    finally:
+        conn.close()
+
+
+def _run_coordinated_worker(address: Address, authkey: bytes) -> None:
+    # Ctrl-C is handled by the simulation, which cancels the tasks
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_worker(address, authkey)
+
+
+def start_local_workers(
+    address: Address,
+    n_workers: int,
+    authkey: bytes,
+    target: Callable[[Address, bytes], None] = run_worker,
+) -> List[mp.Process]:
+    """
+    Starts `n_workers` worker processes. The workers of a coordinator are
+    started with `_run_coordinated_worker`, they ignore Ctrl-C.
+    """
+    processes: List[mp.Process] = []
+    for _ in range(n_workers):
+        p = mp.Process(target=target, args=(address, authkey), daemon=True)
+        p.start()
+        processes.append(p)
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start a worker node.")
+    parser.add_argument("address", type=str, help="HOST:PORT of the coordinator.")
+    parser.add_argument(
+        "-j", "--n_processes", type=int, default=1, help="Workers on this node."
+    )
+    args = parser.parse_args()
+
+    authkey = environment_authkey()
+    if authkey is None:
+        parser.error(f"set {AUTHKEY_VARIABLE} to the key of the coordinator")
+
+    address = parse_address(args.address)
+    workers = start_local_workers(address, args.n_processes, authkey)
+    try:
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        # The workers also got the Ctrl-C and stop themselves
+        for p in workers:
+            p.join()
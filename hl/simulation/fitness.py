@@ -0,0 +1,260 @@
+"""
+Fitness functions over the recorded states of the walkers.
+
+When recording, every walker stores its state once per frame, and the states
+of a generation are gathered into `Episodes`, arrays with one row per walker.
+A fitness function takes `Episodes` and returns the score of every walker, so
+its terms are computed for the whole batch at once. Recorded episodes can be
+saved and scored again under other fitness functions without simulating them:
+
+    $ python -m hl.simulation.fitness gen=3_episodes.npz -f default distance
+
+Fitness functions are given by name: the ones of `FITNESS_FUNCTIONS`, or any
+function importable as "package.module:function".
+"""
+
+import argparse
+import importlib
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from hl.io.body_def import BodyDef
+from hl.simulation.person import WalkerResult
+from hl.simulation.telemetry import score_summary
+
+
+class Episodes:
+    """
+    Recorded states of a batch of walkers. Row t of a walker is its state
+    after t steps of the world, row 0 being its spawn pose, and the rows after
+    the end of its episode are NaN:
+        positions:      (walkers, frames, parts, 2) origin of every part
+        angles:         (walkers, frames, parts)
+        joint_speeds:   (walkers, frames, joints)
+    The parts and joints are in the order of `parts` and `joints`, which is
+    the order of the body definition. `death_frames` is the frame at which
+    every walker died (-1 if its episode did not finish), and `energies` the
+    work of its motors.
+    """
+
+    def __init__(
+        self,
+        states: np.ndarray,
+        lengths: np.ndarray,
+        death_frames: np.ndarray,
+        energies: np.ndarray,
+        parts: List[str],
+        joints: List[str],
+    ):
+        # Recordings are single precision, like Box2D, so the conversion to
+        # double is exact
+        self.states = states.astype(float)
+        self.lengths = lengths
+        self.death_frames = death_frames
+        self.energies = energies
+        self.parts = parts
+        self.joints = joints
+
+    @staticmethod
+    def from_results(results: Sequence[WalkerResult], body_def: BodyDef) -> "Episodes":
+        """
+        Gathers the recordings of `results`. The walkers without recording,
+        e.g. left unevaluated by a cancelled generation, have no rows.
+        """
+        parts, joints = list(body_def.body), list(body_def.joints)
+        width = 3 * len(parts) + len(joints)
+        lengths = np.array(
+            [0 if r.recording is None else len(r.recording) for r in results]
+        )
+        states = np.full((len(results), max(lengths, default=0), width), np.nan)
+        for i, result in enumerate(results):
+            if result.recording is not None:
+                states[i, : lengths[i]] = result.recording
+        death_frames = np.array(
+            [-1 if r.death_frame is None else r.death_frame for r in results]
+        )
+        energies = np.array(
+            [np.nan if r.energy is None else r.energy for r in results], dtype=float
+        )
+        return Episodes(states, lengths, death_frames, energies, parts, joints)
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    @property
+    def positions(self) -> np.ndarray:
+        n_parts = len(self.parts)
+        bodies = self.states[:, :, : 3 * n_parts]
+        return bodies.reshape(len(self), -1, n_parts, 3)[..., :2]
+
+    @property
+    def angles(self) -> np.ndarray:
+        n_parts = len(self.parts)
+        bodies = self.states[:, :, : 3 * n_parts]
+        return bodies.reshape(len(self), -1, n_parts, 3)[..., 2]
+
+    @property
+    def joint_speeds(self) -> np.ndarray:
+        return self.states[:, :, 3 * len(self.parts) :]
+
+    @property
+    def finished(self) -> np.ndarray:
+        return self.death_frames >= 0
+
+    def part(self, name: str) -> np.ndarray:
+        """
+        Positions of the part `name`, (walkers, frames, 2).
+        """
+        return self.positions[:, :, self.parts.index(name)]
+
+    def frames(self, first: int = 0, last: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Mask (walkers, frames) of the rows from `first` to `last` (per walker,
+        included), by default to the last row of every walker.
+        """
+        if last is None:
+            last = self.lengths - 1
+        t = np.arange(self.states.shape[1])[None, :]
+        return (t >= first) & (t <= np.asarray(last)[:, None])
+
+    def at(self, values: np.ndarray, frames: np.ndarray) -> np.ndarray:
+        """
+        Values of `values` (walkers, frames, ...) at the frame of every walker
+        in `frames`. Negative frames count from the end of every episode.
+        """
+        frames = np.where(frames < 0, self.lengths + frames, frames)
+        frames = np.clip(frames, 0, max(values.shape[1] - 1, 0))
+        return values[np.arange(len(self)), frames]
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            states=self.states.astype(np.float32),
+            lengths=self.lengths,
+            death_frames=self.death_frames,
+            energies=self.energies,
+            parts=np.array(self.parts),
+            joints=np.array(self.joints),
+        )
+
+    @staticmethod
+    def load(path: str) -> "Episodes":
+        data = np.load(path)
+        return Episodes(
+            data["states"],
+            data["lengths"],
+            data["death_frames"],
+            data["energies"],
+            data["parts"].tolist(),
+            data["joints"].tolist(),
+        )
+
+
+FitnessFunction = Callable[[Episodes], np.ndarray]
+
+
+def default_fitness(episodes: Episodes) -> np.ndarray:
+    """
+    The score of `PersonSimulation`: the distance walked, minus penalties for
+    long steps, bobbing the head and keeping a foot in front of the other.
+    Sums are accumulated frame by frame like the simulation does, so the
+    scores are the same. Unfinished episodes get NaN.
+    """
+    front, back = episodes.part("leg_f"), episodes.part("leg_b")
+    head_y = episodes.part("head")[:, :, 1]
+    death = episodes.death_frames
+
+    # The metrics are updated with the states of rows 1 to the death frame,
+    # the distance is measured at the next one
+    updated = episodes.frames(1, death)
+    feet = front[:, :, 0] - back[:, :, 0]
+    step = np.abs(feet)
+
+    def total(values: np.ndarray) -> np.ndarray:
+        return episodes.at(np.where(updated, values, 0.0).cumsum(axis=1), death)
+
+    step_penalty = total(np.where(step > 1, (step - 1) * 10.0, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        head_bob = total(np.abs(head_y - head_y[:, :1])) / death
+        feet_asymmetry = np.abs(total(feet) / death)
+    distance = episodes.at((front[:, :, 0] + back[:, :, 0]) / 2, death + 1)
+
+    penalties = step_penalty + head_bob * 10.0
+    penalties = penalties + feet_asymmetry * 1.0
+    return np.where(episodes.finished, distance - penalties, np.nan)
+
+
+def distance_fitness(episodes: Episodes) -> np.ndarray:
+    """
+    Distance walked, the mean x of the legs at the end of the episode.
+    """
+    front, back = episodes.part("leg_f"), episodes.part("leg_b")
+    return episodes.at((front[:, :, 0] + back[:, :, 0]) / 2, np.full(len(episodes), -1))
+
+
+def cost_of_transport_fitness(episodes: Episodes) -> np.ndarray:
+    """
+    Minus the energy used per unit of distance walked. Walkers that barely
+    moved are counted as having walked 0.1.
+    """
+    return -episodes.energies / np.maximum(distance_fitness(episodes), 0.1)
+
+
+FITNESS_FUNCTIONS: Dict[str, FitnessFunction] = {
+    "default": default_fitness,
+    "distance": distance_fitness,
+    "cost_of_transport": cost_of_transport_fitness,
+}
+
+
+def register_fitness(name: str, function: FitnessFunction) -> None:
+    FITNESS_FUNCTIONS[name] = function
+
+
+def get_fitness(name: str) -> FitnessFunction:
+    """
+    Returns the fitness function registered as `name`, or imports it if
+    `name` is "package.module:function".
+    """
+    if name in FITNESS_FUNCTIONS:
+        return FITNESS_FUNCTIONS[name]
+    if ":" in name:
+        module, function = name.split(":", 1)
+        return getattr(importlib.import_module(module), function)
+    raise ValueError(
+        f"Unknown fitness: '{name}'. Select from: {list(FITNESS_FUNCTIONS)}"
+        " or give a 'package.module:function'"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score recorded episodes with fitness functions."
+    )
+    parser.add_argument("episodes", type=str, nargs="+", help="Saved episodes.")
+    parser.add_argument(
+        "-f",
+        "--fitness",
+        type=str,
+        nargs="+",
+        default=list(FITNESS_FUNCTIONS),
+        help="Fitness functions, by name or as 'package.module:function'.",
+    )
+    args = parser.parse_args()
+
+    functions = {name: get_fitness(name) for name in args.fitness}
+    for path in args.episodes:
+        episodes = Episodes.load(path)
+        print(f"{path}: {len(episodes)} walkers, {episodes.finished.sum()} finished")
+        for name, function in functions.items():
+            scores = function(episodes)
+            summary = score_summary(scores[episodes.finished])
+            if len(summary) == 0:
+                print(f"  {name}: no finished walker")
+                continue
+            best = int(np.nanargmax(np.where(episodes.finished, scores, np.nan)))
+            print(
+                f"  {name}: max {summary['max']:.3f} (walker {best}),"
+                f" mean {summary['mean']:.3f}, median {summary['p50']:.3f}"
+            )
@@ -1,10 +1,27 @@
 from typing import Any, Dict
-from .array_genome import ArrayGenomeBreeder
-from .sine_genome import SineGenomeBreeder
 from .genome import GenomeBreeder
 
 
-GENOME_CHOICES = ["sine", "s", "array", "a"]
+GENOME_CHOICES = ["sine", "s", "array", "a", "feedback", "f"]
+
+
+# The breeders are imported lazily, so that importing a single genome family
+# (e.g. from a worker process) does not pull in the dependencies of the others.
+# `ArrayGenomeBreeder` in particular imports pandas.
+def __getattr__(name: str) -> Any:
+    if name == "ArrayGenomeBreeder":
+        from .array_genome import ArrayGenomeBreeder
+
+        return ArrayGenomeBreeder
+    if name == "SineGenomeBreeder":
+        from .sine_genome import SineGenomeBreeder
+
+        return SineGenomeBreeder
+    if name == "FeedbackGenomeBreeder":
+        from .feedback_genome import FeedbackGenomeBreeder
+
+        return FeedbackGenomeBreeder
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_genome_breeder(
@@ -39,11 +56,21 @@ def get_genome_breeder(
     }
 
     if genome_type in ["sine", "s"]:
+        from .sine_genome import SineGenomeBreeder
+
         return SineGenomeBreeder(**genome_params)
     elif genome_type in ["array", "a"]:
+        from .array_genome import ArrayGenomeBreeder
+
         genome_params["number_actions_loop"] = loop_time * actions_per_second
         genome_params["random_mutation_occurence"] = 0.5
         return ArrayGenomeBreeder(**genome_params)
+    elif genome_type in ["feedback", "f"]:
+        from .feedback_genome import FeedbackGenomeBreeder
+        from .sine_genome import SineGenomeBreeder
+
+        # Sine genomes corrected by the sensors of the walker
+        return FeedbackGenomeBreeder(SineGenomeBreeder(**genome_params))
     else:
         raise ValueError(
             f"Unknown genome type: '{genome_type}'. Select from: {GENOME_CHOICES}"
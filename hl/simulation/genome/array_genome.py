@@ -23,6 +23,19 @@ class ArrayGenome(Genome):
         loop_index = t % len(self.actions_loop)
         return dict(self.actions_loop[loop_index])
 
+    def to_vector(self) -> np.ndarray:
+        return self.actions_loop.to_numpy(dtype=float).ravel()
+
+    def from_vector(self, vector: np.ndarray) -> "ArrayGenome":
+        return ArrayGenome(
+            pd.DataFrame(
+                data=vector.reshape(self.actions_loop.shape),
+                index=self.actions_loop.index,
+                columns=self.actions_loop.columns,
+            ),
+            self.actions_first_step,
+        )
+
 
 class ArrayGenomeBreeder(GenomeBreeder):
     def __init__(
@@ -45,11 +58,16 @@ class ArrayGenomeBreeder(GenomeBreeder):
 
         self.random_mutation_occurence = random_mutation_occurence
 
+    @property
+    def mutation_rate(self) -> float:
+        return self.random_mutation_occurence
+
     def get_random_genome(self) -> ArrayGenome:
         # For now all angles are 0
         # random_angles = get_random_body_angles(body_path, 0.0)
         random_loop_actions = pd.DataFrame(
-            data=np.random.rand(len(self.body_def.joints), self.number_actions_loop) * 2
+            data=self.rng.random((len(self.body_def.joints), self.number_actions_loop))
+            * 2
             - 1,
             index=self.body_def.joints.keys(),
         )
@@ -60,7 +78,8 @@ class ArrayGenomeBreeder(GenomeBreeder):
 
     def get_empty_genome(self) -> ArrayGenome:
         zeroes_loop_actions = pd.DataFrame(
-            data=np.random.rand(len(self.body_def.joints), self.number_actions_loop) * 2
+            data=self.rng.random((len(self.body_def.joints), self.number_actions_loop))
+            * 2
             - 1,
             index=self.body_def.joints.keys(),
         )
@@ -72,12 +91,14 @@ class ArrayGenomeBreeder(GenomeBreeder):
         self,
         parent_genomes: List[ArrayGenome],
         distr: List[float],
+        mutation_rate: Optional[float] = None,
     ) -> ArrayGenome:
         """
         Breed two genomes.
 
         It selects the parents and given its normalized distribution creates a child by
-        crossing their genes using chunks of n-size.
+        crossing their genes using chunks of n-size. `mutation_rate` overrides the
+        `random_mutation_occurence` of the breeder.
         """
         if not len(parent_genomes) == len(distr):
             raise (
@@ -92,10 +113,12 @@ class ArrayGenomeBreeder(GenomeBreeder):
         gnome_index = 0
         while gnome_index < self.number_actions_loop:
             # Choose parents
-            parent_genome: Genome = np.random.choice(parent_genomes, p=distr)
+            parent_genome: Genome = parent_genomes[
+                self.rng.choice(len(parent_genomes), p=distr)
+            ]
 
             # Choose the gene to add
-            gene_idx = np.random.randint(
+            gene_idx = self.rng.integers(
                 self.min_idx_step_breeding, self.max_idx_step_breeding
             )
             gene_idx = min(gnome_index + gene_idx, self.number_actions_loop)
@@ -107,15 +130,17 @@ class ArrayGenomeBreeder(GenomeBreeder):
             gnome_index = gene_idx
 
         # Mutate the genome
-        randarr = np.random.choice(
+        if mutation_rate is None:
+            mutation_rate = self.random_mutation_occurence
+        randarr = self.rng.choice(
             [True, False],
             size=self.number_actions_loop * len(self.body_def.joints),
-            p=[self.random_mutation_occurence, 1 - self.random_mutation_occurence],
+            p=[mutation_rate, 1 - mutation_rate],
         )
         randmat = np.reshape(
             randarr, (len(self.body_def.joints), self.number_actions_loop)
         )
-        child.actions_loop.iloc[randmat] = np.random.random(
+        child.actions_loop.iloc[randmat] = self.rng.random(
             size=np.count_nonzero(randmat)
         )
 
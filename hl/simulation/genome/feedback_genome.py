@@ -0,0 +1,127 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hl.simulation.genome.genome import Genome, GenomeBreeder
+from hl.simulation.sensors import SensorLayout
+
+
+# Bound of the correction added by the feedback to the value of a joint
+MAX_FEEDBACK = 1.0
+
+
+class FeedbackGenome(Genome):
+    """
+    Open-loop `base` genome corrected by linear feedback: the value of joint
+    i is the one of `base` plus `gains[i] @ observation`, bounded by
+    `MAX_FEEDBACK`. `joints` are the joints of the rows of `gains`, its
+    columns are the ones of `SensorLayout`.
+    """
+
+    closed_loop = True
+
+    def __init__(self, base: Genome, joints: List[str], gains: np.ndarray):
+        super().__init__()
+
+        self.base = base
+        self.joints = joints
+        self.gains = gains
+
+    def step(self, t: int) -> Dict[str, float]:
+        return self.base.step(t)
+
+    def act(self, t: int, observation: np.ndarray) -> Dict[str, float]:
+        values = self.base.step(t)
+        # np.clip is slow on vectors this small
+        feedback = np.minimum(
+            np.maximum(self.gains.dot(observation), -MAX_FEEDBACK), MAX_FEEDBACK
+        )
+        for joint_id, correction in zip(self.joints, feedback.tolist()):
+            values[joint_id] = values.get(joint_id, 0.0) + correction
+        return values
+
+    def to_vector(self) -> np.ndarray:
+        return np.concatenate([self.base.to_vector(), self.gains.ravel()])
+
+    def from_vector(self, vector: np.ndarray) -> "FeedbackGenome":
+        n_base = len(vector) - self.gains.size
+        return FeedbackGenome(
+            self.base.from_vector(vector[:n_base]),
+            self.joints,
+            vector[n_base:].reshape(self.gains.shape),
+        )
+
+
+class FeedbackGenomeBreeder(GenomeBreeder):
+    """
+    Breeds `FeedbackGenome`s over the genomes of the `base` breeder, which
+    breeds their open-loop part. Random gains are drawn around 0 with a
+    standard deviation of `gain_scale`, so the first walkers are close to
+    open-loop ones. Children take every row of gains from a parent.
+    """
+
+    def __init__(
+        self,
+        base: GenomeBreeder,
+        gain_scale: float = 0.05,
+        mutation_rate: float = 0.2,
+        mutation_scale: float = 0.05,
+    ):
+        self.base = base
+        super().__init__(base.body_def.path)
+        self.layout = SensorLayout(self.body_def)
+        self.gain_scale = gain_scale
+        self.mutation_rate = mutation_rate
+        self.mutation_scale = mutation_scale
+
+    # The simulation replaces the stream of the breeder before every child,
+    # the base breeder draws from the same one
+    @property
+    def rng(self) -> np.random.Generator:
+        return self.base.rng
+
+    @rng.setter
+    def rng(self, rng: np.random.Generator) -> None:
+        self.base.rng = rng
+
+    @property
+    def _gains_shape(self) -> Tuple[int, int]:
+        return len(self.layout.joints), self.layout.size
+
+    def get_empty_genome(self) -> FeedbackGenome:
+        return FeedbackGenome(
+            self.base.get_empty_genome(),
+            self.layout.joints,
+            np.zeros(self._gains_shape),
+        )
+
+    def get_random_genome(self) -> FeedbackGenome:
+        base = self.base.get_random_genome()
+        gains = self.rng.normal(scale=self.gain_scale, size=self._gains_shape)
+        return FeedbackGenome(base, self.layout.joints, gains)
+
+    def get_genome_from_breed(
+        self,
+        parent_genomes: List[FeedbackGenome],
+        distr: List[float],
+        mutation_rate: Optional[float] = None,
+    ) -> FeedbackGenome:
+
+        mr = self.mutation_rate if mutation_rate is None else mutation_rate
+
+        base = self.base.get_genome_from_breed(
+            [parent.base for parent in parent_genomes], distr, mutation_rate
+        )
+
+        rows = self.rng.choice(
+            len(parent_genomes), size=len(self.layout.joints), p=distr
+        )
+        gains = np.array(
+            [parent_genomes[parent].gains[i] for i, parent in enumerate(rows)]
+        )
+        mutated = self.rng.random(gains.shape) < mr
+        gains += np.where(
+            mutated, self.rng.normal(scale=self.mutation_scale, size=gains.shape), 0
+        )
+
+        return FeedbackGenome(base, self.layout.joints, gains)
@@ -1,21 +1,55 @@
 from abc import abstractmethod
 from typing import Dict, List, Optional
 
+import numpy as np
+
 from hl.io.body_def import BodyDef
 
 
 class Genome:
+    # Closed-loop genomes get the observation of their walker, see `act`
+    closed_loop = False
+
     def __init__(self):
         pass
 
     def step(self, t: int) -> Dict[str, float]:
         pass
 
+    def act(self, t: int, observation: np.ndarray) -> Dict[str, float]:
+        """
+        Motor values of frame `t`, given the `observation` of the walker (see
+        `SensorLayout`). Only called for closed-loop genomes, open-loop ones
+        only depend on `t`.
+        """
+        return self.step(t)
+
+    def to_vector(self) -> np.ndarray:
+        """
+        Returns the parameters of the genome as a flat vector, in the same
+        order for every genome of the family.
+        """
+        raise NotImplementedError()
+
+    def from_vector(self, vector: np.ndarray) -> "Genome":
+        """
+        Returns a genome of the same family and shape as this one, with the
+        parameters of `vector`, as returned by `to_vector`.
+        """
+        raise NotImplementedError()
+
 
 # What was first? the genome or the breeder?
 class GenomeBreeder:
+    # Probability of mutation of the bred genomes, when `get_genome_from_breed`
+    # is not given one
+    mutation_rate: float
+
     def __init__(self, body_path: str):
         self.body_def = BodyDef(body_path)
+        # Source of all the randomness of the breeder. The simulation replaces
+        # it with the stream of every child before creating it.
+        self.rng = np.random.default_rng()
 
     @abstractmethod
     def get_random_genome(self) -> Genome:
@@ -25,6 +25,22 @@ class SineGenome(Genome):
     def step(self, t: int) -> Dict[str, float]:
         return {joint_id: self._func(gene, t) for joint_id, gene in self.genes.items()}
 
+    def to_vector(self) -> np.ndarray:
+        return np.array(
+            [
+                [gene.amplitud, gene.frequency, gene.phase, gene.base]
+                for gene in self.genes.values()
+            ]
+        ).ravel()
+
+    def from_vector(self, vector: np.ndarray) -> "SineGenome":
+        return SineGenome(
+            {
+                joint_id: SineGene(*values)
+                for joint_id, values in zip(self.genes, vector.reshape(-1, 4))
+            }
+        )
+
 
 class SineGenomeBreeder(GenomeBreeder):
     def __init__(
@@ -47,10 +63,10 @@ class SineGenomeBreeder(GenomeBreeder):
     def get_random_genome(self) -> SineGenome:
         genes = dict()
         for joint_id in self.body_def.joints:
-            amp = np.random.uniform(0, 1)
-            freq = np.random.uniform(0, 1)
-            phase = np.random.uniform(0, 6)
-            base = np.random.uniform(-1.5, 1.5)
+            amp = self.rng.uniform(0, 1)
+            freq = self.rng.uniform(0, 1)
+            phase = self.rng.uniform(0, 6)
+            base = self.rng.uniform(-1.5, 1.5)
             genes[joint_id] = SineGene(amp, freq, phase, base)
 
         return SineGenome(genes)
@@ -66,7 +82,9 @@ class SineGenomeBreeder(GenomeBreeder):
 
         genome = self.get_random_genome()
         for joint_id in genome.genes:
-            parent_genome: SineGenome = np.random.choice(parent_genomes, p=distr)
+            parent_genome: SineGenome = parent_genomes[
+                self.rng.choice(len(parent_genomes), p=distr)
+            ]
 
             params = ["amplitud", "frequency", "phase", "base"]
 
@@ -74,8 +92,8 @@ class SineGenomeBreeder(GenomeBreeder):
             for p in params:
                 val = getattr(parent_genome.genes[joint_id], p)
 
-                if np.random.random() < mr:
-                    val += np.random.normal(scale=self.mutation_scale)
+                if self.rng.random() < mr:
+                    val += self.rng.normal(scale=self.mutation_scale)
 
                 setattr(genome.genes[joint_id], p, val)
 
@@ -57,6 +57,21 @@ class SineGenome(Genome):
 
         return values
 
+    def to_vector(self) -> np.ndarray:
+        vector: List[float] = []
+        for joint in Joints:
+            gene = self.genes[joint]
+            vector += [gene.amplitud, gene.frequency, gene.phase]
+        return np.array(vector)
+
+    def from_vector(self, vector: np.ndarray) -> "SineGenome":
+        return SineGenome(
+            {
+                joint: SineGene(*values)
+                for joint, values in zip(Joints, vector.reshape(-1, 3))
+            }
+        )
+
 
 class SineGenomeBreeder(GenomeBreeder):
     def __init__(
@@ -79,9 +94,9 @@ class SineGenomeBreeder(GenomeBreeder):
     def get_random_genome(self) -> SineGenome:
         genes = dict()
         for joint_id in Joints:
-            amp = np.random.uniform(0, 1)
-            freq = np.random.uniform(0, 1)
-            phase = np.random.uniform(0, 6)
+            amp = self.rng.uniform(0, 1)
+            freq = self.rng.uniform(0, 1)
+            phase = self.rng.uniform(0, 6)
             genes[joint_id] = SineGene(amp, freq, phase)
 
         return SineGenome(genes)
@@ -97,7 +112,9 @@ class SineGenomeBreeder(GenomeBreeder):
 
         genome = self.get_random_genome()
         for joint_id in genome.genes:
-            parent_genome: SineGenome = np.random.choice(parent_genomes, p=distr)
+            parent_genome: SineGenome = parent_genomes[
+                self.rng.choice(len(parent_genomes), p=distr)
+            ]
 
             params = ["amplitud", "frequency", "phase"]
 
@@ -105,8 +122,8 @@ class SineGenomeBreeder(GenomeBreeder):
             for p in params:
                 val = getattr(parent_genome.genes[joint_id], p)
 
-                if np.random.random() < mr:
-                    val += np.random.normal(scale=self.mutation_scale)
+                if self.rng.random() < mr:
+                    val += self.rng.normal(scale=self.mutation_scale)
 
                 setattr(genome.genes[joint_id], p, val)
 
@@ -72,6 +72,20 @@ class SineGenome(Genome):
 
         return values
 
+    def to_vector(self) -> np.ndarray:
+        vector = [self.frequency]
+        for joint_id in JointType:
+            for gene in self.genes[joint_id]:
+                vector += [gene.amplitud, gene.phase]
+        return np.array(vector)
+
+    def from_vector(self, vector: np.ndarray) -> "SineGenome":
+        values = vector[1:].reshape(len(JointType), FOURIER_COUNT, 2)
+        genes: Dict[JointType, JointGene] = dict()
+        for joint_id, joint_values in zip(JointType, values):
+            genes[joint_id] = [SineGene(*gene) for gene in joint_values]
+        return SineGenome(genes, vector[0])
+
 
 class SineGenomeBreeder(GenomeBreeder):
     def __init__(
@@ -96,22 +110,22 @@ class SineGenomeBreeder(GenomeBreeder):
         for joint_id in JointType:
             genes[joint_id] = list()
             for _ in range(FOURIER_COUNT):
-                amp = np.random.uniform(*LIMITS["amplitud"])
-                phase = np.random.uniform(*LIMITS["phase"])
+                amp = self.rng.uniform(*LIMITS["amplitud"])
+                phase = self.rng.uniform(*LIMITS["phase"])
                 genes[joint_id].append(SineGene(amp, phase))
 
-        freq = np.random.uniform(*LIMITS["frequency"])
+        freq = self.rng.uniform(*LIMITS["frequency"])
 
         return SineGenome(genes, freq)
 
     def _get_parent_genome(
         self, parent_genomes: List[SineGenome], distr: List[float]
     ) -> SineGenome:
-        return np.random.choice(parent_genomes, p=distr)
+        return parent_genomes[self.rng.choice(len(parent_genomes), p=distr)]
 
     def _get_mutation(self, var_name: str) -> float:
         low, high = LIMITS[var_name]
-        return np.random.normal(scale=self.mutation_scale * (high - low))
+        return self.rng.normal(scale=self.mutation_scale * (high - low))
 
     def get_genome_from_breed(
         self,
@@ -139,7 +153,7 @@ class SineGenomeBreeder(GenomeBreeder):
                 for p in ["amplitud", "phase"]:
                     val = getattr(parent_gene[i], p)
 
-                    if np.random.random() < mr:
+                    if self.rng.random() < mr:
                         val += self._get_mutation(p)
 
                     setattr(gene, p, val)
@@ -150,7 +164,7 @@ class SineGenomeBreeder(GenomeBreeder):
 
         val = self._get_parent_genome(parent_genomes, distr).frequency
 
-        if np.random.random() < mr:
+        if self.rng.random() < mr:
             val += self._get_mutation("frequency")
 
         genome.frequency = val
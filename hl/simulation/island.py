@@ -0,0 +1,253 @@
+import os
+import queue
+import multiprocessing as mp
+from multiprocessing.synchronize import Event
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from hl.simulation.genome.genome import Genome, GenomeBreeder
+from hl.simulation.rng import RNGStreams, Seed
+from hl.simulation.simulation import Simulation
+from hl.utils import ASSETS_PATH
+
+
+TOPOLOGIES = ["ring", "full"]
+
+# (source island, generation, [(genome, score, objectives), ...])
+Migration = Tuple[int, int, List[Tuple[Genome, float, np.ndarray]]]
+# Generation of the message sent on behalf of an island that stopped
+LEAVING = -1
+
+
+def get_destinations(topology: str, n_islands: int) -> Dict[int, List[int]]:
+    """
+    Returns the islands every island sends its migrants to.
+        ring: island i sends to island i + 1
+        full: every island sends to every other island
+    """
+    if topology == "ring":
+        return {i: [(i + 1) % n_islands] for i in range(n_islands) if n_islands > 1}
+    elif topology == "full":
+        return {i: [j for j in range(n_islands) if j != i] for i in range(n_islands)}
+    raise ValueError(f"Unknown topology {topology}, choose from {TOPOLOGIES}")
+
+
+class IslandSimulation(Simulation):
+    """
+    Simulation of one island of an `IslandModel`. It evolves its own
+    sub-population and, every `migration_interval` generations, sends its
+    `n_migrants` best genomes to its destination islands and replaces its
+    worst genomes by the ones it receives.
+
+    Islands wait for the migrants of all their sources, so a run with a given
+    seed is reproducible. An island that stops early, e.g. because it
+    converged, tells its destinations not to wait for it anymore.
+    """
+
+    def __init__(
+        self,
+        *args,
+        island: int = 0,
+        migration_interval: int = 5,
+        n_migrants: int = 2,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.island = island
+        self.migration_interval = migration_interval
+        self.n_migrants = n_migrants
+
+        self.inbox: Optional[mp.Queue] = None
+        self.outboxes: List[mp.Queue] = []
+        self.n_sources = 0
+        # Migrations received ahead of time, by generation
+        self._mailbox: Dict[int, List[Migration]] = dict()
+        # Sources that stopped
+        self._left: Set[int] = set()
+
+    def connect(self, inbox: mp.Queue, outboxes: List[mp.Queue], n_sources: int):
+        self.inbox = inbox
+        self.outboxes = outboxes
+        self.n_sources = n_sources
+
+    def _receive(self, generation: int) -> Optional[List[Migration]]:
+        """
+        Waits for the migrations of every source still running for
+        `generation`. Returns None if the simulation is stopped while waiting.
+        """
+        assert self.inbox is not None
+        received = self._mailbox.setdefault(generation, [])
+        # The leaving message of a source is sent once its process exited, so
+        # it will not send anything else
+        while len({m[0] for m in received} | self._left) < self.n_sources:
+            try:
+                migration: Migration = self.inbox.get(timeout=0.5)
+            except queue.Empty:
+                if self.forced_quit():
+                    return None
+                continue
+            if migration[1] == LEAVING:
+                self._left.add(migration[0])
+            else:
+                self._mailbox.setdefault(migration[1], []).append(migration)
+
+        return sorted(self._mailbox.pop(generation), key=lambda m: m[0])
+
+    def _migrate(
+        self, genomes: List[Genome], scores: List[float]
+    ) -> Tuple[List[Genome], List[float]]:
+        connected = self.n_sources > 0 or len(self.outboxes) > 0
+        if not connected or (self.generation_count + 1) % self.migration_interval:
+            return genomes, scores
+
+        start = perf_counter()
+        order = np.argsort(scores, kind="stable")[::-1]
+        # Only simulated genomes migrate, interpolated scores stay local
+        migrants = [
+            (genomes[i], scores[i], self.objectives[i])
+            for i in order
+            if self.simulated[i]
+        ][: self.n_migrants]
+        for outbox in self.outboxes:
+            outbox.put((self.island, self.generation_count, migrants))
+
+        received = self._receive(self.generation_count)
+        if received is None:
+            return genomes, scores
+
+        # The migrants replace the worst genomes of the island
+        incoming = [m for _, _, ms in received for m in ms][: len(genomes)]
+        genomes, scores = list(genomes), list(scores)
+        for i, (genome, score, objectives) in zip(order[::-1], incoming):
+            genomes[i] = genome
+            scores[i] = score
+            self.objectives[i] = objectives
+            self.simulated[i] = True
+
+        self.generation_record["island"] = self.island
+        self.generation_record["migrants_in"] = len(incoming)
+        self.generation_record["migration_seconds"] = perf_counter() - start
+        return genomes, scores
+
+    def run(self, data_queue: Optional[mp.Queue] = None) -> None:
+        try:
+            super().run(data_queue)
+        finally:
+            # Do not block the exit on migrations nobody will read
+            for outbox in self.outboxes:
+                outbox.cancel_join_thread()
+
+
+class IslandModel:
+    """
+    Island-model genetic algorithm. Every island is an `IslandSimulation`
+    running in its own process with a population of `population_size`
+    genomes, evaluated serially. The islands only communicate to exchange
+    migrants along `topology`.
+
+    Each island writes its checkpoints and telemetry to `island_<i>` in the
+    save path, and seeds its breeding from its own branch of the run seed.
+    """
+
+    def __init__(
+        self,
+        genome_breeder: GenomeBreeder,
+        n_islands: int = 4,
+        topology: str = "ring",
+        migration_interval: int = 5,
+        n_migrants: int = 2,
+        seed: Optional[Seed] = None,
+        quit_flag: Optional[Event] = None,
+        save_path: Optional[str] = None,
+        **simulation_kwargs: Any,
+    ):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown topology {topology}, choose from {TOPOLOGIES}")
+
+        self.genome_breeder = genome_breeder
+        self.n_islands = n_islands
+        self.topology = topology
+        self.migration_interval = migration_interval
+        self.n_migrants = n_migrants
+        self.quit_flag = quit_flag if quit_flag is not None else mp.Event()
+        self.rng_streams = RNGStreams(seed)
+        self.simulation_kwargs = simulation_kwargs
+
+        if save_path is None:
+            import datetime
+
+            DATE = datetime.datetime.now().strftime("%d%m%Y_%H%M%S")
+
+            save_path = os.path.join(ASSETS_PATH, f"checkpoints/{DATE}")
+        self.save_path = save_path
+        os.makedirs(self.save_path, exist_ok=True)
+
+        with open(os.path.join(self.save_path, "seed.txt"), "w") as file:
+            file.write(f"{self.rng_streams.entropy}\n")
+
+    def _create_islands(self) -> Tuple[List[IslandSimulation], List[Event]]:
+        destinations = get_destinations(self.topology, self.n_islands)
+        ctx = mp.get_context()
+        inboxes: List[mp.Queue] = [ctx.Queue() for _ in range(self.n_islands)]
+
+        islands: List[IslandSimulation] = []
+        quit_flags: List[Event] = []
+        for i in range(self.n_islands):
+            quit_flag = ctx.Event()
+            island = IslandSimulation(
+                self.genome_breeder,
+                island=i,
+                migration_interval=self.migration_interval,
+                n_migrants=self.n_migrants,
+                seed=self.rng_streams.spawn(i),
+                parallel=False,
+                quit_flag=quit_flag,
+                save_path=os.path.join(self.save_path, f"island_{i}"),
+                **self.simulation_kwargs,
+            )
+            n_sources = sum(i in d for d in destinations.values())
+            island.connect(
+                inboxes[i], [inboxes[j] for j in destinations.get(i, [])], n_sources
+            )
+            islands.append(island)
+            quit_flags.append(quit_flag)
+        return islands, quit_flags
+
+    def run(self) -> None:
+        islands, quit_flags = self._create_islands()
+        processes = [
+            mp.Process(target=island.run, name=f"island_{island.island}")
+            for island in islands
+        ]
+        for p in processes:
+            p.start()
+
+        # Every island sets its own flag when it finishes. Stop them all if the
+        # run is stopped or any of them crashes. When an island finishes before
+        # the others, its destinations stop waiting for its migrants.
+        left: Set[int] = set()
+        try:
+            while any(p.is_alive() for p in processes):
+                crashed = any(p.exitcode not in (None, 0) for p in processes)
+                if self.quit_flag.is_set() or crashed:
+                    for quit_flag in quit_flags:
+                        quit_flag.set()
+                for island, p in zip(islands, processes):
+                    if p.exitcode == 0 and island.island not in left:
+                        left.add(island.island)
+                        for outbox in island.outboxes:
+                            outbox.put((island.island, LEAVING, []))
+                for p in processes:
+                    p.join(timeout=0.1)
+        finally:
+            for quit_flag in quit_flags:
+                quit_flag.set()
+            for p in processes:
+                p.join()
+
+        for p in processes:
+            if p.exitcode != 0:
+                print(f"{p.name} exited with code {p.exitcode}")
+        self.quit_flag.set()
@@ -0,0 +1,109 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from hl.simulation.person import OBJECTIVES, WalkerResult
+
+
+SELECTIONS = ["roulette", "nsga2"]
+
+
+def objective_matrix(results: Sequence[WalkerResult]) -> np.ndarray:
+    """
+    Objectives of the walkers, one row per walker in the order of
+    `OBJECTIVES`. The rows of the walkers without objectives are NaN.
+    """
+    matrix = np.full((len(results), len(OBJECTIVES)), np.nan)
+    for i, result in enumerate(results):
+        if result.objectives is not None:
+            matrix[i] = result.objectives
+    return matrix
+
+
+def dominance_matrix(objectives: np.ndarray) -> np.ndarray:
+    """
+    Boolean matrix whose element (i, j) is True if the objectives of i
+    dominate the ones of j: i is at least as good in every objective and
+    better in one. Objectives are maximized.
+    """
+    n, k = objectives.shape
+    at_least = np.ones((n, n), dtype=bool)
+    better = np.zeros((n, n), dtype=bool)
+    for m in range(k):
+        column = objectives[:, m]
+        at_least &= column[:, None] >= column[None, :]
+        better |= column[:, None] > column[None, :]
+    return at_least & better
+
+
+def non_dominated_fronts(objectives: np.ndarray) -> np.ndarray:
+    """
+    Fast non-dominated sort (Deb et al., NSGA-II). Returns the front of every
+    individual, 0 being the Pareto front. Only the fronts are iterated, the
+    comparisons are vectorized.
+    """
+    n = len(objectives)
+    dominates = dominance_matrix(objectives)
+    # Number of individuals dominating each one, not yet assigned to a front
+    dominated_by = dominates.sum(axis=0)
+
+    fronts = np.full(n, -1)
+    current = np.flatnonzero(dominated_by == 0)
+    front = 0
+    while len(current) > 0:
+        fronts[current] = front
+        dominated_by -= dominates[current].sum(axis=0)
+        dominated_by[current] = -1
+        current = np.flatnonzero(dominated_by == 0)
+        front += 1
+    return fronts
+
+
+def crowding_distances(objectives: np.ndarray, fronts: np.ndarray) -> np.ndarray:
+    """
+    Crowding distance of every individual within its front: the sum over the
+    objectives of the normalized distance between its two neighbours. The
+    extremes of every front get an infinite distance.
+    """
+    n, k = objectives.shape
+    distances = np.zeros(n)
+    for m in range(k):
+        # Sort by front, then by the objective
+        order = np.lexsort((objectives[:, m], fronts))
+        values = objectives[order, m]
+        sorted_fronts = fronts[order]
+
+        first = np.r_[True, sorted_fronts[1:] != sorted_fronts[:-1]]
+        last = np.r_[sorted_fronts[1:] != sorted_fronts[:-1], True]
+
+        # Range of the objective in the front of each individual
+        starts = np.flatnonzero(first)
+        ends = np.flatnonzero(last)
+        sizes = ends - starts + 1
+        span = np.repeat(values[ends] - values[starts], sizes)
+        span[span == 0] = 1
+
+        gap = np.zeros(n)
+        gap[1:-1] = values[2:] - values[:-2]
+        gap = gap / span
+        gap[first | last] = np.inf
+        distances[order] += gap
+    return distances
+
+
+def nsga_order(objectives: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the indices of the individuals from best to worst, by front and
+    then by decreasing crowding distance, and the front of every individual.
+    Unknown objectives (NaN) are worse than any known value.
+    """
+    objectives = np.array(objectives, dtype=float)
+    if objectives.size > 0:
+        known = ~np.isnan(objectives)
+        lowest = np.min(objectives, axis=0, initial=np.inf, where=known)
+        lowest = np.where(np.isfinite(lowest), lowest, 0) - 1
+        objectives = np.where(known, objectives, lowest)
+
+    fronts = non_dominated_fronts(objectives)
+    distances = crowding_distances(objectives, fronts)
+    return np.lexsort((-distances, fronts)), fronts
@@ -0,0 +1,175 @@
+from typing import TYPE_CHECKING, List, Optional
+
+import numpy as np
+
+from hl.simulation.genome.genome import Genome
+from hl.simulation.rng import RNGStreams
+
+if TYPE_CHECKING:
+    from hl.simulation.simulation import Simulation
+
+
+OPTIMIZERS = ["genetic", "cmaes"]
+
+
+class Optimizer:
+    """
+    Ask/tell interface of the optimizers of a `Simulation`. The simulation
+    evaluates its initial genomes, and then, every generation:
+        tell(genomes, scores)   with the genomes evaluated and their scores
+        ask()                   for the genomes of the next generation
+    """
+
+    def tell(self, genomes: List[Genome], scores: List[float]) -> None:
+        raise NotImplementedError()
+
+    def ask(self) -> List[Genome]:
+        raise NotImplementedError()
+
+    def restart(self, genomes: List[Genome], scores: List[float]) -> None:
+        """
+        Restarts the search from `genomes`, the best ones found so far.
+        """
+        raise NotImplementedError()
+
+
+class GeneticOptimizer(Optimizer):
+    """
+    The genetic algorithm of the simulation: elites, mutations of the best
+    genome, random genomes and children bred from the best half.
+    """
+
+    def __init__(self, simulation: "Simulation"):
+        self.simulation = simulation
+        self._genomes: List[Genome] = []
+        self._scores: List[float] = []
+
+    def tell(self, genomes: List[Genome], scores: List[float]) -> None:
+        self._genomes = genomes
+        self._scores = scores
+
+    def ask(self) -> List[Genome]:
+        return self.simulation._breed(self._genomes, self._scores)
+
+    def restart(self, genomes: List[Genome], scores: List[float]) -> None:
+        # The next selection is made from the hall of fame
+        self.simulation._restart = True
+
+
+class CMAESOptimizer(Optimizer):
+    """
+    CMA-ES (Hansen, "The CMA Evolution Strategy: A Tutorial") over the flat
+    parameter vectors of the genomes, with `population_size` samples per
+    generation.
+
+    The search starts from the first genomes told: the mean is their mean and
+    the covariance is the diagonal of their variances, scaled by `sigma`. The
+    samples of generation g are drawn from the stream of g of `rng_streams`.
+    """
+
+    def __init__(
+        self, population_size: int, rng_streams: RNGStreams, sigma: float = 0.5
+    ):
+        self.population_size = population_size
+        self.rng_streams = rng_streams
+        self.initial_sigma = sigma
+
+        self.generation = 0
+        self.template: Optional[Genome] = None
+        self.mean: Optional[np.ndarray] = None
+
+    def _init_strategy(self, n: int) -> None:
+        lam = self.population_size
+        self.mu = lam // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / (self.weights**2).sum()
+
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(
+            1 - self.c1,
+            2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff),
+        )
+        self.damps = 1 + 2 * max(0.0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n**2))
+
+    def _reset(self, mean: np.ndarray) -> None:
+        n = len(mean)
+        self.mean = mean
+        self.sigma = self.initial_sigma
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.C = np.diag(self.initial_variances)
+        self._decompose()
+        # Generations since the last reset, for the correction of `ps`
+        self.updates = 0
+
+    def _decompose(self) -> None:
+        # C = B diag(D^2) B^T
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+        self.inv_sqrt_C = self.B @ np.diag(1 / self.D) @ self.B.T
+
+    def tell(self, genomes: List[Genome], scores: List[float]) -> None:
+        x = np.array([genome.to_vector() for genome in genomes])
+        if self.mean is None:
+            self.template = genomes[0]
+            self._init_strategy(x.shape[1])
+            variances = x.var(axis=0)
+            self.initial_variances = np.where(variances > 0, variances, 1.0)
+            self._reset(x.mean(axis=0))
+        self.generation += 1
+        self._update(x, np.asarray(scores, dtype=float))
+
+    def _update(self, x: np.ndarray, scores: np.ndarray) -> None:
+        assert self.mean is not None
+        n = len(self.mean)
+        # Best first, NaN (unfinished) last
+        order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+        best = x[order[: self.mu]]
+
+        old_mean = self.mean
+        y = (best - old_mean) / self.sigma
+        y_w = self.weights @ y
+        self.mean = old_mean + self.sigma * y_w
+
+        # Step-size and covariance evolution paths
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(
+            self.cs * (2 - self.cs) * self.mueff
+        ) * (self.inv_sqrt_C @ y_w)
+        self.updates += 1
+        ps_norm = np.linalg.norm(self.ps) / np.sqrt(
+            1 - (1 - self.cs) ** (2 * self.updates)
+        )
+        hsig = ps_norm / self.chi_n < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(
+            self.cc * (2 - self.cc) * self.mueff
+        ) * y_w
+
+        # Rank-one and rank-mu updates
+        rank_mu = (self.weights[:, None] * y).T @ y
+        self.C = (
+            (1 - self.c1 - self.cmu + (1 - hsig) * self.c1 * self.cc * (2 - self.cc))
+            * self.C
+            + self.c1 * np.outer(self.pc, self.pc)
+            + self.cmu * rank_mu
+        )
+        self.C = (self.C + self.C.T) / 2
+        self.sigma *= np.exp(
+            (self.cs / self.damps) * (np.linalg.norm(self.ps) / self.chi_n - 1)
+        )
+        self._decompose()
+
+    def ask(self) -> List[Genome]:
+        assert self.mean is not None and self.template is not None
+        rng = self.rng_streams.generation(self.generation)
+        z = rng.standard_normal((self.population_size, len(self.mean)))
+        x = self.mean + self.sigma * (z * self.D) @ self.B.T
+        return [self.template.from_vector(v) for v in x]
+
+    def restart(self, genomes: List[Genome], scores: List[float]) -> None:
+        # Start again around the best genome, with the initial spread
+        assert self.mean is not None
+        self._reset(genomes[0].to_vector())
@@ -1,15 +1,27 @@
-from typing import List, Dict
+from time import perf_counter
+from typing import TYPE_CHECKING, List, Dict, Optional
 from Box2D import b2World, b2Vec2
+import numpy as np
 
 from hl.io.body_def import BodyDef
 from hl.io.body_parser import parse_body
 from hl.utils import Vec2, Color
 from hl.simulation.metrics import average_leg_x, feet_delta, step_length
 from hl.simulation.genome.genome import Genome
+from hl.simulation.profiling import GenerationStats
+from hl.simulation.terrain import FLOOR_TOP, TerrainProfile
+
+if TYPE_CHECKING:
+    from hl.simulation.scenarios import Scenario
 
 
 JOINT_SPEED = 2
 
+# Components of the score of a walker, and whether they are maximized (1) or
+# minimized (-1)
+OBJECTIVES = ["distance", "step_penalty", "head_bob", "feet_asymmetry", "energy"]
+OBJECTIVE_SENSE = np.array([1, -1, -1, -1, -1])
+
 
 class PersonObject:
     def __init__(
@@ -18,15 +30,60 @@ class PersonObject:
         # pos: Vec2,
         world: b2World,
         color: Color,
-        # angles: Dict[str, float],
+        angles: Optional[Dict[str, float]] = None,
     ):
         self.parts, self.joints = parse_body(
             body_def,
             world,
             color,
-            # angles,
+            angles,
         )
         self._world = world
+        # The motors are read every frame, resolve their torque getters once
+        self._motors = [(joint.GetMotorTorque, joint) for joint in self.joints.values()]
+        # Parts and joints in the order of the body definition, for `state`
+        self._state_bodies = [self.parts[part_id].body for part_id in body_def.body]
+        self._state_joints = [self.joints[joint_id] for joint_id in body_def.joints]
+        self._root_body = self.parts[body_def.root].body
+
+    def add_motor_work(self, totals: List[float]) -> List[float]:
+        """
+        Returns `totals` plus the work of every joint motor in the last step,
+        in the order of `joints`: |torque * angular speed * dt|, the motor
+        impulse times the angular speed. The joints are few, plain floats are
+        faster than numpy here.
+        """
+        return [
+            total + abs(torque(1.0) * joint.speed)
+            for total, (torque, joint) in zip(totals, self._motors)
+        ]
+
+    def state(self) -> List[float]:
+        """
+        Returns the x, y and angle of every part, followed by the angular
+        speed of every joint, in the order of the body definition.
+        """
+        state: List[float] = []
+        for body in self._state_bodies:
+            position = body.position
+            state += (position.x, position.y, body.angle)
+        state += [joint.speed for joint in self._state_joints]
+        return state
+
+    def observe(self) -> List[float]:
+        """
+        Returns the readings of the joint and root sensors of `SensorLayout`:
+        the angle and then the angular speed of every joint, in the order of
+        the body definition, and the angle, angular velocity and velocity of
+        the root part.
+        """
+        root = self._root_body
+        velocity = root.linearVelocity
+        return (
+            [joint.angle for joint in self._state_joints]
+            + [joint.speed for joint in self._state_joints]
+            + [root.angle, root.angularVelocity, velocity.x, velocity.y]
+        )
 
     def destroy(self):
         """
@@ -35,12 +92,40 @@ class PersonObject:
         for joint in self.joints.values():
             self._world.DestroyJoint(joint)
         self.joints.clear()
+        self._motors.clear()
 
         for part in self.parts.values():
             self._world.DestroyBody(part.body)
         self.parts.clear()
 
 
+class WalkerResult:
+    """
+    Picklable outcome of the episode of a single walker. `objectives` are the
+    components of the score, in the order of `OBJECTIVES`, and `energy` the
+    work of the motors, if the episode finished. `recording` holds the states
+    of the walker, one row per frame, if it was recorded. `interpolated` is
+    set if the score was interpolated from the neighbours of the genome (see
+    `ScoreCache`), the walker was not simulated.
+    """
+
+    def __init__(
+        self,
+        score: float,
+        death_frame: Optional[int],
+        objectives: Optional[np.ndarray] = None,
+        energy: Optional[float] = None,
+        recording: Optional[np.ndarray] = None,
+        interpolated: bool = False,
+    ):
+        self.score = score
+        self.death_frame = death_frame
+        self.objectives = objectives
+        self.energy = energy
+        self.recording = recording
+        self.interpolated = interpolated
+
+
 class PersonSimulation:
     def __init__(
         self,
@@ -48,20 +133,51 @@ class PersonSimulation:
         gen_data: Genome,
         world: b2World,
         color: Color,
+        record: bool = False,
+        scenario: Optional["Scenario"] = None,
+        terrain: Optional[TerrainProfile] = None,
     ):
 
         self.genome = gen_data
-        self.person = PersonObject(body_def, world, color)
+        self.person = PersonObject(
+            body_def, world, color, scenario.angles if scenario is not None else None
+        )
+
+        # Perturbations of the episode, see `Scenario`. Pushes are applied to
+        # the root part of the body.
+        self.scenario = scenario
+        self._root = body_def.root
+        if scenario is not None and scenario.friction != 1.0:
+            for part in self.person.parts.values():
+                part.fixture.friction *= scenario.friction
+
+        # States of the walker, from its spawn pose to its death, if recorded
+        self.recording: Optional[List[List[float]]] = None
+        if record:
+            self.recording = [self.person.state()]
 
         self._frames_count = 0
 
+        # Set by `run_a_generation` to time the phases of `step`
+        self.stats: Optional[GenerationStats] = None
+        # Row of the walker in the observations of `Sensors`, set when the
+        # genome is a closed-loop controller
+        self.observation: Optional[np.ndarray] = None
+
         # Add some metrics
         self.dead = False
+        self.death_frame: Optional[int] = None
         self.score = 0.0
         self.penalties = 0.0
+        self.objectives: Optional[np.ndarray] = None
+        # Work of every joint motor, |torque * angular speed| integrated over
+        # the episode
+        self.joint_energy = [0.0] * len(self.person.joints)
 
-        # Metrics parameters
-        self.initial_head_y = self.person.parts["head"].body.position.y
+        # Metrics parameters. On a terrain, heights are measured from the
+        # floor under the walker.
+        self.terrain = terrain
+        self.initial_head_y = self._head_y()
         self.head_y_delta_total = 0
         self.feet_delta_total = 0
 
@@ -80,12 +196,12 @@ class PersonSimulation:
         if step > 1:
             self.penalties += (step - 1) * 10.0
 
-        self.head_y_delta_total += abs(
-            self.person.parts["head"].body.position.y - self.initial_head_y
-        )
+        self.head_y_delta_total += abs(self._head_y() - self.initial_head_y)
 
         self.feet_delta_total += feet_delta(self)
 
+        self.joint_energy = self.person.add_motor_work(self.joint_energy)
+
         if self._frames_count > 30:
             actual_pos_x = average_leg_x(self)
             if actual_pos_x < self.idle_max_pos_x + self.idle_margin:
@@ -97,15 +213,29 @@ class PersonSimulation:
     def _calculate_dead_score(self) -> float:
 
         avg_delta_head_y = self.head_y_delta_total / self._frames_count
-        self.penalties += avg_delta_head_y * 10.0
-
         avg_feet_delta = abs(self.feet_delta_total / self._frames_count)
+        distance = average_leg_x(self)
+        self.objectives = np.array(
+            [distance, self.penalties, avg_delta_head_y, avg_feet_delta, self.energy]
+        )
+
+        self.penalties += avg_delta_head_y * 10.0
         self.penalties += avg_feet_delta * 1.0
 
-        return average_leg_x(self) - self.penalties
+        return distance - self.penalties
+
+    @property
+    def energy(self) -> float:
+        return sum(self.joint_energy)
+
+    def _head_y(self) -> float:
+        head = self.person.parts["head"].body.position
+        if self.terrain is None:
+            return head.y
+        return head.y - self.terrain.height(head.x) + FLOOR_TOP
 
     def _is_dead(self) -> bool:
-        head_down = self.person.parts["head"].body.position.y < 0.7
+        head_down = self._head_y() < 0.7
         is_idle = self.idle_frames > self.idle_max_frames
         return head_down or is_idle
 
@@ -116,13 +246,46 @@ class PersonSimulation:
         person's score is updated.
         """
         if not self.dead:
+            if self.recording is not None:
+                if self.stats is not None:
+                    start = perf_counter()
+                    self.recording.append(self.person.state())
+                    self.stats.add("record", start)
+                else:
+                    self.recording.append(self.person.state())
+
             if self._is_dead():
                 self.dead = True
+                self.death_frame = self._frames_count
                 self.score = self._calculate_dead_score()
-                self.person.destroy()
+                if self.stats is not None:
+                    start = perf_counter()
+                    self.person.destroy()
+                    self.stats.add("destroy", start)
+                else:
+                    self.person.destroy()
                 return
 
-            self._update_metrics()
+            if self.stats is not None:
+                start = perf_counter()
+                self._update_metrics()
+                self.stats.add("metrics", start)
+            else:
+                self._update_metrics()
+
+    def result(self) -> WalkerResult:
+        recording = None
+        if self.recording is not None:
+            # Box2D is single precision
+            recording = np.array(self.recording, dtype=np.float32)
+        return WalkerResult(
+            self.score, self.death_frame, self.objectives, self.energy, recording
+        )
+
+    def _act(self, t: int) -> Dict[str, float]:
+        if self.observation is None:
+            return self.genome.step(t)
+        return self.genome.act(t, self.observation)
 
     def step(self):
         """
@@ -131,8 +294,28 @@ class PersonSimulation:
         self._update_status()
 
         t = self._frames_count
+        if (
+            not self.dead
+            and self.scenario is not None
+            and self.scenario.push_frame == t
+        ):
+            root = self.person.parts[self._root].body
+            root.ApplyLinearImpulse(
+                (root.mass * self.scenario.push_speed, 0), root.worldCenter, True
+            )
+
         if not self.dead:
-            for joint_id, value in self.genome.step(t).items():
+            if self.stats is not None:
+                start = perf_counter()
+                values = self._act(t)
+                start = self.stats.add("genome", start)
+            else:
+                values = self._act(t)
+
+            for joint_id, value in values.items():
                 self.person.joints[joint_id].motorSpeed = value * JOINT_SPEED
 
+            if self.stats is not None:
+                self.stats.add("motors", start)
+
         self._frames_count += 1
@@ -0,0 +1,219 @@
+import glob
+import os
+import pstats
+from collections import defaultdict
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+PHASES = [
+    "create_population",
+    "terrain",
+    "world_step",
+    "sensors",
+    "genome",
+    "motors",
+    "metrics",
+    "record",
+    "destroy",
+    "draw",
+]
+
+
+class GenerationStats:
+    """
+    Counters of a generation, gathered by `run_a_generation`. The per-phase
+    wall times are only measured when `timed` is set, the counters (frames,
+    live walkers, Box2D bodies and contacts) are always gathered.
+
+    Stats from several workers can be combined with `merge`.
+    """
+
+    def __init__(self, timed: bool = False):
+        self.timed = timed
+
+        self.times: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.calls: Dict[str, int] = {phase: 0 for phase in PHASES}
+
+        self.workers = 1
+        self.walkers = 0
+        self.frames = 0
+        self.walker_frames = 0
+        self.max_live_walkers = 0
+        self.body_frames = 0
+        self.max_bodies = 0
+        self.contact_frames = 0
+        self.max_contacts = 0
+
+        # Wall-clock (time.time) of the first frame and busy time of the worker
+        self.first_frame_time: Optional[float] = None
+        self.wall_time = 0.0
+
+    def add(self, phase: str, start: float) -> float:
+        """
+        Adds the time elapsed since `start` (a `perf_counter` value) to `phase`.
+        Returns the current `perf_counter`, so calls can be chained.
+        """
+        now = perf_counter()
+        self.times[phase] += now - start
+        self.calls[phase] += 1
+        return now
+
+    def add_frame(self, live_walkers: int, bodies: int, contacts: int) -> None:
+        self.frames += 1
+        self.walker_frames += live_walkers
+        self.max_live_walkers = max(self.max_live_walkers, live_walkers)
+        self.body_frames += bodies
+        self.max_bodies = max(self.max_bodies, bodies)
+        self.contact_frames += contacts
+        self.max_contacts = max(self.max_contacts, contacts)
+
+    def merge(self, other: "GenerationStats") -> None:
+        self.timed = self.timed or other.timed
+        for phase in PHASES:
+            self.times[phase] += other.times[phase]
+            self.calls[phase] += other.calls[phase]
+
+        self.workers += other.workers
+        self.walkers += other.walkers
+        self.frames += other.frames
+        self.walker_frames += other.walker_frames
+        self.max_live_walkers = max(self.max_live_walkers, other.max_live_walkers)
+        self.body_frames += other.body_frames
+        self.max_bodies = max(self.max_bodies, other.max_bodies)
+        self.contact_frames += other.contact_frames
+        self.max_contacts = max(self.max_contacts, other.max_contacts)
+        self.wall_time += other.wall_time
+
+        if other.first_frame_time is not None:
+            self.first_frame_time = (
+                other.first_frame_time
+                if self.first_frame_time is None
+                else min(self.first_frame_time, other.first_frame_time)
+            )
+
+    @staticmethod
+    def merged(stats: Iterable["GenerationStats"]) -> "GenerationStats":
+        stats = list(stats)
+        result = GenerationStats()
+        result.workers = 0
+        for s in stats:
+            result.merge(s)
+        return result
+
+    def report(self) -> str:
+        frames = max(self.frames, 1)
+        lines: List[str] = [
+            f"{self.walkers} walkers, {self.frames} frames in {self.workers} worker(s),"
+            f" {self.wall_time:.3f}s busy"
+        ]
+
+        if self.timed:
+            total = sum(self.times.values())
+            for phase in PHASES:
+                if self.calls[phase] == 0:
+                    continue
+                t = self.times[phase]
+                lines.append(
+                    f"  {phase:<18} {t:8.3f}s {100 * t / max(total, 1e-9):5.1f}%"
+                    f"  ({self.calls[phase]} calls)"
+                )
+
+        lines.append(
+            f"  live walkers/frame: avg {self.walker_frames / frames:.1f},"
+            f" max {self.max_live_walkers}"
+        )
+        lines.append(
+            f"  bodies/frame: avg {self.body_frames / frames:.1f},"
+            f" max {self.max_bodies}."
+            f" contacts/frame: avg {self.contact_frames / frames:.1f},"
+            f" max {self.max_contacts}"
+        )
+        return "\n".join(lines)
+
+
+# Stacks deeper than this are truncated in the collapsed-stack output
+MAX_STACK_DEPTH = 64
+
+
+def profile_label(func: Tuple[str, int, str]) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(
+    stats: pstats.Stats, prefix: str = "", min_time: float = 1e-6
+) -> Dict[str, float]:
+    """
+    Reconstructs approximate call stacks from the caller/callee graph of
+    `stats`, in the collapsed-stack format used by flamegraph tools: one
+    `frame;frame;frame` key per stack, with the self time spent in it (in
+    seconds). The time of a function is split among its callers
+    proportionally to the time each caller spent in it.
+    """
+    raw = stats.stats  # type: ignore
+    children: Dict[Any, Dict[Any, float]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, caller_stats in callers.items():
+            children[caller][func] = caller_stats[3]
+
+    stacks: Dict[str, float] = defaultdict(float)
+
+    def visit(func, path: List[str], funcs: List[Any], weight: float):
+        _, _, tt, ct, _ = raw[func]
+        path = path + [profile_label(func)]
+        funcs = funcs + [func]
+
+        if tt * weight > 0:
+            stacks[";".join(path)] += tt * weight
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+
+        for child, edge_time in children.get(func, {}).items():
+            child_time = raw[child][3]
+            if child in funcs or child_time <= 0:
+                continue
+            child_weight = weight * edge_time / child_time
+            if child_weight * child_time < min_time:
+                continue
+            visit(child, path, funcs, child_weight)
+
+    roots = [func for func, value in raw.items() if not value[4]]
+    base = [prefix] if prefix else []
+    for root in roots:
+        visit(root, base, [], 1.0)
+
+    return stacks
+
+
+def write_profile_report(profile_dir: str, output_dir: str) -> None:
+    """
+    Merges every `.prof` file in `profile_dir` into a text report aggregated
+    by function (`profile.txt`) and a collapsed-stack file for flamegraphs
+    (`profile.collapsed`), both written to `output_dir`. Stacks are prefixed
+    by the name of the process they come from (`main` or `worker`).
+    """
+    paths = sorted(glob.glob(os.path.join(profile_dir, "*.prof")))
+    if not paths:
+        return
+
+    with open(os.path.join(output_dir, "profile.txt"), "w") as file:
+        merged = pstats.Stats(*paths, stream=file)
+        merged.sort_stats("cumulative").print_stats(100)
+        merged.sort_stats("tottime").print_stats(100)
+
+    stacks: Dict[str, float] = defaultdict(float)
+    for path in paths:
+        role = os.path.splitext(os.path.basename(path))[0].split("_")[0]
+        for stack, t in collapsed_stacks(pstats.Stats(path), prefix=role).items():
+            stacks[stack] += t
+
+    with open(os.path.join(output_dir, "profile.collapsed"), "w") as file:
+        for stack, t in sorted(stacks.items()):
+            microseconds = int(round(t * 1e6))
+            if microseconds > 0:
+                file.write(f"{stack} {microseconds}\n")
@@ -0,0 +1,67 @@
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+
+Seed = Union[int, Sequence[int]]
+
+
+class RNGStreams:
+    """
+    Hierarchy of independent random streams derived from a single seed with
+    `np.random.SeedSequence` spawn keys:
+        run:                  ()
+        generation g:         (g,)
+        child i of gen g:     (g, i)
+        replacement of child: (g, i, 1)
+        scenarios of the run: (0, 0, 2)
+        terrain of the run:   (0, 0, 3)
+
+    Every stream only depends on the seed and its key, so a child is the same
+    whichever process creates it and in whichever order. The children of
+    generation 0 are the initial population.
+    """
+
+    def __init__(self, seed: Optional[Seed] = None):
+        # With no seed, fresh entropy is drawn and kept to reproduce the run
+        self.entropy: Seed = np.random.SeedSequence(seed).entropy  # type: ignore
+
+    def _stream(self, *key: int) -> np.random.Generator:
+        return np.random.default_rng(
+            np.random.SeedSequence(self.entropy, spawn_key=key)
+        )
+
+    def run(self) -> np.random.Generator:
+        return self._stream()
+
+    def generation(self, generation: int) -> np.random.Generator:
+        return self._stream(generation)
+
+    def child(self, generation: int, index: int) -> np.random.Generator:
+        return self._stream(generation, index)
+
+    def replacement(self, generation: int, index: int) -> np.random.Generator:
+        """
+        Stream of the genome created in place of a child that was discarded.
+        """
+        return self._stream(generation, index, 1)
+
+    def scenarios(self) -> np.random.Generator:
+        """
+        Stream of the perturbations the genomes are evaluated in.
+        """
+        return self._stream(0, 0, 2)
+
+    def terrain(self) -> np.random.Generator:
+        """
+        Stream of the seed of the procedural terrain.
+        """
+        return self._stream(0, 0, 3)
+
+    def spawn(self, index: int) -> List[int]:
+        """
+        Returns the seed of an independent hierarchy, e.g. for the `index`-th
+        sub-population of the run.
+        """
+        entropy = [self.entropy] if isinstance(self.entropy, int) else self.entropy
+        return list(entropy) + [index]
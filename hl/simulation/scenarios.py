@@ -0,0 +1,104 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from hl.io.body_def import BodyDef, get_random_body_angles
+from hl.simulation.person import WalkerResult
+
+
+# How the scores of a genome in the scenarios are combined
+AGGREGATIONS = ["mean", "min", "quantile"]
+
+
+class Scenario:
+    """
+    Perturbation of the episode of a walker:
+        angles:         initial angles of the joints (degrees, relative to the
+                        pose of the body definition), None for that pose
+        friction:       multiplier of the friction of the body parts
+        push_frame:     frame at which the root part of the body (the torso)
+                        is pushed, None for no push
+        push_speed:     change of horizontal speed of the pushed part (m/s)
+    """
+
+    def __init__(
+        self,
+        angles: Optional[Dict[str, float]] = None,
+        friction: float = 1.0,
+        push_frame: Optional[int] = None,
+        push_speed: float = 0.0,
+    ):
+        self.angles = angles
+        self.friction = friction
+        self.push_frame = push_frame
+        self.push_speed = push_speed
+
+
+def sample_scenarios(
+    body_def: BodyDef,
+    n_scenarios: int,
+    rng: np.random.Generator,
+    pose_noise: float = 0.1,
+    friction_noise: float = 0.3,
+    push_speed: float = 0.5,
+    push_frames: Sequence[int] = (30, 90),
+) -> List[Scenario]:
+    """
+    Returns the unperturbed scenario followed by `n_scenarios - 1` random
+    ones. The joints start at random angles within `pose_noise` times their
+    limits, the friction is scaled by up to `1 ± friction_noise`, and the
+    torso is pushed forward or backward at up to `push_speed`, at a frame
+    drawn from `push_frames`.
+    """
+    scenarios = [Scenario()]
+    for _ in range(n_scenarios - 1):
+        scenarios.append(
+            Scenario(
+                angles=get_random_body_angles(body_def, pose_noise, rng),
+                friction=float(rng.uniform(1 - friction_noise, 1 + friction_noise)),
+                push_frame=int(rng.integers(push_frames[0], push_frames[1])),
+                push_speed=float(rng.uniform(-push_speed, push_speed)),
+            )
+        )
+    return scenarios
+
+
+def aggregate_results(
+    results: Sequence[WalkerResult],
+    n_scenarios: int,
+    aggregation: str = "mean",
+    quantile: float = 0.25,
+) -> List[WalkerResult]:
+    """
+    Combines the results of every genome in its `n_scenarios` consecutive
+    scenarios. The score is their mean, minimum or `quantile`; the objectives
+    and the energy are averaged. A genome left unevaluated in one of its
+    scenarios gets a NaN score.
+    """
+    combined: List[WalkerResult] = []
+    for start in range(0, len(results), n_scenarios):
+        group = results[start : start + n_scenarios]
+        scores = np.array([r.score for r in group], dtype=float)
+        if aggregation == "min":
+            score = float(np.min(scores))
+        elif aggregation == "quantile":
+            score = float(np.quantile(scores, quantile))
+        else:
+            score = float(np.mean(scores))
+
+        death_frames = [r.death_frame for r in group]
+        objectives = [r.objectives for r in group]
+        energies = [r.energy for r in group]
+        combined.append(
+            WalkerResult(
+                score,
+                None if None in death_frames else max(death_frames),  # type: ignore
+                (
+                    None
+                    if any(o is None for o in objectives)
+                    else np.mean(objectives, axis=0)
+                ),
+                None if None in energies else float(np.mean(energies)),  # type: ignore
+            )
+        )
+    return combined
@@ -0,0 +1,121 @@
+from typing import TYPE_CHECKING, List, Sequence
+
+import numpy as np
+from Box2D import b2Contact, b2ContactListener, b2World
+
+from hl.io.body_def import BodyDef
+
+if TYPE_CHECKING:
+    from hl.simulation.person import PersonSimulation
+
+
+class SensorLayout:
+    """
+    Columns of the observation of a walker, for a body definition:
+        joint_angles:   angle of every joint (radians), in the order of the
+                        body definition
+        joint_speeds:   angular speed of every joint (radians/s), same order
+        root:           angle, angular velocity and x and y velocity of the
+                        root part of the body (the torso)
+        contacts:       1 if the part touches the floor, else 0, for the parts
+                        named "foot*", or "leg*" if the body has no feet
+    Every field is a slice of the columns, `columns` names them.
+    """
+
+    def __init__(self, body_def: BodyDef):
+        self.joints = list(body_def.joints)
+        self.root = body_def.root
+        self.contact_parts = [p for p in body_def.body if p.startswith("foot")]
+        if not self.contact_parts:
+            self.contact_parts = [p for p in body_def.body if p.startswith("leg")]
+
+        n_joints = len(self.joints)
+        self.joint_angles = slice(0, n_joints)
+        self.joint_speeds = slice(n_joints, 2 * n_joints)
+        self.root_state = slice(2 * n_joints, 2 * n_joints + 4)
+        self.contacts = slice(
+            2 * n_joints + 4, 2 * n_joints + 4 + len(self.contact_parts)
+        )
+        self.size = self.contacts.stop
+
+    @property
+    def columns(self) -> List[str]:
+        return (
+            [f"{joint_id}.angle" for joint_id in self.joints]
+            + [f"{joint_id}.speed" for joint_id in self.joints]
+            + [
+                f"{self.root}.{field}"
+                for field in ["angle", "angular_velocity", "vx", "vy"]
+            ]
+            + [f"{part_id}.contact" for part_id in self.contact_parts]
+        )
+
+
+class _ContactCounter(b2ContactListener):
+    """
+    Counts the contacts of the fixtures whose `userData` is a (walker,
+    contact) index of `counts`. Walkers only collide with the floor, so these
+    are floor contacts. Box2D ends the contacts of destroyed bodies, so the
+    counts stay consistent when walkers die or terrain is retired.
+    """
+
+    def __init__(self, counts: np.ndarray):
+        super().__init__()
+        self.counts = counts
+
+    def BeginContact(self, contact: b2Contact) -> None:
+        for key in (contact.fixtureA.userData, contact.fixtureB.userData):
+            if key is not None:
+                self.counts[key] += 1
+
+    def EndContact(self, contact: b2Contact) -> None:
+        for key in (contact.fixtureA.userData, contact.fixtureB.userData):
+            if key is not None:
+                self.counts[key] -= 1
+
+
+class Sensors:
+    """
+    Observations of a population, one row of `layout.size` columns per
+    walker in a preallocated array, gathered once per frame for the whole
+    population. Every walker attached reads its row through its
+    `observation`, a view of the array.
+
+    Joint and root readings are taken from Box2D walker by walker, as plain
+    floats, and written with a single assignment. Contacts are not polled:
+    contact listeners keep a count per foot as Box2D reports the contacts
+    beginning and ending.
+    """
+
+    def __init__(self, body_def: BodyDef, n_walkers: int):
+        self.layout = SensorLayout(body_def)
+        self.observations = np.zeros((n_walkers, self.layout.size))
+        self._counts = np.zeros((n_walkers, len(self.layout.contact_parts)), dtype=int)
+        # The listeners are only referenced by Box2D, keep them alive
+        self._listeners: List[_ContactCounter] = []
+
+    def listen(self, world: b2World) -> None:
+        """
+        Counts the contacts of the walkers of `world`, before it is stepped.
+        """
+        listener = _ContactCounter(self._counts)
+        world.contactListener = listener
+        self._listeners.append(listener)
+
+    def attach(self, person: "PersonSimulation", row: int) -> None:
+        for i, part_id in enumerate(self.layout.contact_parts):
+            person.person.parts[part_id].fixture.userData = (row, i)
+        person.observation = self.observations[row]
+
+    def gather(self, population: Sequence["PersonSimulation"]) -> None:
+        """
+        Updates the rows of the walkers alive, `population` being in the
+        order of the rows. The rows of dead walkers keep their last values.
+        """
+        rows = [i for i, person in enumerate(population) if not person.dead]
+        if not rows:
+            return
+        self.observations[rows, : self.layout.contacts.start] = [
+            population[i].person.observe() for i in rows
+        ]
+        self.observations[rows, self.layout.contacts] = self._counts[rows] > 0
@@ -1,28 +1,85 @@
 # Global imports
-from multiprocessing.pool import AsyncResult
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from multiprocessing.pool import AsyncResult, Pool
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from Box2D import b2World
+import cProfile
+import importlib
+import signal
 import pickle
+from time import perf_counter
 
 import os
 
 import numpy as np
-from tqdm import tqdm
 import threading
 import multiprocessing as mp
+from multiprocessing.context import BaseContext
 from multiprocessing.synchronize import Event
 
 # Our imports
+from hl.simulation.breeding import SelectionTable, breed_children
+from hl.simulation.convergence import (
+    CONVERGENCE_ACTIONS,
+    INJECT_FRACTION,
+    PLATEAU_MUTATION_FACTOR,
+    HallOfFame,
+    PlateauDetector,
+    population_diversity,
+)
+from hl.simulation.dedup import NEAR_DUPLICATE_POLICIES, ScoreCache
+from hl.simulation.fitness import Episodes, get_fitness
 from hl.simulation.genome.genome import Genome, GenomeBreeder
-from hl.simulation.person import PersonSimulation
+from hl.simulation.metrics import average_leg_x
+from hl.simulation.nsga import SELECTIONS, nsga_order, objective_matrix
+from hl.simulation.optimizer import (
+    OPTIMIZERS,
+    CMAESOptimizer,
+    GeneticOptimizer,
+    Optimizer,
+)
+from hl.simulation.person import (
+    OBJECTIVE_SENSE,
+    OBJECTIVES,
+    PersonSimulation,
+    WalkerResult,
+)
+from hl.simulation.profiling import GenerationStats, write_profile_report
+from hl.simulation.rng import RNGStreams, Seed
+from hl.simulation.scenarios import (
+    AGGREGATIONS,
+    Scenario,
+    aggregate_results,
+    sample_scenarios,
+)
+from hl.simulation.sensors import Sensors
+from hl.simulation.surrogate import Surrogate, surrogate_accuracy
+from hl.simulation.telemetry import TelemetrySink, score_summary
+from hl.simulation.terrain import StreamedTerrain, TerrainProfile
 from hl.simulation.world_object import WorldObject
 from hl.io.body_def import BodyDef
+from hl.io.body_parser import compile_body
 
 from hl.utils import Color, get_rgb_iris_index, ASSETS_PATH, to_distr
 
+if TYPE_CHECKING:
+    from hl.simulation.distributed import Coordinator
+
+
+def create_an_empty_world() -> b2World:
+    return b2World(gravity=(0, -9.8))
+
 
 def create_a_world() -> Tuple[b2World, WorldObject]:
-    world = b2World(gravity=(0, -9.8))
+    world = create_an_empty_world()
     floor = WorldObject(
         [(-50, 0.1), (50, 0.1), (50, -0.1), (-50, -0.1)],
         world,
@@ -39,6 +96,9 @@ def create_a_population(
     genomes: List[Genome],
     world: b2World,
     color_function: Callable[[int, int], Color] = get_rgb_iris_index,
+    record: bool = False,
+    scenarios: Optional[List[Scenario]] = None,
+    terrain: Optional[TerrainProfile] = None,
 ) -> List[PersonSimulation]:
     population: List[PersonSimulation] = []
     for i, genome in enumerate(genomes):
@@ -47,12 +107,46 @@ def create_a_population(
             genome,
             world,
             color_function(i, len(genomes)),
+            record,
+            scenarios[i] if scenarios is not None else None,
+            terrain,
         )
         population.append(person)
 
     return population
 
 
+# Frames between the updates of the streamed terrains
+TERRAIN_UPDATE_FRAMES = 10
+
+
+def split_walkers(
+    indices: np.ndarray, n_chunks: int, walkers_per_genome: int = 1
+) -> List[np.ndarray]:
+    """
+    Splits `indices` of walkers into at most `n_chunks` non-empty chunks of
+    consecutive walkers. Chunks are only cut between genomes, whose
+    `walkers_per_genome` walkers (one per scenario) are consecutive, so every
+    genome is evaluated, and pickled, in a single task.
+    """
+    genomes = np.asarray(indices).reshape(-1, walkers_per_genome)
+    return [chunk.ravel() for chunk in np.array_split(genomes, n_chunks) if len(chunk)]
+
+
+def _group_by_scenario(
+    scenarios: Optional[List[Scenario]], n_walkers: int
+) -> List[List[int]]:
+    """
+    Indices of the walkers of every scenario, in order of first appearance.
+    """
+    if scenarios is None:
+        return [list(range(n_walkers))]
+    groups: Dict[int, List[int]] = dict()
+    for i, scenario in enumerate(scenarios):
+        groups.setdefault(id(scenario), []).append(i)
+    return list(groups.values())
+
+
 def run_a_generation(
     body_def: BodyDef,
     genomes: List[Genome],
@@ -64,17 +158,130 @@ def run_a_generation(
     ] = None,
     scores: Optional[List[float]] = None,
     color_function: Callable[[int, int], Color] = get_rgb_iris_index,
+    max_frames: Optional[int] = None,
+    stats: Optional[GenerationStats] = None,
+    results: Optional[List[WalkerResult]] = None,
+    cancel: Optional[Event] = None,
+    cancel_check_frames: int = 10,
+    record: bool = False,
+    scenarios: Optional[List[Scenario]] = None,
+    terrain: Optional[TerrainProfile] = None,
 ) -> List[float]:
-    world, floor = create_a_world()
-    population = create_a_population(body_def, genomes, world, color_function)
+    """
+    Simulates `genomes` in a single world until every walker is dead (or
+    `max_frames` have been simulated) and returns their scores. If `stats` is
+    given, the counters of the generation are accumulated into it. If
+    `results` is given, the result of every walker is appended to it, with the
+    states of the walker if `record` is set.
+
+    `scenarios`, if given, are the perturbations of the episodes of the
+    walkers, one per genome. The walkers of every scenario are simulated in a
+    world of their own, stepped in the same loop: walkers do not collide, but
+    all of them start at the same place, so the cost of a world grows faster
+    than its number of walkers.
+
+    If any genome is a closed-loop controller, the observations of the
+    walkers are gathered by `Sensors` every frame, after the worlds are
+    stepped and before the walkers act.
+
+    If `terrain` is given, the floor of every world is streamed from it
+    instead of the flat floor of `create_a_world`: every
+    `TERRAIN_UPDATE_FRAMES` frames, chunks are created ahead of the furthest
+    walker alive and retired behind the slowest.
+
+    `cancel` is checked every `cancel_check_frames` frames. Once it is set,
+    the generation stops and the walkers still alive get a NaN score.
+    """
+    if terrain is not None and draw_loop is not None:
+        raise ValueError("Drawing is not supported yet on a terrain")
+    timed = stats is not None and stats.timed
+
+    wall_start = start = perf_counter()
+    worlds: List[b2World] = []
+    floors: List[WorldObject] = []
+    terrains: List[StreamedTerrain] = []
+    world_people: List[List[PersonSimulation]] = []
+    population: List[PersonSimulation] = [None] * len(genomes)  # type: ignore
+    for group in _group_by_scenario(scenarios, len(genomes)):
+        if terrain is None:
+            world, floor = create_a_world()
+            floors.append(floor)
+        else:
+            world = create_an_empty_world()
+            terrains.append(StreamedTerrain(world, terrain))
+        worlds.append(world)
+        people = create_a_population(
+            body_def,
+            [genomes[i] for i in group],
+            world,
+            color_function,
+            record,
+            [scenarios[i] for i in group] if scenarios is not None else None,
+            terrain,
+        )
+        world_people.append(people)
+        for i, person in zip(group, people):
+            population[i] = person
+
+    sensors: Optional[Sensors] = None
+    if any(genome.closed_loop for genome in genomes):
+        sensors = Sensors(body_def, len(population))
+        for world in worlds:
+            sensors.listen(world)
+        for i, person in enumerate(population):
+            sensors.attach(person, i)
+
+    if stats is not None:
+        stats.walkers += len(population)
+        if timed:
+            stats.add("create_population", start)
+            for person in population:
+                person.stats = stats
 
     if draw_start is not None:
         draw_start(scores, generation)
 
+    if stats is not None:
+        stats.first_frame_time = time.time()
+
     t = 0
-    while not all([p.dead for p in population]):
+    live = len(population)
+    cancelled = False
+    while live > 0 and (max_frames is None or t < max_frames):
+        if cancel is not None and t % cancel_check_frames == 0 and cancel.is_set():
+            cancelled = True
+            break
+
+        if terrains and t % TERRAIN_UPDATE_FRAMES == 0:
+            if timed:
+                start = perf_counter()
+            for streamed, people in zip(terrains, world_people):
+                xs = [average_leg_x(p) for p in people if not p.dead]
+                if xs:
+                    streamed.update(min(xs), max(xs))
+            if timed:
+                stats.add("terrain", start)
+
         # Step in the world
-        world.Step(1 / fps, 6 * 10, 3 * 10)
+        if timed:
+            start = perf_counter()
+        for world in worlds:
+            world.Step(1 / fps, 6 * 10, 3 * 10)
+        if timed:
+            stats.add("world_step", start)
+        if stats is not None:
+            stats.add_frame(
+                live,
+                sum(world.bodyCount for world in worlds),
+                sum(world.contactCount for world in worlds),
+            )
+
+        if sensors is not None:
+            if timed:
+                start = perf_counter()
+            sensors.gather(population)
+            if timed:
+                stats.add("sensors", start)
 
         # If enough time has passed, update the population
         for person in population:
@@ -82,15 +289,213 @@ def run_a_generation(
 
         # Draw the world
         if draw_loop is not None:
-            draw_loop(population, floor, fps)
+            if timed:
+                start = perf_counter()
+            draw_loop(population, floors[0], fps)
+            if timed:
+                stats.add("draw", start)
 
+        live = sum([not p.dead for p in population])
         t += 1
 
-    return [p.score for p in population]
+    if stats is not None:
+        stats.wall_time += perf_counter() - wall_start
+
+    walker_results = [
+        p.result() if p.dead or not cancelled else WalkerResult(np.nan, None)
+        for p in population
+    ]
+    if results is not None:
+        results.extend(walker_results)
+
+    return [r.score for r in walker_results]
 
 
 import time
 
+# State of the evaluation workers, set once per process by `_init_worker`
+_worker_body_def: Optional[BodyDef] = None
+_worker_fps: int = 30
+
+
+_worker_timed: bool = False
+# Tasks of the first `_worker_profile_generations` generations are profiled
+# with cProfile, and their stats dumped to `_worker_profile_dir`
+_worker_profile_dir: Optional[str] = None
+_worker_profile_generations: int = 0
+_worker_breeder: Optional[GenomeBreeder] = None
+# Workers report the tasks they start, with their pid, to this queue
+_worker_started: Optional[mp.SimpleQueue] = None
+# Set to stop the running evaluations
+_worker_cancel: Optional[Event] = None
+# Whether the states of the walkers are recorded
+_worker_record: bool = False
+# Floor of the worlds, None for the flat floor
+_worker_terrain: Optional[TerrainProfile] = None
+
+
+def _init_worker(
+    body_path: str,
+    genome_module: str,
+    fps: int,
+    timed: bool,
+    profile_dir: Optional[str] = None,
+    profile_generations: int = 0,
+    breeder: Optional[GenomeBreeder] = None,
+    started: Optional[mp.SimpleQueue] = None,
+    cancel: Optional[Event] = None,
+    record: bool = False,
+    terrain: Optional[TerrainProfile] = None,
+) -> None:
+    """
+    Pool initializer. Loads and compiles the body and imports the genome
+    module once per worker, so tasks only need to carry the genomes. The
+    breeder, if given, is used by the breeding tasks.
+    """
+    global _worker_body_def, _worker_fps, _worker_timed
+    global _worker_profile_dir, _worker_profile_generations, _worker_breeder
+    global _worker_started, _worker_cancel, _worker_record, _worker_terrain
+
+    # Ctrl-C is handled by the simulation, which cancels the evaluations
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    importlib.import_module(genome_module)
+    _worker_body_def = BodyDef(body_path)
+    compile_body(_worker_body_def)
+    _worker_fps = fps
+    _worker_timed = timed
+    _worker_profile_dir = profile_dir
+    _worker_profile_generations = profile_generations
+    _worker_breeder = breeder
+    _worker_started = started
+    _worker_cancel = cancel
+    _worker_record = record
+    _worker_terrain = terrain
+
+
+def _run_generation_worker(
+    start: int,
+    genomes: List[Genome],
+    generation: int,
+    task_id: Optional[int] = None,
+    scenarios: Optional[List[Scenario]] = None,
+) -> Tuple[int, List[WalkerResult], GenerationStats]:
+    """
+    Evaluates `genomes`, in their `scenarios` if given, in a worker
+    initialized by `_init_worker`. Returns the index of the first genome, the
+    walker results and the stats of the evaluation.
+    """
+    assert _worker_body_def is not None, "Worker was not initialized"
+
+    if _worker_started is not None and task_id is not None:
+        _worker_started.put((task_id, os.getpid()))
+
+    profiler: Optional[cProfile.Profile] = None
+    if _worker_profile_dir is not None and generation < _worker_profile_generations:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    stats = GenerationStats(timed=_worker_timed)
+    results: List[WalkerResult] = []
+    run_a_generation(
+        _worker_body_def,
+        genomes,
+        _worker_fps,
+        generation,
+        stats=stats,
+        results=results,
+        cancel=_worker_cancel,
+        record=_worker_record,
+        scenarios=scenarios,
+        terrain=_worker_terrain,
+    )
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(
+            os.path.join(
+                _worker_profile_dir,  # type: ignore
+                f"worker_{os.getpid()}_gen={generation}_start={start}.prof",
+            )
+        )
+    return start, results, stats
+
+
+def _breed_worker(
+    table: SelectionTable,
+    rng_streams: RNGStreams,
+    generation: int,
+    indices: List[int],
+) -> List[Genome]:
+    """
+    Creates the children `indices` of `generation` in a worker initialized by
+    `_init_worker` with a breeder.
+    """
+    assert _worker_breeder is not None, "Worker was not initialized with a breeder"
+    return breed_children(_worker_breeder, table, rng_streams, generation, indices)
+
+
+def get_worker_context() -> BaseContext:
+    """
+    Context the evaluation workers are started with, and in which the objects
+    shared with them must be created.
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        return mp.get_context("forkserver")
+    return mp.get_context()
+
+
+def create_worker_pool(
+    genome_breeder: GenomeBreeder,
+    n_processes: int,
+    fps: int,
+    timed: bool = False,
+    profile_dir: Optional[str] = None,
+    profile_generations: int = 0,
+    started: Optional[mp.SimpleQueue] = None,
+    cancel: Optional[Event] = None,
+    record: bool = False,
+    terrain: Optional[TerrainProfile] = None,
+) -> Pool:
+    """
+    Creates a pool of evaluation workers. When available, the workers are
+    forked from a forkserver that has already imported the simulation and
+    genome modules. If `profile_dir` is given, the tasks of the first
+    `profile_generations` generations dump their cProfile stats there.
+    The workers can also breed with a copy of `genome_breeder`, report the
+    tasks they start to `started` and stop evaluating when `cancel` is set.
+    All of them must be created with `get_worker_context`. If `record` is set,
+    the results carry the states of the walkers. `terrain` is the floor of
+    their worlds, the flat floor if None.
+    """
+    genome_module = type(genome_breeder).__module__
+
+    ctx = get_worker_context()
+    if ctx.get_start_method() == "forkserver":
+        ctx.set_forkserver_preload(["hl.simulation.simulation", genome_module])
+
+    return ctx.Pool(
+        n_processes,
+        initializer=_init_worker,
+        initargs=(
+            genome_breeder.body_def.path,
+            genome_module,
+            fps,
+            timed,
+            profile_dir,
+            profile_generations,
+            genome_breeder,
+            started,
+            cancel,
+            record,
+            terrain,
+        ),
+    )
+
+
+# Score given to the walkers whose evaluation keeps crashing the workers
+CRASH_SCORE = -1e6
+
 
 class SimulationQueuePutter(threading.Thread):
     def __init__(self, queue: mp.Queue, quit_flag: Event):
@@ -124,13 +529,49 @@ class Simulation:
         fps: int = 30,
         frames_per_step: int = 5,
         population_size: int = 64,
+        max_generations: Optional[int] = None,
         n_elite_genomes: int = 4,
         n_mutation_genomes: int = 5,
         n_random_genomes: int = 2,
+        seed: Optional[Seed] = None,
+        optimizer: str = "genetic",
+        selection: str = "roulette",
+        # Fitness
+        fitness: str = "default",
+        record_episodes: bool = False,
+        # Terrain
+        terrain: Optional[Sequence[str]] = None,
+        # Robustness
+        n_scenarios: int = 1,
+        scenario_aggregation: str = "mean",
+        scenario_quantile: float = 0.25,
+        # Convergence
+        convergence: Optional[str] = None,
+        plateau_window: int = 10,
+        plateau_threshold: float = 0.01,
+        min_diversity: Optional[float] = None,
+        plateau_mutation_factor: float = PLATEAU_MUTATION_FACTOR,
+        # Deduplication
+        dedup_resolution: Optional[float] = None,
+        near_duplicate_radius: float = 0.0,
+        near_duplicate_policy: str = "interpolate",
+        # Surrogate
+        surrogate: Optional[str] = None,
+        surrogate_oversample: int = 4,
         # Parallel parameters
         parallel: bool = True,
         n_processes: int = 4,
         quit_flag: Optional[Event] = None,
+        task_timeout: Optional[float] = None,
+        max_task_retries: int = 2,
+        serve: Optional[str] = None,
+        n_local_workers: int = 0,
+        # Profiling
+        profile_phases: bool = False,
+        prometheus: bool = False,
+        profile_generations: int = 0,
+        # Output
+        save_path: Optional[str] = None,
         # Drawing
         draw_start: Optional[Callable] = None,
         draw_loop: Optional[
@@ -140,6 +581,7 @@ class Simulation:
         self.genome_breeder = genome_breeder
 
         self.population_size = population_size
+        self.max_generations = max_generations
 
         self.n_elite_genomes = n_elite_genomes
         self.n_mutation_genomes = n_mutation_genomes
@@ -154,18 +596,134 @@ class Simulation:
 
         self.sample_genome = sample_genome
 
-        self.parallel = parallel
-        self.n_processes = n_processes
+        self.rng_streams = RNGStreams(seed)
 
-        if self.parallel:
-            if population_size % n_processes != 0:
+        # Action taken when the scores stop improving, one of
+        # `CONVERGENCE_ACTIONS`. Without it, the run goes on until
+        # `max_generations` or until it is stopped.
+        if convergence is not None and convergence not in CONVERGENCE_ACTIONS:
+            raise ValueError(
+                f"Unknown convergence action {convergence},"
+                f" choose from {CONVERGENCE_ACTIONS}"
+            )
+        self.convergence = convergence
+        self.plateau = PlateauDetector(plateau_window, plateau_threshold, min_diversity)
+        # The "mutate" and "restart" actions breed with the mutation rate of
+        # the breeder multiplied by `plateau_mutation_factor`
+        self.plateau_mutation_factor = plateau_mutation_factor
+        self.hall_of_fame = HallOfFame(max(2 * self.n_elite_genomes, 1))
+        self._converged = False
+        # Changes to the selection of the next generation after a plateau
+        self._n_injected = 0
+        self._breed_mutation_rate: Optional[float] = None
+        self._restart = False
+
+        # Genomes already evaluated, with parameters equal up to
+        # `dedup_resolution`, are not simulated again. Children closer than
+        # `near_duplicate_radius` to evaluated genomes get an interpolated
+        # score or are replaced by random genomes.
+        if near_duplicate_policy not in NEAR_DUPLICATE_POLICIES:
+            raise ValueError(
+                f"Unknown near duplicate policy {near_duplicate_policy},"
+                f" choose from {NEAR_DUPLICATE_POLICIES}"
+            )
+        self.score_cache: Optional[ScoreCache] = None
+        if dedup_resolution is not None:
+            self.score_cache = ScoreCache(dedup_resolution, near_duplicate_radius)
+        self.near_duplicate_policy = near_duplicate_policy
+
+        # Once the surrogate model has seen two generations, breeding makes
+        # `surrogate_oversample` times more children and only the ones it
+        # predicts best are evaluated
+        self.surrogate: Optional[Surrogate] = None
+        if surrogate is not None:
+            self.surrogate = Surrogate(
+                surrogate, self.rng_streams.run(), min_samples=2 * population_size
+            )
+        self.surrogate_oversample = surrogate_oversample
+
+        # Creates the genomes of every generation from the scores of the
+        # previous one
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f"Unknown optimizer {optimizer}, choose from {OPTIMIZERS}")
+        self.optimizer: Optimizer = GeneticOptimizer(self)
+        if optimizer == "cmaes":
+            if convergence in ("inject", "mutate") or surrogate is not None:
                 raise ValueError(
-                    "In parallel simulation, the population_size must be divisible by"
-                    " the number of processes."
+                    "CMA-ES supports the stop and restart convergence actions,"
+                    " and no surrogate"
                 )
+            if selection != "roulette":
+                raise ValueError("CMA-ES selects on the score")
+            self.optimizer = CMAESOptimizer(population_size, self.rng_streams)
+
+        # The genetic algorithm selects on the score (roulette), or on the
+        # objectives of the walkers (NSGA-II)
+        if selection not in SELECTIONS:
+            raise ValueError(f"Unknown selection {selection}, choose from {SELECTIONS}")
+        self.selection = selection
+        # Objectives of the current generation, one row per genome
+        self.objectives = np.empty((0, len(OBJECTIVES)))
+        # Whether every genome of the current generation was simulated, the
+        # scores of near duplicates are only interpolated
+        self.simulated = np.empty(0, dtype=bool)
+
+        # Scores are given by the simulation, or by a fitness function of the
+        # recorded states of the walkers (see `hl.simulation.fitness`). If
+        # `record_episodes` is set, the recorded states are saved every
+        # generation.
+        self.fitness = fitness
+        self.fitness_function = get_fitness(fitness)
+        self.record_episodes = record_episodes
+        self._record = fitness != "default" or record_episodes
+
+        # Every genome is evaluated in `n_scenarios` scenarios, the same for
+        # the whole run: the unperturbed one and random perturbations of the
+        # pose, the friction and a push. Its score combines the scores it got.
+        if scenario_aggregation not in AGGREGATIONS:
+            raise ValueError(
+                f"Unknown scenario aggregation {scenario_aggregation},"
+                f" choose from {AGGREGATIONS}"
+            )
+        self.scenarios: Optional[List[Scenario]] = None
+        if n_scenarios > 1:
+            self.scenarios = sample_scenarios(
+                genome_breeder.body_def, n_scenarios, self.rng_streams.scenarios()
+            )
+        self.scenario_aggregation = scenario_aggregation
+        self.scenario_quantile = scenario_quantile
+
+        # Walkers walk on a procedural floor made of the `terrain` kinds, the
+        # same for the whole run, instead of the flat floor
+        self.terrain: Optional[TerrainProfile] = None
+        if terrain is not None:
+            self.terrain = TerrainProfile(
+                int(self.rng_streams.terrain().integers(2**32)), terrain
+            )
+
+        self.parallel = parallel
+        self.n_processes = n_processes
+
+        # Evaluation tasks running for longer than `task_timeout` seconds are
+        # considered stuck and retried
+        self.task_timeout = task_timeout
+        self.max_task_retries = max_task_retries
+        self._started: Optional[mp.SimpleQueue] = None
+        # Forwards `quit_flag` to the workers
+        self._cancel: Optional[Event] = None
+        self._next_task_id = 0
+
+        # Evaluation on worker nodes connected to `serve` (HOST:PORT)
+        self.serve = serve
+        self.n_local_workers = n_local_workers
+        self.distributed = serve is not None or n_local_workers > 0
+        self._coordinator: Optional["Coordinator"] = None
 
+        if self.parallel:
             if draw_start is not None or draw_loop is not None:
                 raise ValueError("Drawing is not supported yet in parallel simulation")
+        if self.terrain is not None and draw_loop is not None:
+            raise ValueError("Drawing is not supported yet on a terrain")
 
         self.draw_start = draw_start
         self.draw_loop = draw_loop
@@ -177,16 +735,39 @@ class Simulation:
         self._fps = fps
         self.frames_per_step = frames_per_step
         self.population_queue_manager: Optional[SimulationQueuePutter] = None
+        self._pool: Optional[Pool] = None
+        self.time_to_first_frame: Optional[Tuple[float, float]] = None
+        self.profile_phases = profile_phases
+        self.last_stats: Optional[GenerationStats] = None
         self._last_genomes: Optional[List[Genome]] = None
         self._last_genomes_generation = self.generation_count
         self.quit_flag = quit_flag
 
-        import datetime
+        if save_path is None:
+            import datetime
+
+            DATE = datetime.datetime.now().strftime("%d%m%Y_%H%M%S")
 
-        DATE = datetime.datetime.now().strftime("%d%m%Y_%H%M%S")
+            save_path = os.path.join(ASSETS_PATH, f"checkpoints/{DATE}")
+        self.save_path = save_path
+        os.makedirs(self.save_path, exist_ok=True)
 
-        self.save_path = os.path.join(ASSETS_PATH, f"checkpoints/{DATE}")
-        os.makedirs(self.save_path)
+        self.telemetry = TelemetrySink(
+            os.path.join(self.save_path, "telemetry.jsonl"),
+            os.path.join(self.save_path, "metrics.prom") if prometheus else None,
+        )
+        # Fields added to the telemetry record of the current generation
+        self.generation_record: Dict[str, Any] = dict()
+        self.failure_log = TelemetrySink(os.path.join(self.save_path, "failures.log"))
+
+        # cProfile of the main process and the workers for the first
+        # `profile_generations` generations
+        self.profile_generations = profile_generations
+        self.profile_dir = os.path.join(self.save_path, "profile")
+        self._profiler: Optional[cProfile.Profile] = None
+
+        with open(os.path.join(self.save_path, "seed.txt"), "w") as file:
+            file.write(f"{self.rng_streams.entropy}\n")
 
     def add_parallel_params(self, queue: mp.Queue) -> None:
         assert self.quit_flag is not None
@@ -208,20 +789,28 @@ class Simulation:
     def _create_world(self) -> Tuple[b2World, WorldObject]:
         return create_a_world()
 
+    def _child_rng(self, generation: int, index: int) -> GenomeBreeder:
+        """
+        Seeds the breeder with the random stream of a child before creating
+        it, and returns the breeder.
+        """
+        self.genome_breeder.rng = self.rng_streams.child(generation, index)
+        return self.genome_breeder
+
     def _create_initial_genomes(self) -> List[Genome]:
         if self.sample_genome is not None:
             genomes = [self.sample_genome]
-            for _ in range(self.population_size - len(genomes)):
+            for i in range(len(genomes), self.population_size):
                 genomes.append(
-                    self.genome_breeder.get_genome_from_breed(
+                    self._child_rng(0, i).get_genome_from_breed(
                         [self.sample_genome], [1], 1.0
                     )
                 )
             return genomes
         else:
             return [
-                self.genome_breeder.get_random_genome()
-                for _ in range(self.population_size)
+                self._child_rng(0, i).get_random_genome()
+                for i in range(self.population_size)
             ]
 
     def _create_population_from_genomes(
@@ -239,53 +828,423 @@ class Simulation:
 
         return population
 
-    def _run_generation(self, genomes: List[Genome]) -> List[float]:
-        return run_a_generation(
+    def _run_generation(
+        self, genomes: List[Genome], scenarios: Optional[List[Scenario]] = None
+    ) -> List[WalkerResult]:
+        self.last_stats = GenerationStats(timed=self.profile_phases)
+        results: List[WalkerResult] = []
+        run_a_generation(
             self.genome_breeder.body_def,
             genomes,
             self._fps,
             self.generation_count,
             self.draw_start,
             self.draw_loop,
+            stats=self.last_stats,
+            results=results,
+            cancel=self.quit_flag,
+            record=self._record,
+            scenarios=scenarios,
+            terrain=self.terrain,
         )
+        return results
+
+    def _get_pool(self) -> Pool:
+        if self._pool is None:
+            if self._started is None:
+                self._started = get_worker_context().SimpleQueue()
+                self._cancel = get_worker_context().Event()
+            self._pool = create_worker_pool(
+                self.genome_breeder,
+                self.n_processes,
+                self._fps,
+                self.profile_phases,
+                self.profile_dir if self.profile_generations > 0 else None,
+                self.profile_generations,
+                self._started,
+                self._cancel,
+                self._record,
+                self.terrain,
+            )
+        return self._pool
 
-    def _run_generation_parallel(self, genomes: List[Genome]) -> List[float]:
-        pool = mp.Pool(self.n_processes)
-        returns: List[AsyncResult] = []
+    def _close_pool(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
 
-        population_per_process = self.population_size // self.n_processes
+    def _terminate_pool(self) -> None:
+        """
+        Kills the workers, e.g. when some of them are stuck. A fresh pool is
+        created when needed.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _get_coordinator(self) -> "Coordinator":
+        if self._coordinator is None:
+            from hl.simulation.distributed import Coordinator, parse_address
+
+            self._coordinator = Coordinator(
+                self.genome_breeder,
+                self._fps,
+                parse_address(self.serve) if self.serve else ("localhost", 0),
+                n_local_workers=self.n_local_workers,
+                record=self._record,
+                terrain=self.terrain,
+                max_task_retries=self.max_task_retries,
+            )
+        return self._coordinator
+
+    def _close_coordinator(self) -> None:
+        if self._coordinator is not None:
+            self._coordinator.close()
+            self._coordinator = None
+
+    def _run_generation_distributed(
+        self, genomes: List[Genome], scenarios: Optional[List[Scenario]] = None
+    ) -> List[WalkerResult]:
+        coordinator = self._get_coordinator()
+        per_genome = len(self.scenarios) if scenarios is not None else 1
+        results, self.last_stats = coordinator.evaluate(
+            genomes, self.generation_count, self.quit_flag, scenarios, per_genome
+        )
+        self.generation_record["workers"] = coordinator.n_workers
+        self.generation_record["lost_workers"] = coordinator.lost_workers
+        failures = coordinator.pop_failures()
+        for record in failures:
+            self.failure_log.write(record)
+        if failures:
+            self.generation_record["failed_tasks"] = len(failures)
+            self.generation_record["crashed_genomes"] = sum(
+                len(record["genomes"]) // per_genome
+                for record in failures
+                if "crash_score" in record
+            )
+        return results
+
+    def _start_profiling(self) -> None:
+        if self.profile_generations <= 0:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def _stop_profiling(self) -> None:
+        """
+        Stops profiling the main process and writes the report merging the
+        stats of the main process and of the workers into the save path.
+        """
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        self._profiler.dump_stats(os.path.join(self.profile_dir, "main.prof"))
+        self._profiler = None
+
+        write_profile_report(self.profile_dir, self.save_path)
+        print(
+            f"Profile of {self.profile_generations} generation(s) saved to "
+            f"{os.path.join(self.save_path, 'profile.txt')}"
+        )
 
-        for n in range(self.n_processes):
-            sli = slice(
-                population_per_process * n,
-                population_per_process * (n + 1),
+    def _run_generation_parallel(
+        self, genomes: List[Genome], scenarios: Optional[List[Scenario]] = None
+    ) -> List[WalkerResult]:
+        dispatch_time = time.time()
+        results, stats = self._evaluate_in_pool(genomes, scenarios)
+
+        self.last_stats = GenerationStats.merged(stats)
+        first_frames = [
+            s.first_frame_time for s in stats if s.first_frame_time is not None
+        ]
+        if first_frames:
+            self.time_to_first_frame = (
+                min(first_frames) - dispatch_time,
+                max(first_frames) - dispatch_time,
+            )
+            print(
+                f"Time to first frame: {self.time_to_first_frame[0]:.3f}s"
+                f" (slowest worker: {self.time_to_first_frame[1]:.3f}s)"
             )
-            returns.append(
+
+        return results
+
+    def _evaluate_in_pool(
+        self, genomes: List[Genome], scenarios: Optional[List[Scenario]] = None
+    ) -> Tuple[List[WalkerResult], List[GenerationStats]]:
+        """
+        Evaluates `genomes` in the worker pool, surviving crashed workers. A
+        task that raises, times out or whose worker dies is retried, keeping
+        the results of the tasks that completed. Failed tasks are split in two
+        to isolate the genomes that crash, which get `CRASH_SCORE` once they
+        have failed `max_task_retries` times on their own. Every failure is
+        logged to `failures.log`. With scenarios, the walkers of a genome are
+        never split across tasks.
+        """
+        results: Dict[int, WalkerResult] = dict()
+        stats: List[GenerationStats] = []
+        retries: Dict[int, int] = dict()
+        n_failures = 0
+        per_genome = len(self.scenarios) if scenarios is not None else 1
+
+        chunks = split_walkers(np.arange(len(genomes)), self.n_processes, per_genome)
+        while chunks:
+            failed = self._run_chunks(genomes, chunks, results, stats, scenarios)
+            n_failures += len(failed)
+
+            chunks = []
+            for chunk, error in failed:
+                record: Dict[str, Any] = {
+                    "generation": self.generation_count,
+                    "timestamp": time.time(),
+                    "genomes": [int(i) for i in chunk],
+                    "error": error,
+                }
+                if self.quit_flag is not None and self.quit_flag.is_set():
+                    # Cancelled, the genomes are left unevaluated
+                    for i in chunk:
+                        results[int(i)] = WalkerResult(np.nan, None)
+                elif len(chunk) > per_genome:
+                    chunks += split_walkers(chunk, 2, per_genome)
+                else:
+                    # The walkers of a single genome
+                    i = int(chunk[0])
+                    retries[i] = retries.get(i, 0) + 1
+                    record["retries"] = retries[i]
+                    if retries[i] >= self.max_task_retries:
+                        for j in chunk:
+                            results[int(j)] = WalkerResult(CRASH_SCORE, 0)
+                        record["crash_score"] = CRASH_SCORE
+                    else:
+                        chunks.append(chunk)
+                self.failure_log.write(record)
+                print(f"Evaluation of genomes {record['genomes']} failed: {error}")
+
+        if n_failures > 0:
+            self.generation_record["failed_tasks"] = n_failures
+            self.generation_record["crashed_genomes"] = sum(
+                r >= self.max_task_retries for r in retries.values()
+            )
+        return [results[i] for i in range(len(genomes))], stats
+
+    def _run_chunks(
+        self,
+        genomes: List[Genome],
+        chunks: List[np.ndarray],
+        results: Dict[int, WalkerResult],
+        stats: List[GenerationStats],
+        scenarios: Optional[List[Scenario]] = None,
+    ) -> List[Tuple[np.ndarray, str]]:
+        """
+        Evaluates every chunk of genome indices in a task of the pool, adding
+        the completed ones to `results` and `stats`. Returns the chunks that
+        failed and why.
+        """
+        pool = self._get_pool()
+        assert self._started is not None
+
+        tasks: Dict[int, Tuple[np.ndarray, AsyncResult]] = dict()
+        for chunk in chunks:
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            tasks[task_id] = (
+                chunk,
                 pool.apply_async(
-                    run_a_generation,
+                    _run_generation_worker,
                     args=[
-                        self.genome_breeder.body_def,
-                        genomes[sli],
-                        self._fps,
+                        int(chunk[0]),
+                        [genomes[i] for i in chunk],
                         self.generation_count,
+                        task_id,
+                        (
+                            [scenarios[i] for i in chunk]
+                            if scenarios is not None
+                            else None
+                        ),
                     ],
+                ),
+            )
+
+        failed: List[Tuple[np.ndarray, str]] = []
+        pids: Dict[int, int] = dict()
+        start_times: Dict[int, float] = dict()
+        # A pool that lost a task never completes it and cannot be closed
+        broken = False
+        while tasks:
+            if self.quit_flag is not None and self.quit_flag.is_set():
+                assert self._cancel is not None
+                self._cancel.set()
+
+            while not self._started.empty():
+                task_id, pid = self._started.get()
+                pids[task_id] = pid
+                start_times[task_id] = time.time()
+            # Pool does not expose its workers, and replaces the dead ones
+            alive = {p.pid for p in pool._pool if p.exitcode is None}  # type: ignore
+
+            for task_id, (chunk, r) in list(tasks.items()):
+                error: Optional[str] = None
+                if r.ready():
+                    try:
+                        _, worker_results, worker_stats = r.get()
+                        results.update(zip([int(i) for i in chunk], worker_results))
+                        stats.append(worker_stats)
+                    except Exception as e:
+                        error = repr(e)
+                elif task_id in pids and pids[task_id] not in alive:
+                    error = f"worker {pids[task_id]} died"
+                    broken = True
+                elif (
+                    self.task_timeout is not None
+                    and task_id in start_times
+                    and time.time() - start_times[task_id] > self.task_timeout
+                ):
+                    error = f"timed out after {self.task_timeout}s"
+                    broken = True
+                else:
+                    continue
+
+                del tasks[task_id]
+                if error is not None:
+                    failed.append((chunk, error))
+
+            if tasks:
+                time.sleep(0.01)
+
+        if broken:
+            self._terminate_pool()
+        return failed
+
+    def _evaluate(self, genomes: List[Genome]) -> List[WalkerResult]:
+        """
+        Evaluates `genomes` with the evaluation backend. With scenarios, every
+        genome is simulated once per scenario, in the same worlds and tasks,
+        and the results of its walkers are combined.
+        """
+        scenarios: Optional[List[Scenario]] = None
+        if self.scenarios is not None:
+            genomes = [genome for genome in genomes for _ in self.scenarios]
+            scenarios = self.scenarios * (len(genomes) // len(self.scenarios))
+
+        if self.distributed:
+            results = self._run_generation_distributed(genomes, scenarios)
+        elif self.parallel:
+            results = self._run_generation_parallel(genomes, scenarios)
+        else:
+            results = self._run_generation(genomes, scenarios)
+        if self._record:
+            self._score_episodes(results)
+
+        if self.scenarios is not None:
+            # Spread of the scores of a genome across the scenarios
+            spread = (
+                np.array([r.score for r in results])
+                .reshape(-1, len(self.scenarios))
+                .std(axis=1)
+            )
+            if not np.isnan(spread).all():
+                self.generation_record["scenario_score_std"] = float(np.nanmean(spread))
+            results = aggregate_results(
+                results,
+                len(self.scenarios),
+                self.scenario_aggregation,
+                self.scenario_quantile,
+            )
+        return results
+
+    def _score_episodes(self, results: List[WalkerResult]) -> None:
+        """
+        Scores the finished walkers with the fitness function, saves their
+        episodes if asked, and drops the recordings.
+        """
+        episodes = Episodes.from_results(results, self.genome_breeder.body_def)
+        if self.record_episodes:
+            episodes.save(
+                os.path.join(
+                    self.save_path, f"gen={self.generation_count}_episodes.npz"
                 )
             )
 
-        pool.close()
-        pool.join()
+        if self.fitness != "default":
+            scores = self.fitness_function(episodes)
+            for result, score in zip(results, scores):
+                # Crashed and unfinished walkers keep their score
+                if result.recording is not None and result.death_frame is not None:
+                    result.score = float(score)
 
-        scores: List[float] = []
-        for p in returns:
-            scores += p.get()
+        for result in results:
+            result.recording = None
+
+    def _evaluate_unique(
+        self, genomes: List[Genome]
+    ) -> Tuple[List[Genome], List[WalkerResult]]:
+        """
+        Evaluates the genomes that were not evaluated before, and reuses the
+        results of the others. Returns the genomes, with the near duplicates
+        replaced if that is the policy, and their results.
+        """
+        if self.score_cache is None:
+            return genomes, self._evaluate(genomes)
+
+        genomes = list(genomes)
+        vectors = [genome.to_vector() for genome in genomes]
+        plan = self.score_cache.plan(vectors)
+
+        results: List[WalkerResult] = [WalkerResult(np.nan, None)] * len(genomes)
+        for i, result in plan.known.items():
+            results[i] = result
+        evaluate = plan.evaluate
+        copies = plan.copies
+        near = list(plan.near)
+        if self.near_duplicate_policy == "interpolate":
+            for i, score in plan.near.items():
+                results[i] = WalkerResult(score, None, interpolated=True)
+        else:
+            # The copies of a near duplicate are near duplicates too, and are
+            # replaced by genomes of their own
+            near += [i for i, j in copies.items() if j in plan.near]
+            copies = {i: j for i, j in copies.items() if j not in plan.near}
+            for i in near:
+                self.genome_breeder.rng = self.rng_streams.replacement(
+                    self.generation_count, i
+                )
+                genomes[i] = self.genome_breeder.get_random_genome()
+                vectors[i] = genomes[i].to_vector()
+            evaluate = sorted(evaluate + near)
+
+        if len(evaluate) > 0:
+            evaluated = self._evaluate([genomes[i] for i in evaluate])
+            for i, result in zip(evaluate, evaluated):
+                results[i] = result
+            self.score_cache.add([vectors[i] for i in evaluate], evaluated)
+        else:
+            self.last_stats = GenerationStats(timed=self.profile_phases)
+        for i, j in copies.items():
+            results[i] = results[j]
 
-        return scores
+        self.generation_record["duplicates"] = len(plan.known) + len(copies)
+        self.generation_record["near_duplicates"] = len(near)
+        self.generation_record["simulations_saved"] = len(genomes) - len(evaluate)
+        return genomes, results
 
     def _save_best(self, genomes: List[Genome], scores: List[float]):
         with open(os.path.join(self.save_path, "scores.nyasu"), "a") as file:
             file.write(f"{' '.join([f'{s:.3f}' for s in scores])}\n")
 
-        best_index = np.argmax(scores)
+        # Walkers left unevaluated by a cancelled generation have a NaN score
+        finished = ~np.isnan(scores)
+        if not finished.all():
+            self._save_partial(genomes, scores)
+
+        # Only simulated genomes are saved as the best
+        simulated_scores = self._simulated_scores(scores)
+        if np.isnan(simulated_scores).all():
+            return
+
+        best_index = int(np.nanargmax(simulated_scores))
         best_score = scores[best_index]
         if best_score > self.prev_best_score:
             self.prev_best_score = best_score
@@ -301,58 +1260,312 @@ class Simulation:
             except FileExistsError:
                 pass
 
-    def _breed(self, genomes: List[Genome], scores: List[float]) -> List[Genome]:
+    def _simulated_scores(self, scores: Sequence[float]) -> List[float]:
         """
-        Breed the population.
+        `scores` with NaN for the genomes of the current generation whose score
+        was interpolated, so that they are not kept as the best genomes.
         """
+        return [
+            score if simulated else np.nan
+            for score, simulated in zip(scores, self.simulated)
+        ]
 
-        # Selecting the best genomes to keep for the next generation
-        gs = list(zip(genomes, scores))
-        gs = sorted(gs, key=lambda x: x[1], reverse=True)
-        elite_genomes = gs[: self.n_elite_genomes]
-
-        new_genomes: List[Genome] = [e[0] for e in elite_genomes]
-
-        for _ in range(self.n_mutation_genomes):
-            new_genomes.append(
-                self.genome_breeder.get_genome_from_breed(
-                    [gs[0][0]],  # Best genome
-                    [1],
-                    0.3,
+    def _save_partial(self, genomes: List[Genome], scores: List[float]) -> None:
+        """
+        Saves the genomes of a cancelled generation with the scores of the ones
+        that were evaluated (NaN for the others), so they can be reused.
+        """
+        self.generation_record["unfinished"] = int(np.isnan(scores).sum())
+        with open(
+            os.path.join(self.save_path, f"gen={self.generation_count}_partial.nyp"),
+            "wb",
+        ) as file:
+            file.write(
+                pickle.dumps(
+                    {
+                        "generation": self.generation_count,
+                        "genomes": genomes,
+                        "scores": scores,
+                    }
                 )
             )
 
-        # Add random genomes
-        for _ in range(self.n_random_genomes):
-            new_genomes.append(self.genome_breeder.get_random_genome())
+    def _migrate(
+        self, genomes: List[Genome], scores: List[float]
+    ) -> Tuple[List[Genome], List[float]]:
+        """
+        Hook called between evaluation and breeding, returns the genomes and
+        scores to breed from. Used by the island model to exchange genomes.
+        """
+        return genomes, scores
+
+    def _check_convergence(self, genomes: List[Genome], scores: List[float]) -> None:
+        """
+        Feeds the evaluated generation to the plateau detector, and takes the
+        convergence action if the run has stalled.
+        """
+        diversity = population_diversity(genomes)
+        if diversity is not None:
+            self.generation_record["diversity"] = diversity
+        if self.convergence is None:
+            return
+
+        previous_best = self.hall_of_fame.scores[:1]
+        self.hall_of_fame.update(genomes, self._simulated_scores(scores))
+        if self.hall_of_fame.scores[:1] != previous_best:
+            # The raised mutation rate is kept until the run improves again
+            self._breed_mutation_rate = None
+
+        self.plateau.update(scores, diversity)
+        if not self.plateau.is_plateau():
+            return
+
+        print(f"Plateau reached, convergence action: {self.convergence}")
+        self.generation_record["convergence"] = self.convergence
+        self.plateau.reset()
+        if self.convergence == "stop":
+            self._converged = True
+        elif self.convergence == "inject":
+            self._n_injected = int(self.population_size * INJECT_FRACTION)
+        elif self.convergence == "mutate":
+            self._breed_mutation_rate = self._plateau_mutation_rate()
+        elif self.convergence == "restart":
+            self.optimizer.restart(self.hall_of_fame.genomes, self.hall_of_fame.scores)
+
+    def _plateau_mutation_rate(self) -> float:
+        """
+        Mutation rate of the breeder raised by `plateau_mutation_factor`, and
+        logs it.
+        """
+        rate = min(
+            1.0, self.plateau_mutation_factor * self.genome_breeder.mutation_rate
+        )
+        print(f"Breeding with a mutation rate of {rate:.3g}")
+        self.generation_record["plateau_mutation_rate"] = rate
+        return rate
+
+    def _select_restart(self) -> SelectionTable:
+        """
+        Selects a new population made from the hall of fame: its genomes,
+        mutations of the best one, random genomes, and genomes bred from it
+        with a high mutation rate.
+        """
+        hall = self.hall_of_fame.genomes[: self.population_size]
+        n_mutation = min(self.n_mutation_genomes, self.population_size - len(hall))
+        n_new = self.population_size - len(hall) - n_mutation
+
+        return SelectionTable(
+            hall,
+            hall[0],
+            hall,
+            to_distr(self.hall_of_fame.scores[: len(hall)]),
+            n_mutation,
+            n_new // 2,
+            n_new - n_new // 2,
+            breed_mutation_rate=self._plateau_mutation_rate(),
+        )
+
+    def _rank_nsga(self) -> np.ndarray:
+        """
+        Indices of the genomes ranked by the non-dominated front of their
+        objectives, and by crowding distance within a front.
+        """
+        order, fronts = nsga_order(self.objectives * OBJECTIVE_SENSE)
+        self.generation_record["pareto_front"] = int((fronts == 0).sum())
+        return order
+
+    def _select(self, genomes: List[Genome], scores: List[float]) -> SelectionTable:
+        """
+        Selects the genomes the next generation is made from.
+        """
+        if self._restart:
+            self._restart = False
+            return self._select_restart()
 
         # Select only the best 50% of genomes to breed
         genomes_to_breed = int(len(genomes) * 0.5)
-        s_gs = gs[:genomes_to_breed]
-        s_genomes = [e[0] for e in s_gs]
-        s_scores = [e[1] for e in s_gs]
-        distr = to_distr(s_scores)
-
-        for _ in tqdm(
-            range(self.n_breed_genomes),
-            desc="Breeding",
-        ):
-            genome = self.genome_breeder.get_genome_from_breed(s_genomes, distr)
-            new_genomes.append(genome)
 
+        # Elites are kept as they are, so they must have been simulated
+        simulated = self.simulated
+
+        if self.selection == "nsga2":
+            order = self._rank_nsga()
+            ranked = [genomes[i] for i in order]
+            elite_genomes = [genomes[i] for i in order if simulated[i]]
+            elite_genomes = elite_genomes[: self.n_elite_genomes]
+            simulated_scores = self._simulated_scores(scores)
+            if np.isnan(simulated_scores).all():
+                simulated_scores = list(scores)
+            best = genomes[int(np.nanargmax(simulated_scores))]
+            s_genomes = ranked[:genomes_to_breed]
+            # Parents are picked with a probability decreasing with their rank
+            distr = to_distr(np.arange(len(s_genomes), 0, -1))
+        else:
+            # Selecting the best genomes to keep for the next generation
+            gs = list(zip(genomes, scores, simulated))
+            gs = sorted(gs, key=lambda x: x[1], reverse=True)
+            elite_genomes = [e[0] for e in gs if e[2]][: self.n_elite_genomes]
+            best = next((e[0] for e in gs if e[2]), gs[0][0])
+
+            s_gs = gs[:genomes_to_breed]
+            s_genomes = [e[0] for e in s_gs]
+            s_scores = [e[1] for e in s_gs]
+            distr = to_distr(s_scores)
+
+        # Random genomes injected after a plateau take the place of bred ones
+        n_injected = min(self._n_injected, self.n_breed_genomes)
+        self._n_injected = 0
+
+        return SelectionTable(
+            elite_genomes,
+            best,
+            s_genomes,
+            distr,
+            self.n_mutation_genomes,
+            self.n_random_genomes + n_injected,
+            self.n_breed_genomes - n_injected,
+            breed_mutation_rate=self._breed_mutation_rate,
+        )
+
+    def _update_surrogate(self, genomes: List[Genome], scores: List[float]) -> None:
+        """
+        Measures how well the surrogate predicted the evaluated generation, and
+        adds it to the samples of the surrogate.
+        """
+        if self.surrogate is None:
+            return
+
+        # Crashes would dominate the fit, and interpolated scores would be
+        # learned back
+        evaluated = np.array(self._simulated_scores(scores))
+        valid = ~np.isnan(evaluated) & (evaluated > CRASH_SCORE)
+        if not valid.any():
+            return
+        vectors = [genome.to_vector() for genome, v in zip(genomes, valid) if v]
+        if self.surrogate.fitted:
+            predicted = self.surrogate.predict(vectors)
+            self.generation_record.update(
+                surrogate_accuracy(predicted, evaluated[valid])
+            )
+        self.surrogate.add(vectors, evaluated[valid])
+
+    def _screen(
+        self, genomes: List[Genome], n_candidates: int, n_keep: int
+    ) -> List[Genome]:
+        """
+        Keeps the `n_keep` of the `n_candidates` bred children, the last
+        genomes of the population, that the surrogate predicts best.
+        """
+        assert self.surrogate is not None
+        start = len(genomes) - n_candidates
+        self.surrogate.fit()
+        predicted = self.surrogate.predict([g.to_vector() for g in genomes[start:]])
+        keep = np.sort(np.argsort(-predicted, kind="stable")[:n_keep])
+
+        self.generation_record["surrogate_screened"] = n_candidates
+        self.generation_record["surrogate_simulations_saved"] = n_candidates - n_keep
+        return genomes[:start] + [genomes[start + i] for i in keep]
+
+    def _breed(self, genomes: List[Genome], scores: List[float]) -> List[Genome]:
+        """
+        Breed the population. With a surrogate, more children are bred and
+        screened by it.
+        """
+        table = self._select(genomes, scores)
+        if self.surrogate is None or not self.surrogate.ready:
+            return self._create_children(table)
+
+        n_breed = table.n_breed
+        table.n_breed = n_breed * self.surrogate_oversample
+        return self._screen(self._create_children(table), table.n_breed, n_breed)
+
+    def _create_children(self, table: SelectionTable) -> List[Genome]:
+        """
+        Creates the population described by `table`. In parallel simulations,
+        the children are split across the worker pool.
+        """
+        # Children are seeded with the streams of the next generation
+        generation = self.generation_count + 1
+        indices = list(range(len(table.elites), len(table)))
+
+        if not self.parallel:
+            children = breed_children(
+                self.genome_breeder, table, self.rng_streams, generation, indices
+            )
+            return table.elites + children
+
+        pool = self._get_pool()
+        returns: List[AsyncResult] = [
+            pool.apply_async(
+                _breed_worker,
+                args=[table, self.rng_streams, generation, [int(i) for i in chunk]],
+            )
+            for chunk in np.array_split(indices, self.n_processes)
+            if len(chunk) > 0
+        ]
+
+        new_genomes: List[Genome] = list(table.elites)
+        for r in returns:
+            new_genomes += r.get()
         return new_genomes
 
-    def has_converged(self, threshold: float = 0.01) -> bool:
+    def _log_generation(
+        self,
+        scores: List[float],
+        eval_time: float,
+        checkpoint_time: float,
+        breed_time: float,
+    ) -> None:
         """
-        Checks if the simulation has converged. This is done by checking if the
-        average score of the last 10 generations is below a threshold.
+        Writes the telemetry record of the current generation.
         """
-        return False
-        # return (
-        #     False
-        #     if self.scores is None
-        #     else sum(self.scores) / len(self.scores) < threshold
-        # )
+        record: Dict[str, Any] = {
+            "generation": self.generation_count,
+            "timestamp": time.time(),
+            "generation_seconds": eval_time + checkpoint_time + breed_time,
+            "eval_seconds": eval_time,
+            "checkpoint_seconds": checkpoint_time,
+            "breed_seconds": breed_time,
+            "population": len(scores),
+            "scores": score_summary(scores),
+            "energy": score_summary(self.objectives[:, OBJECTIVES.index("energy")]),
+        }
+
+        stats = self.last_stats
+        if stats is not None:
+            if self.distributed:
+                workers = max(self.generation_record.get("workers", 1), 1)
+            else:
+                workers = self.n_processes if self.parallel else 1
+            record.update(
+                {
+                    "frames": stats.frames,
+                    "walker_frames": stats.walker_frames,
+                    "walker_frames_per_second": stats.walker_frames / eval_time,
+                    "worker_utilization": stats.wall_time / (workers * eval_time),
+                }
+            )
+        if self.parallel and self.time_to_first_frame is not None:
+            record["time_to_first_frame"] = self.time_to_first_frame[0]
+
+        record.update(self.generation_record)
+        self.generation_record = dict()
+
+        self.telemetry.write(record)
+
+    def has_converged(self) -> bool:
+        """
+        Checks if the simulation has converged, i.e. it reached a plateau and
+        its convergence action is `stop`.
+        """
+        return self._converged
+
+    def _on_interrupt(self, signum, frame) -> None:
+        assert self.quit_flag is not None
+        if self.quit_flag.is_set():
+            raise KeyboardInterrupt()
+        print("Stopping the generation, press Ctrl-C again to abort")
+        self.quit_flag.set()
 
     def forced_quit(self) -> bool:
         if self.quit_flag is not None:
@@ -371,22 +1584,71 @@ class Simulation:
         # Start the simulation
         genomes = self._create_initial_genomes()
 
-        while not self.has_converged() and not self.forced_quit():
-            print(f"Generation {self.generation_count}")
-            scores = (
-                self._run_generation_parallel(genomes)
-                if self.parallel
-                else self._run_generation(genomes)
-            )
-            print(f"max score: {max(scores):.3f}. avg score: {np.mean(scores):.3f}")
-
-            self._save_best(genomes, scores)
-
-            self.add_last_genomes(genomes, scores)
-            if self.forced_quit():
-                break
-            genomes = self._breed(genomes, scores)
-            # genomes = self._create_initial_genomes()
-            self.generation_count += 1
+        # The first Ctrl-C stops the running generation cleanly
+        previous_handler = None
+        if (
+            self.quit_flag is not None
+            and threading.current_thread() is threading.main_thread()
+        ):
+            previous_handler = signal.signal(signal.SIGINT, self._on_interrupt)
+
+        self._start_profiling()
+        try:
+            while not self.has_converged() and not self.forced_quit():
+                if (
+                    self.max_generations is not None
+                    and self.generation_count >= self.max_generations
+                ):
+                    break
+                print(f"Generation {self.generation_count}")
+                start = perf_counter()
+                genomes, results = self._evaluate_unique(genomes)
+                scores = [r.score for r in results]
+                self.objectives = objective_matrix(results)
+                self.simulated = np.array([not r.interpolated for r in results])
+                eval_time = perf_counter() - start
+                if np.isnan(scores).all():
+                    print("Generation cancelled before any walker finished")
+                else:
+                    print(
+                        f"max score: {np.nanmax(scores):.3f}."
+                        f" avg score: {np.nanmean(scores):.3f}"
+                    )
+                if self.profile_phases and self.last_stats is not None:
+                    print(self.last_stats.report())
+
+                start = perf_counter()
+                self._save_best(genomes, scores)
+                checkpoint_time = perf_counter() - start
+
+                self.add_last_genomes(genomes, scores)
+                if self.forced_quit():
+                    self._log_generation(scores, eval_time, checkpoint_time, 0.0)
+                    break
+
+                self._check_convergence(genomes, scores)
+                if self.has_converged():
+                    self._log_generation(scores, eval_time, checkpoint_time, 0.0)
+                    break
+                self._update_surrogate(genomes, scores)
+
+                parents, parent_scores = self._migrate(genomes, scores)
+
+                start = perf_counter()
+                self.optimizer.tell(parents, parent_scores)
+                genomes = self.optimizer.ask()
+                breed_time = perf_counter() - start
+
+                self._log_generation(scores, eval_time, checkpoint_time, breed_time)
+                # genomes = self._create_initial_genomes()
+                self.generation_count += 1
+                if self.generation_count >= self.profile_generations:
+                    self._stop_profiling()
+        finally:
+            self._close_pool()
+            self._close_coordinator()
+            self._stop_profiling()
+            if previous_handler is not None:
+                signal.signal(signal.SIGINT, previous_handler)
         if self.quit_flag is not None:
             self.quit_flag.set()
@@ -0,0 +1,164 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Sequence
+
+import numpy as np
+
+from hl.simulation.dedup import NeighbourIndex
+
+
+SURROGATE_MODELS = ["ridge", "knn"]
+
+
+class RidgeModel:
+    """
+    Ridge regression on `n_features` random Fourier features, an
+    approximation of kernel ridge regression with a Gaussian kernel of width
+    `lengthscale` (relative to the typical distance between inputs).
+    """
+
+    def __init__(
+        self,
+        rng: np.random.Generator,
+        n_features: int = 256,
+        alpha: float = 1.0,
+        lengthscale: float = 0.5,
+    ):
+        self.rng = rng
+        self.n_features = n_features
+        self.alpha = alpha
+        self.lengthscale = lengthscale
+
+        self._projection: Optional[np.ndarray] = None
+        self._offset: Optional[np.ndarray] = None
+        self._weights: Optional[np.ndarray] = None
+        self._intercept = 0.0
+
+    def _features(self, x: np.ndarray) -> np.ndarray:
+        assert self._projection is not None and self._offset is not None
+        return np.sqrt(2 / self.n_features) * np.cos(
+            x @ self._projection + self._offset
+        )
+
+    def fit(self, x: np.ndarray, y: np.ndarray) -> None:
+        if self._projection is None:
+            # Inputs are standardized, so their distances are about sqrt(dim)
+            dim = x.shape[1]
+            self._projection = self.rng.normal(
+                scale=1 / (self.lengthscale * np.sqrt(dim)),
+                size=(dim, self.n_features),
+            )
+            self._offset = self.rng.uniform(0, 2 * np.pi, size=self.n_features)
+
+        phi = self._features(x)
+        self._intercept = float(y.mean())
+        self._weights = np.linalg.solve(
+            phi.T @ phi + self.alpha * np.eye(self.n_features),
+            phi.T @ (y - self._intercept),
+        )
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        assert self._weights is not None, "Model is not fitted"
+        return self._features(x) @ self._weights + self._intercept
+
+
+class KNNModel:
+    """
+    Mean of the scores of the `k` nearest neighbours, weighted by the inverse
+    of their distance.
+    """
+
+    def __init__(self, k: int = 5):
+        self.k = k
+        self._index = NeighbourIndex()
+
+    def fit(self, x: np.ndarray, y: np.ndarray) -> None:
+        self._index = NeighbourIndex()
+        self._index.add(x, y)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        distances, scores = self._index.query(x, self.k)
+        weights = 1 / (distances + 1e-9)
+        return (weights * scores).sum(axis=1) / weights.sum(axis=1)
+
+
+class Surrogate:
+    """
+    Cheap model of the score of a genome, fitted on the parameter vectors and
+    scores of the last `max_samples` genomes evaluated. It is used once it has
+    seen `min_samples` genomes.
+    """
+
+    def __init__(
+        self,
+        model: str = "ridge",
+        rng: Optional[np.random.Generator] = None,
+        min_samples: int = 128,
+        max_samples: int = 2048,
+    ):
+        if model not in SURROGATE_MODELS:
+            raise ValueError(
+                f"Unknown surrogate model {model}, choose from {SURROGATE_MODELS}"
+            )
+        rng = rng if rng is not None else np.random.default_rng()
+        self.model = RidgeModel(rng) if model == "ridge" else KNNModel()
+        self.min_samples = min_samples
+
+        self._vectors: Deque[np.ndarray] = deque(maxlen=max_samples)
+        self._scores: Deque[float] = deque(maxlen=max_samples)
+        self._mean: Optional[np.ndarray] = None
+        self._std: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        return len(self._scores) >= self.min_samples
+
+    @property
+    def fitted(self) -> bool:
+        return self._mean is not None
+
+    def add(self, vectors: Sequence[np.ndarray], scores: Sequence[float]) -> None:
+        self._vectors.extend(vectors)
+        self._scores.extend(scores)
+
+    def _standardize(self, x: np.ndarray) -> np.ndarray:
+        assert self._mean is not None and self._std is not None
+        return (x - self._mean) / self._std
+
+    def fit(self) -> None:
+        x = np.array(self._vectors)
+        self._mean = x.mean(axis=0)
+        std = x.std(axis=0)
+        self._std = np.where(std > 0, std, 1.0)
+
+        # Walkers that fall at once score far below the others, clip the worst
+        # quarter so that they do not dominate the fit
+        y = np.array(self._scores)
+        y = np.maximum(y, np.percentile(y, 25))
+        self.model.fit(self._standardize(x), y)
+
+    def predict(self, vectors: Sequence[np.ndarray]) -> np.ndarray:
+        return self.model.predict(self._standardize(np.array(vectors)))
+
+
+def rank_correlation(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Spearman correlation of `a` and `b` (ties are ranked in order).
+    """
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def surrogate_accuracy(predicted: np.ndarray, scores: np.ndarray) -> Dict[str, float]:
+    """
+    How well the predictions of a surrogate matched the scores the genomes
+    got: rank correlation, which is what screening depends on, and mean
+    absolute error.
+    """
+    accuracy = {"surrogate_mae": float(np.abs(predicted - scores).mean())}
+    correlation = rank_correlation(predicted, scores)
+    if not np.isnan(correlation):
+        accuracy["surrogate_rank_correlation"] = correlation
+    return accuracy
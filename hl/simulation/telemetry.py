@@ -0,0 +1,73 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+SCORE_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+def score_summary(scores: List[float]) -> Dict[str, float]:
+    """
+    Returns the min, max, mean and quantiles of `scores`. NaN scores, of the
+    walkers left unevaluated by a cancelled generation, are ignored.
+    """
+    arr = np.asarray(scores, dtype=float)
+    arr = arr[~np.isnan(arr)]
+    if arr.size == 0:
+        return dict()
+    summary = {
+        "min": float(np.min(arr)),
+        "max": float(np.max(arr)),
+        "mean": float(np.mean(arr)),
+        "std": float(np.std(arr)),
+    }
+    for q, value in zip(SCORE_QUANTILES, np.quantile(arr, SCORE_QUANTILES)):
+        summary[f"p{int(q * 100)}"] = float(value)
+    return summary
+
+
+class TelemetrySink:
+    """
+    Writes one JSON object per generation to a JSON-lines file. If
+    `prometheus_path` is given, the numeric fields of the last record are also
+    written there in the Prometheus text format, replacing the file atomically
+    every generation.
+    """
+
+    def __init__(self, path: str, prometheus_path: Optional[str] = None):
+        self.path = path
+        self.prometheus_path = prometheus_path
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+        if self.prometheus_path is not None:
+            self._write_prometheus(record)
+
+    def _write_prometheus(self, record: Dict[str, Any]) -> None:
+        lines: List[str] = []
+        for name, value in _flatten(record).items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"hl_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        tmp_path = f"{self.prometheus_path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+
+def _flatten(record: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = dict()
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}_"))
+        else:
+            flat[name] = value
+    return flat
@@ -0,0 +1,182 @@
+import math
+from bisect import bisect_right
+from collections import deque
+from typing import Deque, List, Sequence, Tuple
+
+import numpy as np
+from Box2D import b2World
+
+from hl.simulation.world_object import WorldObject
+
+
+TERRAIN_KINDS = ["flat", "slope", "steps", "rough"]
+
+# Height of the top of the floor of `create_a_world`, where the walkers spawn
+FLOOR_TOP = 0.1
+# Thickness of the floor under the lowest point of a segment
+FLOOR_THICKNESS = 0.2
+
+# (x0, y0, x1, y1): the top edge of a piece of floor
+Segment = Tuple[float, float, float, float]
+
+
+class TerrainProfile:
+    """
+    Procedural floor, the same for every world created with the same seed.
+    It starts with a flat area of `start_length` meters from `start`, around
+    the spawn point, followed by chunks of `chunk_length` meters, each of a kind
+    drawn from `kinds`:
+        flat:   a single level piece
+        slope:  a single piece with a grade of up to `max_grade`
+        steps:  level pieces of 1m, each up to `max_step` above or below the
+                previous one
+        rough:  pieces of 0.25m whose ends are up to `roughness` above or
+                below the level of the chunk
+    Chunks are generated in order the first time they are needed and then
+    kept, they are only a few segments each.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        kinds: Sequence[str] = TERRAIN_KINDS,
+        chunk_length: float = 5.0,
+        start: float = -10.0,
+        start_length: float = 15.0,
+        max_grade: float = 0.08,
+        max_step: float = 0.08,
+        roughness: float = 0.03,
+    ):
+        for kind in kinds:
+            if kind not in TERRAIN_KINDS:
+                raise ValueError(
+                    f"Unknown terrain kind {kind}, choose from {TERRAIN_KINDS}"
+                )
+        self.seed = seed
+        self.kinds = list(kinds)
+        self.chunk_length = chunk_length
+        self.start = start
+        self.start_length = start_length
+        self.max_grade = max_grade
+        self.max_step = max_step
+        self.roughness = roughness
+
+        self._chunks: List[List[Segment]] = [
+            [(start, FLOOR_TOP, start + start_length, FLOOR_TOP)]
+        ]
+        # Start of every segment generated, for `height`
+        self._starts: List[float] = [start]
+        self._segments: List[Segment] = list(self._chunks[0])
+
+    def chunk_index(self, x: float) -> int:
+        """
+        Index of the chunk under `x` (0 is the start area).
+        """
+        x -= self.start + self.start_length
+        return max(math.floor(x / self.chunk_length) + 1, 0)
+
+    def chunk(self, index: int) -> List[Segment]:
+        while len(self._chunks) <= index:
+            self._chunks.append(self._generate(len(self._chunks)))
+            self._starts += [s[0] for s in self._chunks[-1]]
+            self._segments += self._chunks[-1]
+        return self._chunks[index]
+
+    def _generate(self, index: int) -> List[Segment]:
+        rng = np.random.default_rng([self.seed, index])
+        x0 = self.start + self.start_length + (index - 1) * self.chunk_length
+        x1 = x0 + self.chunk_length
+        y0 = self._chunks[-1][-1][3]
+        kind = self.kinds[int(rng.integers(len(self.kinds)))]
+
+        if kind == "slope":
+            grade = rng.uniform(-self.max_grade, self.max_grade)
+            return [(x0, y0, x1, y0 + grade * self.chunk_length)]
+
+        if kind == "steps":
+            segments: List[Segment] = []
+            xs = np.linspace(x0, x1, int(round(self.chunk_length)) + 1)
+            y = y0
+            for a, b in zip(xs[:-1], xs[1:]):
+                y += rng.uniform(-self.max_step, self.max_step)
+                segments.append((float(a), y, float(b), y))
+            return segments
+
+        if kind == "rough":
+            xs = np.linspace(x0, x1, int(round(4 * self.chunk_length)) + 1)
+            ys = y0 + rng.uniform(-self.roughness, self.roughness, len(xs))
+            ys[0] = y0
+            return [
+                (float(xs[i]), float(ys[i]), float(xs[i + 1]), float(ys[i + 1]))
+                for i in range(len(xs) - 1)
+            ]
+
+        return [(x0, y0, x1, y0)]
+
+    def height(self, x: float) -> float:
+        """
+        Height of the top of the floor at `x`. Called for every walker every
+        frame, so it sticks to plain floats.
+        """
+        if x >= self._segments[-1][2]:
+            self.chunk(self.chunk_index(x))
+        x0, y0, x1, y1 = self._segments[max(bisect_right(self._starts, x) - 1, 0)]
+        if x1 == x0:
+            return y0
+        return y0 + (y1 - y0) * (min(max(x, x0), x1) - x0) / (x1 - x0)
+
+
+class StreamedTerrain:
+    """
+    The floor of a `TerrainProfile` in a world, as static bodies. Only the
+    chunks from `behind` chunks behind the slowest walker to `ahead` chunks
+    ahead of the furthest one exist, so the static geometry does not grow
+    with the length of the episodes.
+    """
+
+    def __init__(
+        self, world: b2World, profile: TerrainProfile, ahead: int = 2, behind: int = 1
+    ):
+        self.world = world
+        self.profile = profile
+        self.ahead = ahead
+        self.behind = behind
+
+        self.chunks: Deque[Tuple[int, List[WorldObject]]] = deque()
+        self._next_chunk = 0
+
+    def update(self, min_x: float, max_x: float) -> None:
+        """
+        Creates the chunks ahead of `max_x` and retires the chunks behind
+        `min_x`.
+        """
+        last = self.profile.chunk_index(max_x) + self.ahead
+        while self._next_chunk <= last:
+            self.chunks.append((self._next_chunk, self._create(self._next_chunk)))
+            self._next_chunk += 1
+
+        first = self.profile.chunk_index(min_x) - self.behind
+        while self.chunks and self.chunks[0][0] < first:
+            _, pieces = self.chunks.popleft()
+            for piece in pieces:
+                self.world.DestroyBody(piece.body)
+
+    def _create(self, index: int) -> List[WorldObject]:
+        pieces: List[WorldObject] = []
+        for x0, y0, x1, y1 in self.profile.chunk(index):
+            bottom = min(y0, y1) - FLOOR_THICKNESS
+            pieces.append(
+                WorldObject(
+                    [(x0, y0), (x1, y1), (x1, bottom), (x0, bottom)],
+                    self.world,
+                    (0, 0),
+                    0,
+                    dynamic=False,
+                    restitution=0,
+                )
+            )
+        return pieces
+
+    @property
+    def n_bodies(self) -> int:
+        return sum(len(pieces) for _, pieces in self.chunks)
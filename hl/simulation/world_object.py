@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import List
 
+import numpy as np
 from Box2D import (
     b2World,
     b2PolygonShape,
@@ -34,6 +35,8 @@ class WorldObject:
 
         self.shape = b2PolygonShape()
         self.shape.vertices = vertices
+        # Local-space vertices, used by the batched renderer
+        self.local_vertices = np.array(self.shape.vertices, dtype=float)
 
         self.fixture_def = b2FixtureDef(
             shape=self.shape,
@@ -22,7 +22,6 @@ setup(
     author="Daniel Azemar, Elies Bertran, Sam Farre, Monica Riu",
     install_requires=[
         "box2d-py",
-        "tqdm",
         "pygame",
         "numpy",
         "pandas",
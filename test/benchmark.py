@@ -0,0 +1,274 @@
+"""
+Benchmarks of the simulation hot paths.
+
+    $ python test/benchmark.py run -o results.json
+    $ python test/benchmark.py compare test/baselines/benchmark.json results.json
+
+The committed baseline is only overwritten with `run --update_baseline`.
+
+Every benchmark uses fixed seeds and the bundled bodies, so results from two
+runs on the same machine can be compared. `compare` exits with an error code
+if any result regressed by more than the tolerance.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from Box2D import b2World
+
+from hl.io.body_def import BodyDef
+from hl.io.body_parser import parse_body
+from hl.simulation.genome.genome import Genome, GenomeBreeder
+from hl.simulation.profiling import GenerationStats
+from hl.simulation.simulation import Simulation, run_a_generation
+from hl.utils import ASSETS_PATH
+
+
+BASELINE_PATH = os.path.join(Path(__file__).parent, "baselines/benchmark.json")
+RESULTS_PATH = "benchmark_results.json"
+BODIES = ["lil_foot", "lil_man", "body_simple"]
+SEED = 1234
+
+Results = Dict[str, Dict[str, Any]]
+
+
+def body_path(name: str) -> str:
+    return os.path.join(ASSETS_PATH, f"bodies/{name}.json")
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    """
+    Returns the fastest of `repeat` runs of `fn`, in seconds.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def add(results: Results, name: str, value: float, unit: str, higher_is_better: bool):
+    results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+    print(f"{name:<45} {value:12.3f} {unit}")
+
+
+def v3_breeder() -> GenomeBreeder:
+    from hl.simulation.genome.sine_genome_symetric_v3 import SineGenomeBreeder
+
+    return SineGenomeBreeder(body_path("lil_foot"))
+
+
+def random_genomes(breeder: GenomeBreeder, n: int) -> List[Genome]:
+    breeder.rng = np.random.default_rng(SEED)
+    return [breeder.get_random_genome() for _ in range(n)]
+
+
+def bench_parse_body(results: Results, quick: bool):
+    n = 32 if quick else 128
+    for name in BODIES:
+        body_def = BodyDef(body_path(name))
+
+        def spawn():
+            world = b2World(gravity=(0, -9.8))
+            for _ in range(n):
+                parse_body(body_def, world, (255, 255, 255, 255))
+
+        t = best_of(spawn, 3)
+        add(results, f"parse_body/{name}", 1e6 * t / n, "us/body", False)
+
+
+def bench_run_a_generation(results: Results, quick: bool):
+    breeder = v3_breeder()
+    for n in [16, 64] if quick else [16, 64, 256]:
+        genomes = random_genomes(breeder, n)
+
+        def run():
+            stats = GenerationStats()
+            run_a_generation(breeder.body_def, genomes, 30, 0, stats=stats)
+            return stats.walker_frames
+
+        walker_frames = run()
+        t = best_of(run, 1 if quick else 3)
+        add(
+            results,
+            f"run_a_generation/population={n}",
+            walker_frames / t,
+            "walker-frames/s",
+            True,
+        )
+
+
+def bench_genome_step(results: Results, quick: bool):
+    from hl.simulation.genome.array_genome import ArrayGenomeBreeder
+    from hl.simulation.genome.sine_genome import SineGenomeBreeder
+
+    breeders = {
+        "SineGenome": SineGenomeBreeder(body_path("lil_foot")),
+        "SineGenome(symetric_v3)": v3_breeder(),
+        "ArrayGenome": ArrayGenomeBreeder(body_path("lil_foot")),
+    }
+    n = 500 if quick else 2000
+    for name, breeder in breeders.items():
+        genome = random_genomes(breeder, 1)[0]
+
+        def step():
+            for t in range(n):
+                genome.step(t)
+
+        add(
+            results, f"genome_step/{name}", 1e6 * best_of(step, 3) / n, "us/call", False
+        )
+
+
+def bench_breed(results: Results, quick: bool):
+    n = 1024
+    breeder = v3_breeder()
+    genomes = random_genomes(breeder, n)
+    scores = list(np.random.default_rng(SEED).normal(size=n))
+
+    save_path = tempfile.mkdtemp()
+    try:
+        simulation = Simulation(
+            breeder,
+            population_size=n,
+            seed=SEED,
+            parallel=False,
+            save_path=save_path,
+        )
+        t = best_of(lambda: simulation._breed(genomes, scores), 1 if quick else 3)
+    finally:
+        shutil.rmtree(save_path)
+    add(results, f"breed/population={n}", t, "s", False)
+
+
+def bench_end_to_end(results: Results, quick: bool):
+    population = 32 if quick else 64
+    generations = 2 if quick else 3
+
+    n_processes = [1]
+    while n_processes[-1] * 2 <= min(mp.cpu_count(), 4 if quick else 16):
+        n_processes.append(n_processes[-1] * 2)
+
+    for n in n_processes:
+        save_path = tempfile.mkdtemp()
+        try:
+            simulation = Simulation(
+                v3_breeder(),
+                population_size=population,
+                max_generations=generations,
+                seed=SEED,
+                parallel=n > 1,
+                n_processes=n,
+                quit_flag=mp.Event(),
+                save_path=save_path,
+            )
+            start = perf_counter()
+            simulation.run()
+            t = perf_counter() - start
+        finally:
+            shutil.rmtree(save_path)
+        add(
+            results,
+            f"end_to_end/population={population}/n_processes={n}",
+            60 * generations / t,
+            "generations/min",
+            True,
+        )
+
+
+BENCHMARKS = {
+    "parse_body": bench_parse_body,
+    "run_a_generation": bench_run_a_generation,
+    "genome_step": bench_genome_step,
+    "breed": bench_breed,
+    "end_to_end": bench_end_to_end,
+}
+
+
+def run(args) -> None:
+    results: Results = dict()
+    for name in args.only or BENCHMARKS:
+        BENCHMARKS[name](results, args.quick)
+
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": mp.cpu_count(),
+            "seed": SEED,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=4)
+    print(f"Saved results to {args.output}")
+
+
+def compare(args) -> None:
+    baseline: Results = json.load(open(args.baseline))["results"]
+    current: Results = json.load(open(args.current))["results"]
+
+    regressed = False
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        # Positive change means slower
+        change = (old - new) / old if result["higher_is_better"] else (new - old) / old
+        status = "REGRESSION" if change > args.tolerance else "ok"
+        regressed |= status != "ok"
+        print(
+            f"{name:<45} {old:12.3f} -> {new:12.3f} {result['unit']:<16}"
+            f" {-100 * change:+6.1f}% {status}"
+        )
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("-o", "--output", type=str, default=RESULTS_PATH)
+    run_parser.add_argument(
+        "--update_baseline",
+        action="store_true",
+        help=f"Save the results as the committed baseline, {BASELINE_PATH}.",
+    )
+    run_parser.add_argument("--quick", action="store_true", help="Smaller sizes.")
+    run_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare two result files and flag regressions."
+    )
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("current", type=str)
+    compare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Relative slowdown allowed before flagging a regression.",
+    )
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if args.update_baseline:
+            args.output = BASELINE_PATH
+        elif os.path.abspath(args.output) == os.path.abspath(BASELINE_PATH):
+            run_parser.error("use --update_baseline to overwrite the baseline")
+        run(args)
+    else:
+        compare(args)
@@ -0,0 +1,85 @@
+"""
+Checks that a genome that raises does not take down the distributed workers.
+
+Evaluates seeded random genomes on local workers of a `Coordinator`, one of
+them raising in its first frames. The task of that genome must fail on the
+workers, be retried `max_task_retries` times and give its genomes
+`CRASH_SCORE`, while the other tasks get the same scores as a serial run and
+the workers keep serving the next evaluations.
+
+    $ python test/distributed_errors.py
+"""
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+from hl.simulation.distributed import Coordinator
+from hl.simulation.genome.sine_genome_symetric_v3 import (
+    SineGenome,
+    SineGenomeBreeder,
+)
+from hl.simulation.person import WalkerResult
+from hl.simulation.simulation import CRASH_SCORE, run_a_generation
+from hl.utils import DEFAULT_BODY_PATH
+
+
+FPS = 30
+SEED = 42
+N_GENOMES = 6
+CHUNK_SIZE = 2
+RAISING = 3
+
+
+class RaisingGenome(SineGenome):
+    def step(self, t: int) -> Dict[str, float]:
+        if t == 5:
+            raise RuntimeError("raising genome")
+        return super().step(t)
+
+
+if __name__ == "__main__":
+    breeder = SineGenomeBreeder(DEFAULT_BODY_PATH)
+    breeder.rng = np.random.default_rng(SEED)
+    genomes = [breeder.get_random_genome() for _ in range(N_GENOMES)]
+    raising = RaisingGenome(genomes[RAISING].genes, genomes[RAISING].frequency)
+
+    expected: List[WalkerResult] = []
+    run_a_generation(breeder.body_def, genomes, FPS, 0, results=expected)
+
+    failed = False
+    coordinator = Coordinator(
+        breeder, FPS, n_local_workers=2, chunk_size=CHUNK_SIZE, max_task_retries=2
+    )
+    try:
+        start = RAISING - RAISING % CHUNK_SIZE
+        crashed_task = range(start, start + CHUNK_SIZE)
+        with_raising = genomes[:RAISING] + [raising] + genomes[RAISING + 1 :]
+        results, _ = coordinator.evaluate(with_raising, 0)
+        for i, (e, r) in enumerate(zip(expected, results)):
+            expected_score = CRASH_SCORE if i in crashed_task else e.score
+            if r.score != expected_score:
+                print(f"genome {i}: score {r.score} != {expected_score}")
+                failed = True
+
+        failures = coordinator.pop_failures()
+        if len(failures) != coordinator.max_task_retries:
+            print(f"{len(failures)} failures, expected {coordinator.max_task_retries}")
+            failed = True
+        if not failures or "crash_score" not in failures[-1]:
+            print("the last failure did not give CRASH_SCORE")
+            failed = True
+
+        # The workers survived and evaluate the next generation
+        results, _ = coordinator.evaluate(genomes, 1)
+        if [r.score for r in results] != [e.score for e in expected]:
+            print("the workers did not evaluate the next generation")
+            failed = True
+        if coordinator.lost_workers > 0:
+            print(f"{coordinator.lost_workers} workers lost")
+            failed = True
+    finally:
+        coordinator.close()
+
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
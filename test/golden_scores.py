@@ -0,0 +1,186 @@
+"""
+Golden-score regression harness.
+
+Runs a fixed set of genomes (the checkpoints in `assets/checkpoints/interesting`
+plus seeded random genomes) through `run_a_generation` and compares the final
+scores and death frames against the golden values stored in
+`test/baselines/golden_scores.json`. The same genomes are evaluated in three
+ways, which must agree exactly:
+    serial:   all the genomes in a single world
+    isolated: every genome in its own world
+    parallel: split across a pool of evaluation workers
+
+    $ python test/golden_scores.py            # check
+    $ python test/golden_scores.py --update   # store new golden values
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from hl.io.body_def import BodyDef
+from hl.simulation.genome.genome import Genome, GenomeBreeder
+from hl.simulation.person import WalkerResult
+from hl.simulation.simulation import (
+    _run_generation_worker,
+    create_worker_pool,
+    run_a_generation,
+)
+from hl.utils import ASSETS_PATH, DEFAULT_BODY_PATH, load_class_from_file
+
+
+GOLDEN_PATH = os.path.join(Path(__file__).parent, "baselines/golden_scores.json")
+CHECKPOINTS = os.path.join(ASSETS_PATH, "checkpoints/interesting")
+FPS = 30
+SEED = 42
+N_RANDOM = 16
+
+Golden = Dict[str, Dict[str, Dict[str, float]]]
+
+
+def get_genome_sets() -> Dict[str, Tuple[GenomeBreeder, List[str], List[Genome]]]:
+    """
+    Returns, for every set of genomes, a breeder for its genome family, the
+    names of the genomes and the genomes.
+    """
+    from hl.simulation.genome.sine_genome import SineGenomeBreeder
+    from hl.simulation.genome.sine_genome_symetric_v3 import (
+        SineGenomeBreeder as SymetricBreeder,
+    )
+
+    paths = sorted(glob.glob(os.path.join(CHECKPOINTS, "*.nye")))
+    checkpoints = (
+        SineGenomeBreeder(DEFAULT_BODY_PATH),
+        [Path(p).stem for p in paths],
+        [load_class_from_file(p) for p in paths],
+    )
+
+    breeder = SymetricBreeder(DEFAULT_BODY_PATH)
+    breeder.rng = np.random.default_rng(SEED)
+    random_genomes = [breeder.get_random_genome() for _ in range(N_RANDOM)]
+    random = (breeder, [f"random_{i}" for i in range(N_RANDOM)], random_genomes)
+
+    return {"checkpoints": checkpoints, "random_symetric_v3": random}
+
+
+def run_serial(body_def: BodyDef, genomes: List[Genome]) -> List[WalkerResult]:
+    results: List[WalkerResult] = []
+    run_a_generation(body_def, genomes, FPS, 0, results=results)
+    return results
+
+
+def run_isolated(body_def: BodyDef, genomes: List[Genome]) -> List[WalkerResult]:
+    results: List[WalkerResult] = []
+    for genome in genomes:
+        run_a_generation(body_def, [genome], FPS, 0, results=results)
+    return results
+
+
+def run_parallel(
+    breeder: GenomeBreeder, genomes: List[Genome], n_processes: int
+) -> List[WalkerResult]:
+    pool = create_worker_pool(breeder, n_processes, FPS)
+    try:
+        chunks = np.array_split(np.arange(len(genomes)), n_processes)
+        returns = [
+            pool.apply_async(
+                _run_generation_worker,
+                args=[int(c[0]), [genomes[i] for i in c], 0],
+            )
+            for c in chunks
+            if len(c) > 0
+        ]
+        results: List[WalkerResult] = []
+        for r in returns:
+            results += r.get()[1]
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def to_dict(names: List[str], results: List[WalkerResult]) -> Dict[str, Dict]:
+    return {
+        name: {"score": float(r.score), "death_frame": r.death_frame}
+        for name, r in zip(names, results)
+    }
+
+
+def compare(
+    expected: Dict[str, Dict], actual: Dict[str, Dict], tolerance: float
+) -> List[str]:
+    errors: List[str] = []
+    for name, e in expected.items():
+        a = actual.get(name)
+        if a is None:
+            errors.append(f"{name}: missing")
+            continue
+        if abs(e["score"] - a["score"]) > tolerance:
+            errors.append(f"{name}: score {e['score']:.6f} != {a['score']:.6f}")
+        if e["death_frame"] != a["death_frame"]:
+            errors.append(
+                f"{name}: death frame {e['death_frame']} != {a['death_frame']}"
+            )
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="Store new values.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-6,
+        help="Absolute score difference allowed against the golden values.",
+    )
+    parser.add_argument("-j", "--n_processes", type=int, default=2)
+    args = parser.parse_args()
+
+    golden: Golden = json.load(open(GOLDEN_PATH)) if os.path.exists(GOLDEN_PATH) else {}
+    new_golden: Golden = dict()
+    failed = False
+
+    for set_name, (breeder, names, genomes) in get_genome_sets().items():
+        body_def = breeder.body_def
+        modes = {
+            "serial": to_dict(names, run_serial(body_def, genomes)),
+            "isolated": to_dict(names, run_isolated(body_def, genomes)),
+            "parallel": to_dict(
+                names, run_parallel(breeder, genomes, args.n_processes)
+            ),
+        }
+        new_golden[set_name] = modes["serial"]
+
+        # The evaluation paths must agree exactly with each other
+        for mode in ["isolated", "parallel"]:
+            errors = compare(modes["serial"], modes[mode], 0.0)
+            for error in errors:
+                print(f"NONDETERMINISM {set_name} serial vs {mode}: {error}")
+            failed |= bool(errors)
+
+        if not args.update:
+            if set_name not in golden:
+                print(f"{set_name}: no golden values, run with --update")
+                failed = True
+                continue
+            errors = compare(golden[set_name], modes["serial"], args.tolerance)
+            for error in errors:
+                print(f"REGRESSION {set_name}: {error}")
+            failed |= bool(errors)
+
+        print(f"{set_name}: {len(genomes)} genomes checked")
+
+    if args.update:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, "w") as file:
+            json.dump(new_golden, file, indent=4)
+        print(f"Saved golden values to {GOLDEN_PATH}")
+
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,74 @@
+"""
+Checks that the results reused by deduplication are the ones of their genomes.
+
+Evaluates a generation of seeded random genomes with a `Simulation` that
+deduplicates, then a generation made of one of them, near duplicates of
+another, exact copies of these near duplicates and of a new genome. With the
+"replace" policy, every genome returned must get the score it gets when
+simulated on its own, and no result may be interpolated.
+
+    $ python test/near_duplicates.py
+"""
+import multiprocessing as mp
+import shutil
+import sys
+import tempfile
+from typing import List
+
+import numpy as np
+
+from hl.simulation.genome.sine_genome_symetric_v3 import SineGenomeBreeder
+from hl.simulation.person import WalkerResult
+from hl.simulation.simulation import Simulation, run_a_generation
+from hl.utils import DEFAULT_BODY_PATH
+
+
+SEED = 42
+RADIUS = 0.05
+
+
+if __name__ == "__main__":
+    breeder = SineGenomeBreeder(DEFAULT_BODY_PATH)
+    breeder.rng = np.random.default_rng(SEED)
+    evaluated = [breeder.get_random_genome() for _ in range(4)]
+    new = breeder.get_random_genome()
+    near = evaluated[1].from_vector(evaluated[1].to_vector() + RADIUS / 10)
+
+    save_path = tempfile.mkdtemp()
+    failed = False
+    try:
+        simulation = Simulation(
+            breeder,
+            population_size=len(evaluated),
+            seed=SEED,
+            parallel=False,
+            quit_flag=mp.Event(),
+            save_path=save_path,
+            dedup_resolution=1e-9,
+            near_duplicate_radius=RADIUS,
+            near_duplicate_policy="replace",
+        )
+        simulation._evaluate_unique(evaluated)
+
+        generation = [evaluated[0], near, near, new, new]
+        genomes, results = simulation._evaluate_unique(generation)
+        if simulation.generation_record["near_duplicates"] != 2:
+            print("the copy of the near duplicate was not replaced")
+            failed = True
+
+        for i, (genome, result) in enumerate(zip(genomes, results)):
+            expected: List[WalkerResult] = []
+            run_a_generation(
+                breeder.body_def, [genome], simulation._fps, 0, results=expected
+            )
+            if result.interpolated:
+                print(f"genome {i}: interpolated result")
+                failed = True
+            if result.score != expected[0].score:
+                print(f"genome {i}: score {result.score} != {expected[0].score}")
+                failed = True
+    finally:
+        shutil.rmtree(save_path)
+
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
@@ -15,7 +15,7 @@ from hl.io.body_def import BodyDef
 
 from hl.simulation.simulation import run_a_generation
 from hl.utils import DEFAULT_BODY_PATH, ASSETS_PATH
-from hl.display.draw import draw_person, draw_object, draw_textured
+from hl.display.draw import PopulationRenderer, draw_textured
 
 parser = argparse.ArgumentParser()
 parser.add_argument("files", nargs="+", type=str)
@@ -37,6 +37,7 @@ texture = pygame.image.load(os.path.join(ASSETS_PATH, "imgs/floor.png"))
 radius = 1.5
 center = (2, radius)
 clock = pygame.time.Clock()
+renderer = PopulationRenderer()
 
 
 def loop(population: List[PersonSimulation], floor: WorldObject, fps: int):
@@ -66,8 +67,7 @@ def loop(population: List[PersonSimulation], floor: WorldObject, fps: int):
 
     screen.fill((0, 0, 0))
 
-    for p in population:
-        draw_person(p.person, screen, center, radius)
+    renderer.draw([p.person for p in population], screen, center, radius)
 
     draw_textured(floor, texture, screen, center, radius)
 
@@ -0,0 +1,102 @@
+"""
+Startup time benchmark, based on `python -X importtime`.
+
+Measures how long it takes to import the headless CLI and the modules used by
+the evaluation workers, and checks that none of the GUI or pandas dependencies
+are imported on those paths. Run with `--save` to store a new baseline, and
+without it to compare against the stored one.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+BASELINE_PATH = os.path.join(Path(__file__).parent, "baselines/startup_time.json")
+
+# Module imported -> modules it must not import
+TARGETS: Dict[str, List[str]] = {
+    "hl.main": ["pygame", "matplotlib", "pandas", "tqdm"],
+    "hl.simulation.simulation": ["pygame", "matplotlib", "pandas", "tqdm"],
+}
+
+
+def import_time(module: str) -> Tuple[float, Set[str]]:
+    """
+    Imports `module` in a fresh interpreter and returns the cumulative import
+    time in milliseconds and the set of imported top-level packages.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    )
+
+    total = 0.0
+    packages: Set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        packages.add(name.strip().split(".")[0])
+        if name.strip() == module and not name[1:].startswith(" "):
+            total = int(cumulative) / 1000
+    return total, packages
+
+
+def measure(repeat: int) -> Dict[str, float]:
+    results: Dict[str, float] = dict()
+    for module, forbidden in TARGETS.items():
+        times = []
+        for _ in range(repeat):
+            t, packages = import_time(module)
+            times.append(t)
+
+        leaked = sorted(packages.intersection(forbidden))
+        if leaked:
+            print(f"ERROR: importing {module} imports {', '.join(leaked)}")
+            sys.exit(1)
+
+        results[module] = float(np.median(times))
+        print(f"{module}: {results[module]:.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help="Store a new baseline.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Relative slowdown allowed before flagging a regression.",
+    )
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+
+    if args.save:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved baseline to {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        baseline: Dict[str, float] = json.load(open(BASELINE_PATH))
+        regressed = False
+        for module, t in results.items():
+            if module not in baseline:
+                continue
+            ratio = t / baseline[module]
+            status = "REGRESSION" if ratio > 1 + args.tolerance else "ok"
+            regressed |= status != "ok"
+            print(f"{module}: {baseline[module]:.1f} ms -> {t:.1f} ms ({status})")
+        sys.exit(1 if regressed else 0)